@@ -187,9 +187,9 @@ if __name__ == '__main__':
     optmodel.compile(start_time=start_time)
     optmodel.set_objective('cost')
 
-    optmodel.model.OBJ_ENERGY.pprint()
-    optmodel.model.OBJ_COST.pprint()
-    optmodel.model.OBJ_CO2.pprint()
+    optmodel.get_objective('energy', get_value=False).pprint()
+    optmodel.get_objective('cost', get_value=False).pprint()
+    optmodel.get_objective('co2', get_value=False).pprint()
 
     optmodel.solve(tee=True, mipgap=0.2)
 
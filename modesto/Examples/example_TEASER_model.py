@@ -194,9 +194,9 @@ if __name__ == '__main__':
     optmodel.compile(start_time=start_time)
     optmodel.set_objective('energy')
 
-    # optmodel.model.OBJ_ENERGY.pprint()
-    # optmodel.model.OBJ_COST.pprint()
-    # optmodel.model.OBJ_CO2.pprint()
+    # optmodel.get_objective('energy', get_value=False).pprint()
+    # optmodel.get_objective('cost', get_value=False).pprint()
+    # optmodel.get_objective('co2', get_value=False).pprint()
 
     optmodel.solve(tee=True, mipgap=0.01, mipfocus=None, solver='gurobi')
 
@@ -152,9 +152,9 @@ if __name__ == '__main__':
 
     comp_finish = clock()
 
-    # optmodel.model.OBJ_ENERGY.pprint()
-    # optmodel.model.OBJ_COST.pprint()
-    # optmodel.model.OBJ_CO2.pprint()
+    # optmodel.get_objective('energy', get_value=False).pprint()
+    # optmodel.get_objective('cost', get_value=False).pprint()
+    # optmodel.get_objective('co2', get_value=False).pprint()
 
     optmodel.solve(tee=True, mipfocus=None, solver='gurobi', verbose=False)
 
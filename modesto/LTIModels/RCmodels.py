@@ -7,15 +7,18 @@ Module to read and build optimization problem equations for building models, des
 
 import itertools
 import os
+import pickle
 import sys
 from functools import reduce
 import modesto.utils as ut
 import networkx as nx
+import numpy as np
 import pandas as pd
 from modesto.component import Component
 from modesto.parameter import StateParameter, DesignParameter, UserDataParameter, WeatherDataParameter
 from pkg_resources import resource_filename
-from pyomo.core.base import Param, Var, Constraint, Set, NonNegativeReals
+from pyomo.core.base import Param, Var, Constraint, Set, NonNegativeReals, value
+from scipy.linalg import expm, solve_continuous_lyapunov
 
 
 def list_to_dict(list):
@@ -84,8 +87,482 @@ def splitFactor(AArray, AExt=None, AWin=None):
     return splitFacValues
 
 
+def rc_state_space(states, edges, control_states, fixed_states, control_variables):
+    """
+    Continuous state space model of an RC network, C dT/dt = sum of U (T_neighbour - T) + heat flows. States without
+    capacity are eliminated: their temperature follows algebraically from the other states and the inputs.
+
+    The inputs are the control heat flows, the fixed temperatures and the fixed heat flow into each state, named after
+    the control variable, the fixed state and 'q_' + the state respectively.
+
+    :param states: dict with the State objects
+    :param edges: dict with the Edge objects
+    :param control_states: Names of the states of which the temperature is a variable
+    :param fixed_states: Names of the states with a fixed temperature
+    :param control_variables: Names of the control heat flows
+    :return: dict with np.arrays A and B (dT/dt = A T + B w for the states with a capacity), H_x and H_w (T = H_x T +
+        H_w w for the states without), the names of the states with ('dynamic') and without ('algebraic') capacity and
+        the names of the inputs ('inputs')
+    """
+    pos = {s: i for i, s in enumerate(control_states)}
+    fixed_pos = {s: i for i, s in enumerate(fixed_states)}
+    n = len(control_states)
+
+    K = np.zeros((n, n))  # Conductances between the states
+    K_fixed = np.zeros((n, len(fixed_states)))  # Conductances to the fixed temperatures
+    for edge in edges.values():
+        U = value(edge.U)
+        for node, other in [(edge.start, edge.stop), (edge.stop, edge.start)]:
+            if node in pos:
+                K[pos[node], pos[node]] += U
+                if other in pos:
+                    K[pos[node], pos[other]] -= U
+                else:
+                    K_fixed[pos[node], fixed_pos[other]] += U
+
+    F = np.array([[value(states[s].get_q_factor(i)) for i in control_variables] for s in control_states])
+    G = np.hstack([F.reshape(n, len(control_variables)), K_fixed, np.eye(n)])
+    capacity = np.array([0 if states[s].C is None else value(states[s].C) for s in control_states], dtype=float)
+
+    dyn = np.flatnonzero(capacity > 0)
+    alg = np.flatnonzero(capacity <= 0)
+    if len(alg) > 0:
+        # 0 = -K_ad T_d - K_aa T_a + G_a w
+        H_x = -np.linalg.solve(K[np.ix_(alg, alg)], K[np.ix_(alg, dyn)])
+        H_w = np.linalg.solve(K[np.ix_(alg, alg)], G[alg])
+    else:
+        H_x = np.zeros((0, len(dyn)))
+        H_w = np.zeros((0, G.shape[1]))
+
+    A = -(K[np.ix_(dyn, dyn)] + K[np.ix_(dyn, alg)].dot(H_x)) / capacity[dyn, None]
+    B = (G[dyn] - K[np.ix_(dyn, alg)].dot(H_w)) / capacity[dyn, None]
+
+    return {'A': A, 'B': B, 'H_x': H_x, 'H_w': H_w,
+            'dynamic': [control_states[i] for i in dyn], 'algebraic': [control_states[i] for i in alg],
+            'inputs': list(control_variables) + list(fixed_states) + ['q_' + s for s in control_states]}
+
+
+def discretize_zoh(A, B, time_step):
+    """
+    Exact discretization of dx/dt = A x + B w for inputs that are constant during each time step (zero order hold)
+
+    :param A: Continuous state matrix
+    :param B: Continuous input matrix
+    :param time_step: Time step in seconds
+    :return: Discrete matrices A_d and B_d, with x[t + 1] = A_d x[t] + B_d w[t]
+    """
+    n, m = B.shape
+    M = np.zeros((n + m, n + m))
+    M[:n, :n] = A
+    M[:n, n:] = B
+    M_d = expm(M * time_step)
+
+    return M_d[:n, :n], M_d[:n, n:]
+
+
+def _psd_sqrt(W):
+    """
+    Square root factor L of a symmetric positive semidefinite matrix, with L L^T = W
+
+    :param W: Symmetric positive semidefinite matrix
+    :return: np.array L
+    """
+    s, U = np.linalg.eigh((W + W.T) / 2)
+    return U * np.sqrt(np.maximum(s, 0))
+
+
+def _balanced_basis(A, B, C):
+    """
+    Balanced realization of dx/dt = A x + B w, y = C x. States that are not controllable or not observable are left
+    out.
+
+    :return: Projection T and reconstruction Ti, with T Ti = I, and twice the Hankel singular values, the error bound
+        of each balanced state
+    """
+    Lc = _psd_sqrt(solve_continuous_lyapunov(A, -B.dot(B.T)))
+    Lo = _psd_sqrt(solve_continuous_lyapunov(A.T, -C.T.dot(C)))
+    U, hsv, Vt = np.linalg.svd(Lo.T.dot(Lc))
+
+    k = int(np.sum(hsv > hsv[0] * 1e-12)) if hsv[0] > 0 else 0
+    S = np.diag(hsv[:k] ** -0.5)
+
+    return S.dot(U[:, :k].T).dot(Lo.T), Lc.dot(Vt[:k].T).dot(S), 2 * hsv[:k]
+
+
+def _modal_basis(A, B, C):
+    """
+    Modal realization of dx/dt = A x + B w, y = C x, from the slowest to the fastest mode
+
+    :return: Projection T and reconstruction Ti, with T Ti = I, and the error bound of each mode (2-norm of its
+        residue divided by the absolute value of its eigenvalue)
+    """
+    lam, V = np.linalg.eig(A)
+    if np.any(np.abs(lam.imag) > 1e-9 * np.abs(lam.real)):
+        raise ValueError('Modal truncation needs a state matrix with real eigenvalues')
+    lam = lam.real
+    V = V.real
+
+    order = np.argsort(-lam)
+    lam, V = lam[order], V[:, order]
+    W = np.linalg.inv(V)
+    bounds = np.array([np.linalg.norm(np.outer(C.dot(V[:, i]), W[i].dot(B)), 2) / abs(lam[i])
+                       for i in range(len(lam))])
+
+    return W, V, bounds
+
+
+def reduce_state_space(A, B, C, method='balanced', order=0, tol=0):
+    """
+    Reduce the order of dx/dt = A x + B w, y = C x by balanced or modal truncation. The states that are left out are
+    residualized: they follow their steady state, so that the reduced model keeps the steady state gains of the
+    original one. The sum of the error bounds of the states that are left out bounds the H-infinity norm of the error
+    on y.
+
+    :param A: Continuous state matrix
+    :param B: Continuous input matrix
+    :param C: Output matrix, e.g. the rows of the states of which the temperature is limited
+    :param method: 'balanced' (balanced truncation) or 'modal' (modal truncation, keeping the slowest modes)
+    :param order: Number of states of the reduced model. If 0, the smallest number of states for which the error bound
+        is at most tol.
+    :param tol: Error bound, used if order is 0
+    :return: dict with the reduced matrices A and B (dz/dt = A z + B w), the reconstruction matrices X and Y
+        (x = X z + Y w), the projection P of an initial state (z = P x) and the error bound ('bound')
+    """
+    if method == 'balanced':
+        T, Ti, bounds = _balanced_basis(A, B, C)
+    elif method == 'modal':
+        T, Ti, bounds = _modal_basis(A, B, C)
+    else:
+        raise ValueError('{} is not a model order reduction method, use balanced or modal'.format(method))
+
+    if order == 0:
+        tail = np.append(np.cumsum(bounds[::-1])[::-1], 0)
+        order = int(np.flatnonzero(tail <= tol)[0])
+    order = min(order, len(bounds))
+
+    A_t = T.dot(A).dot(Ti)
+    B_t = T.dot(B)
+    A11, A12, A21, A22 = A_t[:order, :order], A_t[:order, order:], A_t[order:, :order], A_t[order:, order:]
+    if order < len(bounds):
+        M_x = np.linalg.solve(A22, A21)
+        M_w = np.linalg.solve(A22, B_t[order:])
+    else:
+        M_x = np.zeros((0, order))
+        M_w = np.zeros((0, B.shape[1]))
+
+    return {'A': A11 - A12.dot(M_x),
+            'B': B_t[:order] - A12.dot(M_w),
+            'X': Ti[:, :order] - Ti[:, order:].dot(M_x),
+            'Y': -Ti[:, order:].dot(M_w),
+            'P': T[:order],
+            'bound': bounds[order:].sum()}
+
+
+def uses_reduction(comp):
+    """
+    :param comp: An RCmodel or TeaserFourElement
+    :return: True if the state equations of the component are reduced, see reduce_state_space
+    """
+    if comp.params['reduction'].v() == 'none':
+        return False
+    elif comp.params['discretization'].v() != 'zoh':
+        raise ValueError('Model order reduction of {} needs discretization zoh'.format(comp.name))
+
+    return True
+
+
+def get_temperature_states(comp, control_states):
+    """
+    States of which the temperature is a variable of the optimization. With model order reduction these are only the
+    states with a temperature limit, the others are not modelled explicitly.
+
+    :param comp: An RCmodel or TeaserFourElement, of which the states are built
+    :param control_states: Names of the states of which the temperature is not fixed
+    :return: list of state names
+    """
+    if uses_reduction(comp):
+        return [s for s in control_states if comp.states[s].state_type is not None]
+
+    return control_states
+
+
+def _zoh_input(b, k, t):
+    """
+    Input k of the state space model of a block compiled by compile_zoh, see rc_state_space
+    """
+    if k in b.control_variables:
+        return b.ControlHeatFlows[k, t]
+    elif k in b.fixed_states:
+        return b.FixedTemperatures[k, t]
+    return b.fixed_state_heat[k[2:], t]
+
+
+def compile_zoh(comp):
+    """
+    Build the state equations of an RCmodel or TeaserFourElement with exactly discretized matrices, see
+    rc_state_space and discretize_zoh, instead of forward Euler with a heat flow variable per edge. The block needs
+    the sets, variables and parameters that the compile methods define before the state equations.
+
+    With model order reduction (see reduce_state_space) the states are replaced by the states of the reduced model
+    (ReducedStates). The temperatures of the states with a limit follow from them and the inputs, and their initial
+    value is the projection of the initial temperatures.
+
+    :param comp: The component, of which the states and edges are built
+    :return:
+    """
+    b = comp.block
+    ss = rc_state_space(comp.states, comp.edges, list(b.control_states), list(b.fixed_states),
+                        list(b.control_variables))
+
+    b.dynamic_states = Set(initialize=ss['dynamic'], ordered=True)
+    b.algebraic_states = Set(initialize=ss['algebraic'], ordered=True)
+    b.ss_inputs = Set(initialize=ss['inputs'], ordered=True)
+
+    if not uses_reduction(comp):
+        b.ss_A = Param(b.dynamic_states, b.dynamic_states, mutable=True, initialize=0)
+        b.ss_B = Param(b.dynamic_states, b.ss_inputs, mutable=True, initialize=0)
+        b.ss_H_x = Param(b.algebraic_states, b.dynamic_states, mutable=True, initialize=0)
+        b.ss_H_w = Param(b.algebraic_states, b.ss_inputs, mutable=True, initialize=0)
+        update_zoh(comp, ss)
+
+        def _state_equation(b, s, t):
+            return b.StateTemperatures[s, t + 1] == sum(b.ss_A[s, x] * b.StateTemperatures[x, t]
+                                                        for x in b.dynamic_states) + \
+                   sum(b.ss_B[s, k] * _zoh_input(b, k, t) for k in b.ss_inputs)
+
+        def _algebraic_temperature(b, s, t):
+            return b.StateTemperatures[s, t] == sum(b.ss_H_x[s, x] * b.StateTemperatures[x, t]
+                                                    for x in b.dynamic_states) + \
+                   sum(b.ss_H_w[s, k] * _zoh_input(b, k, t) for k in b.ss_inputs)
+
+        b.state_equation = Constraint(b.dynamic_states, comp.TIME, rule=_state_equation)
+        b.algebraic_temperature = Constraint(b.algebraic_states, comp.TIME, rule=_algebraic_temperature)
+        return
+
+    reduced = _reduce(comp, ss)
+    b.reduced_states = Set(initialize=range(len(reduced['P'])), ordered=True)
+    b.ss_A = Param(b.reduced_states, b.reduced_states, mutable=True, initialize=0)
+    b.ss_B = Param(b.reduced_states, b.ss_inputs, mutable=True, initialize=0)
+    b.ss_C = Param(b.control_states, b.reduced_states, mutable=True, initialize=0)
+    b.ss_D = Param(b.control_states, b.ss_inputs, mutable=True, initialize=0)
+    b.ss_P = Param(b.reduced_states, b.dynamic_states, mutable=True, initialize=0)
+    update_zoh(comp, ss)
+
+    b.ReducedStates = Var(b.reduced_states, comp.X_TIME)
+
+    def _state_equation(b, z, t):
+        return b.ReducedStates[z, t + 1] == sum(b.ss_A[z, y] * b.ReducedStates[y, t] for y in b.reduced_states) + \
+               sum(b.ss_B[z, k] * _zoh_input(b, k, t) for k in b.ss_inputs)
+
+    def _output_temperature(b, s, t):
+        # Inputs are held constant after the last time step
+        return b.StateTemperatures[s, t] == sum(b.ss_C[s, z] * b.ReducedStates[z, t] for z in b.reduced_states) + \
+               sum(b.ss_D[s, k] * _zoh_input(b, k, min(t, comp.TIME[-1])) for k in b.ss_inputs)
+
+    b.state_equation = Constraint(b.reduced_states, comp.TIME, rule=_state_equation)
+    b.output_temperature = Constraint(b.temperature_states, comp.X_TIME, rule=_output_temperature)
+
+    init_types = set(comp.params[s + '0'].get_init_type() for s in b.dynamic_states)
+    if len(init_types) > 1:
+        raise ValueError('All states with a capacity of {} need the same initialization type for model order '
+                         'reduction'.format(comp.name))
+    init_type = init_types.pop()
+
+    def _init_value(s):
+        if b.component('InitTemp') is not None:
+            return b.InitTemp[s + '0']
+        return comp.params[s + '0'].v()
+
+    def _init_reduced(b, z):
+        if init_type == 'fixedVal':
+            return b.ReducedStates[z, 0] == sum(b.ss_P[z, s] * _init_value(s) for s in b.dynamic_states)
+        elif init_type == 'cyclic':
+            return b.ReducedStates[z, 0] == b.ReducedStates[z, comp.X_TIME[-1]]
+        elif init_type == 'free':
+            return Constraint.Skip
+        raise Exception('{} is an initialization type that has not '
+                        'been implemented for the building RC models'.format(init_type))
+
+    b.init_reduced = Constraint(b.reduced_states, rule=_init_reduced)
+
+
+def _reduce(comp, ss, order=None):
+    """
+    Reduced continuous model of a component, see reduce_state_space. The outputs are the temperatures of the states
+    with a limit, or of all states if none has a limit.
+
+    :param comp: The component
+    :param ss: Continuous state space model, see rc_state_space
+    :param order: Number of states, reduction_order of the component if None
+    :return: dict as returned by reduce_state_space, with the matrices C and D that give the temperatures of all
+        control states (T = C z + D w)
+    """
+    # Temperatures of all control states as a function of the dynamic states and the inputs
+    states = list(comp.block.control_states)
+    F_x = np.zeros((len(states), len(ss['dynamic'])))
+    F_w = np.zeros((len(states), len(ss['inputs'])))
+    for i, s in enumerate(ss['dynamic']):
+        F_x[states.index(s), i] = 1
+    for i, s in enumerate(ss['algebraic']):
+        F_x[states.index(s)] = ss['H_x'][i]
+        F_w[states.index(s)] = ss['H_w'][i]
+
+    outputs = [states.index(s) for s in comp.block.temperature_states] or list(range(len(states)))
+    reduced = reduce_state_space(ss['A'], ss['B'], F_x[outputs], method=comp.params['reduction'].v(),
+                                 order=comp.params['reduction_order'].v() if order is None else order,
+                                 tol=comp.params['reduction_tol'].v())
+    reduced['C'] = F_x.dot(reduced['X'])
+    reduced['D'] = F_x.dot(reduced['Y']) + F_w
+
+    return reduced
+
+
+def update_zoh(comp, ss=None):
+    """
+    Recalculate the discrete state space matrices of a component compiled by compile_zoh, e.g. after its capacities or
+    conductances changed. A reduced model keeps its number of states.
+
+    :param comp: The component
+    :param ss: Continuous state space model, see rc_state_space. Calculated from the component if None.
+    :return:
+    """
+    b = comp.block
+    if ss is None:
+        ss = rc_state_space(comp.states, comp.edges, list(b.control_states), list(b.fixed_states),
+                            list(b.control_variables))
+
+    if uses_reduction(comp):
+        reduced = _reduce(comp, ss, order=len(b.reduced_states))
+        if reduced['A'].shape[0] != len(b.reduced_states):
+            raise ValueError('The reduced model of {} has less than {} states, recompile it'.format(
+                comp.name, len(b.reduced_states)))
+        A, B = discretize_zoh(reduced['A'], reduced['B'], comp.params['time_step'].v())
+        comp.logger.debug('Reduced model with {} states, error bound {}'.format(len(A), reduced['bound']))
+
+        for z in b.reduced_states:
+            for y in b.reduced_states:
+                b.ss_A[z, y] = A[z, y]
+            for j, k in enumerate(ss['inputs']):
+                b.ss_B[z, k] = B[z, j]
+            for j, s in enumerate(ss['dynamic']):
+                b.ss_P[z, s] = reduced['P'][z, j]
+        for i, s in enumerate(b.control_states):
+            for z in b.reduced_states:
+                b.ss_C[s, z] = reduced['C'][i, z]
+            for j, k in enumerate(ss['inputs']):
+                b.ss_D[s, k] = reduced['D'][i, j]
+        return
+
+    A, B = discretize_zoh(ss['A'], ss['B'], comp.params['time_step'].v())
+
+    for i, s in enumerate(ss['dynamic']):
+        for j, x in enumerate(ss['dynamic']):
+            b.ss_A[s, x] = A[i, j]
+        for j, k in enumerate(ss['inputs']):
+            b.ss_B[s, k] = B[i, j]
+    for i, s in enumerate(ss['algebraic']):
+        for j, x in enumerate(ss['dynamic']):
+            b.ss_H_x[s, x] = ss['H_x'][i, j]
+        for j, k in enumerate(ss['inputs']):
+            b.ss_H_w[s, k] = ss['H_w'][i, j]
+
+
+def get_zoh_handover(comp, n_steps):
+    """
+    Temperatures of the states with a capacity after n_steps time steps, reconstructed from the states of a reduced
+    model
+
+    :param comp: The component, compiled with model order reduction
+    :param n_steps: Number of time steps the start time is moved forward
+    :return: dict with the names of the initial temperature parameters as keys
+    """
+    b = comp.block
+    t = min(n_steps, comp.TIME[-1])
+
+    return {s + '0': value(sum(b.ss_C[s, z] * b.ReducedStates[z, n_steps] for z in b.reduced_states) +
+                           sum(b.ss_D[s, k] * _zoh_input(b, k, t) for k in b.ss_inputs))
+            for s in b.dynamic_states if s + '0' in comp.params}
+
+
+TEASER_PATH = resource_filename('modesto', 'Data/BuildingModels/TEASER')
+TEASER_COLUMNS = ['AExt',
+                  'AFloor',
+                  'AInt',
+                  'ARoof',
+                  'ATransparent',  # [S, W, N, E]
+                  'AWin',  # [S, W, N, E]
+                  'CExt',
+                  'CFloor',
+                  'CInt',
+                  'CRoof',
+                  'RExt',
+                  'RExtRem',
+                  'RFloor',
+                  'RFloorRem',
+                  'RInt',
+                  'RRoof',
+                  'RRoofRem',
+                  'RWin',
+                  'VAir',
+                  'alphaExt',
+                  'alphaFloor',
+                  'alphaInt',
+                  'alphaRad',
+                  'alphaRoof',
+                  'alphaWin',
+                  'gWin',
+                  'mSenFac',
+                  'nExt',
+                  'nFloor',
+                  'nInt',
+                  'nOrientations',
+                  'nPorts',
+                  'nRoof',
+                  'ratioWinConRad']
+TEASER_ORIENTATIONS = ['S', 'W', 'N', 'E']  # Order of the values in the list columns
+
+_teaser_streets = {}  # Path of a street file -> parsed street, see read_teaser_street
+
+
+def read_teaser_street(neighbName, streetName, path=TEASER_PATH):
+    """
+    Read the TEASER parameters of all buildings in a street. Each street file is parsed only once per process, or not
+    at all if it was loaded with load_teaser_data.
+
+    :param neighbName: Name of the neighbourhood
+    :param streetName: Name of the street
+    :param path: Indicate location where folders for all streets can be found.
+    :return: dict with the row of each building ('rows'), an np.array with one value per building for each scalar
+        parameter ('scalars') and an np.array with one row per building and one column per orientation (S, W, N, E)
+        for each parameter given per orientation ('orientations'). The arrays are shared and read-only.
+    """
+    filepath = os.path.abspath(os.path.join(path, neighbName, streetName + '.csv'))
+
+    if filepath not in _teaser_streets:
+        data = pd.read_csv(filepath, sep=';', index_col=0)
+        data.columns = TEASER_COLUMNS
+
+        from ast import literal_eval
+
+        street = {'rows': {building: i for i, building in enumerate(data.index)}, 'scalars': {}, 'orientations': {}}
+        for col in data.columns:
+            # Lists are stored as their string representation. ast.literal_eval is a safe way to turn them back into
+            # numbers.
+            if data[col].dtype == object:
+                values = np.array([literal_eval(val) for val in data[col]], dtype=float)
+                street['orientations'][col] = values
+            else:
+                values = data[col].values.copy()
+                street['scalars'][col] = values
+            values.setflags(write=False)
+
+        _teaser_streets[filepath] = street
+
+    return _teaser_streets[filepath]
+
+
 def readTeaserParam(neighbName, streetName, buildingName,
-                    path=resource_filename('modesto', 'Data/BuildingModels/TEASER')):
+                    path=TEASER_PATH):
     """
     Read data and construct parameter dictionary for TEASER building models.
 
@@ -94,66 +571,82 @@ def readTeaserParam(neighbName, streetName, buildingName,
     :param path: Indicate location where folders for all streets can be found.
     :return:
     """
+    street = read_teaser_street(neighbName, streetName, path=path)
+    if buildingName not in street['rows']:
+        raise KeyError('There is no building {} in street {}'.format(buildingName, streetName))
+    i = street['rows'][buildingName]
 
-    filepath = os.path.join(path, neighbName, streetName + '.csv')
-
-    data = pd.read_csv(filepath, sep=';', index_col=0)
-
-    colNames = ['AExt',
-                'AFloor',
-                'AInt',
-                'ARoof',
-                'ATransparent',  # [S, W, N, E]
-                'AWin',  # [S, W, N, E]
-                'CExt',
-                'CFloor',
-                'CInt',
-                'CRoof',
-                'RExt',
-                'RExtRem',
-                'RFloor',
-                'RFloorRem',
-                'RInt',
-                'RRoof',
-                'RRoofRem',
-                'RWin',
-                'VAir',
-                'alphaExt',
-                'alphaFloor',
-                'alphaInt',
-                'alphaRad',
-                'alphaRoof',
-                'alphaWin',
-                'gWin',
-                'mSenFac',
-                'nExt',
-                'nFloor',
-                'nInt',
-                'nOrientations',
-                'nPorts',
-                'nRoof',
-                'ratioWinConRad']
-
-    data.columns = colNames
-
-    dict_out = data.to_dict('index')[buildingName]
-
-    from ast import literal_eval
-
-    # dict_out turns list items in pandas dataframe into a string representation. ast.literal_eval is a safe way to turn
-    # it back into a string of numerals.
-
-    for key in dict_out:
-        if isinstance(dict_out[key], str):
-            parList = literal_eval(dict_out[key])
-            dict_out[key] = dict()
-            for i, ori in enumerate(['S', 'W', 'N', 'E']):
-                dict_out[key][ori] = parList[i]
+    dict_out = {key: values[i].item() for key, values in street['scalars'].items()}
+    for key, values in street['orientations'].items():
+        dict_out[key] = {ori: values[i, j].item() for j, ori in enumerate(TEASER_ORIENTATIONS)}
 
     # print dict_out
     return dict_out
 
 
+def readTeaserParams(neighbName, path=TEASER_PATH):
+    """
+    Read the TEASER parameters of all buildings in a neighbourhood, parsing each street file once
+
+    :param neighbName: Name of the neighbourhood
+    :param path: Indicate location where folders for all streets can be found.
+    :return: dict with a dict per street, with the parameters of each building as returned by readTeaserParam
+    """
+    streets = sorted(name[:-4] for name in os.listdir(os.path.join(path, neighbName)) if name.endswith('.csv'))
+
+    return {streetName: {buildingName: readTeaserParam(neighbName, streetName, buildingName, path=path)
+                         for buildingName in read_teaser_street(neighbName, streetName, path=path)['rows']}
+            for streetName in streets}
+
+
+def dump_teaser_data(filepath, path=TEASER_PATH):
+    """
+    Parse the street files of all neighbourhoods and store them in one binary file, which load_teaser_data reads much
+    faster than the csv files.
+
+    :param filepath: Path of the file to be written
+    :param path: Indicate location where folders for all streets can be found.
+    :return:
+    """
+    data = {}
+    for neighbName in sorted(os.listdir(path)):
+        if not os.path.isdir(os.path.join(path, neighbName)):
+            continue
+        for name in sorted(os.listdir(os.path.join(path, neighbName))):
+            if name.endswith('.csv'):
+                data[(neighbName, name[:-4])] = read_teaser_street(neighbName, name[:-4], path=path)
+
+    with open(filepath, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_teaser_data(filepath, path=TEASER_PATH):
+    """
+    Load a file written by dump_teaser_data. readTeaserParam then uses the loaded streets instead of parsing their csv
+    files.
+
+    :param filepath: Path of the file written by dump_teaser_data
+    :param path: Location of the street folders the file was made from
+    :return:
+    """
+    with open(filepath, 'rb') as f:
+        data = pickle.load(f)
+
+    for (neighbName, streetName), street in data.items():
+        for values in list(street['scalars'].values()) + list(street['orientations'].values()):
+            values.setflags(write=False)
+        _teaser_streets[os.path.abspath(os.path.join(path, neighbName, streetName + '.csv'))] = street
+
+
+def clear_teaser_cache():
+    """
+    Forget all parsed TEASER street files
+
+    :return:
+    """
+    _teaser_streets.clear()
+
+
 # TODO improve inheritance in this file. RCModel and Teaser have a lot of shared code in common.
 
 class TeaserFourElement(Component):
@@ -252,6 +745,11 @@ class TeaserFourElement(Component):
             'buildingName': DesignParameter('buildingName',
                                             'Identifier for building in street _streetName_',
                                             '-'),
+            'teaser_params': DesignParameter('teaser_params',
+                                             'TEASER parameters of the building as returned by readTeaserParam, e.g. '
+                                             'the averaged parameters of a cluster of buildings. If given, '
+                                             'neighbName, streetName and buildingName are not used',
+                                             '-'),
             'day_max_temperature': UserDataParameter('day_max_temperature',
                                                      'Maximum temperature for day zones',
                                                      'K'
@@ -303,6 +801,28 @@ class TeaserFourElement(Component):
                                        'Fraction of input heat that is transferred as radiation.',
                                        '-',
                                        val=0.3),
+            'discretization': DesignParameter('discretization',
+                                              'Discretization of the state equations: \'euler\' (forward Euler, '
+                                              'with a heat flow variable per edge) or \'zoh\' (exact, inputs constant '
+                                              'during a time step)',
+                                              '-',
+                                              val='euler'),
+            'reduction': DesignParameter('reduction',
+                                         'Model order reduction of the \'zoh\' state equations: \'none\', '
+                                         '\'balanced\' (balanced truncation) or \'modal\' (modal truncation)',
+                                         '-',
+                                         val='none'),
+            'reduction_order': DesignParameter('reduction_order',
+                                               'Number of states of the reduced model. If 0, the smallest number of '
+                                               'states for which the error bound is at most reduction_tol',
+                                               '-',
+                                               val=0),
+            'reduction_tol': DesignParameter('reduction_tol',
+                                             'Error bound of the reduced model (H-infinity norm of the error on the '
+                                             'limited temperatures, per W or K of the inputs), used if '
+                                             'reduction_order is 0',
+                                             'K',
+                                             val=0),
             'ACH': DesignParameter('ACH',
                                    'Air change rate of air volume of the TEASER model. Multiply by air volume to get '
                                    'volume flow rate per hour',
@@ -311,6 +831,24 @@ class TeaserFourElement(Component):
         })
         return params
 
+    def check_data(self):
+        """
+        Check if all data required to build the optimization problem is available. The building is given either by
+        teaser_params or by neighbName, streetName and buildingName.
+
+        :return missing_params: dict containing all missing parameters and their descriptions
+        :return flag: True if there are missing params, False if not
+        """
+        missing_params, flag = Component.check_data(self)
+
+        if 'teaser_params' in missing_params:
+            del missing_params['teaser_params']
+        else:
+            for name in ['neighbName', 'streetName', 'buildingName']:
+                missing_params.pop(name, None)
+
+        return missing_params, len(missing_params) > 0
+
     def build_graph(self):
         """
         Set up networkX object describing model structure
@@ -451,8 +989,11 @@ class TeaserFourElement(Component):
         :return:
         """
         # Load parameters
-        self.model_params = readTeaserParam(self.params['neighbName'].v(), self.params['streetName'].v(),
-                                            self.params['buildingName'].v())
+        if self.params['teaser_params'].v() is not None:
+            self.model_params = self.params['teaser_params'].v()
+        else:
+            self.model_params = readTeaserParam(self.params['neighbName'].v(), self.params['streetName'].v(),
+                                                self.params['buildingName'].v())
         mp = self.model_params
 
         for param in mp:
@@ -616,6 +1157,9 @@ class TeaserFourElement(Component):
         for ori in ['N', 'E', 'S', 'W']:
             setattr(self.block, 'f_air_' + ori, mp['ratioWinConRad'] * mp['gWin'] * mp['ATransparent'][ori])
 
+        if self.params['discretization'].v() == 'zoh':
+            update_zoh(self)
+
     def change_model_params(self):
         """
         Reload input data series based on currently active list of model parameters.
@@ -702,10 +1246,9 @@ class TeaserFourElement(Component):
 
         ##### Variables
 
-        self.block.StateTemperatures = Var(self.block.control_states, self.X_TIME, within=NonNegativeReals)
-        self.block.StateHeatFlows = Var(self.block.control_states, self.TIME)
+        self.block.temperature_states = Set(initialize=get_temperature_states(self, control_states), ordered=True)
+        self.block.StateTemperatures = Var(self.block.temperature_states, self.X_TIME, within=NonNegativeReals)
         self.block.ControlHeatFlows = Var(self.block.control_variables, self.TIME)
-        self.block.EdgeHeatFlows = Var(self.block.edge_names, self.TIME)
         self.block.mass_flow = Var(self.TIME)
         self.block.heat_flow = Var(self.TIME)
 
@@ -742,27 +1285,49 @@ class TeaserFourElement(Component):
         self.block.FixedTemperatures = Param(self.block.fixed_states,
                                              self.X_TIME, rule=decl_fixed_temperature, mutable=True)
 
-        ##### State energy balances
+        if self.params['discretization'].v() == 'zoh':
+            compile_zoh(self)
+        else:
+            self.block.StateHeatFlows = Var(self.block.control_states, self.TIME)
+            self.block.EdgeHeatFlows = Var(self.block.edge_names, self.TIME)
 
-        def _energy_balance(b, s, t):
-            return sum(self.states[s].get_q_factor(i) * b.ControlHeatFlows[i, t] for i in b.control_variables) \
-                   + b.fixed_state_heat[s, t] + \
-                   sum(b.EdgeHeatFlows[e, t] * b.directions[s, e] for e in b.edge_names) == \
-                   b.StateHeatFlows[s, t]
+            ##### State energy balances
 
-        self.block.energy_balance = Constraint(self.block.control_states,
-                                               self.TIME, rule=_energy_balance)
+            def _energy_balance(b, s, t):
+                return sum(self.states[s].get_q_factor(i) * b.ControlHeatFlows[i, t] for i in b.control_variables) \
+                       + b.fixed_state_heat[s, t] + \
+                       sum(b.EdgeHeatFlows[e, t] * b.directions[s, e] for e in b.edge_names) == \
+                       b.StateHeatFlows[s, t]
 
-        ##### Temperature change state
+            self.block.energy_balance = Constraint(self.block.control_states,
+                                                   self.TIME, rule=_energy_balance)
 
-        def _temp_change(b, s, t):
-            if self.states[s].C is None:
-                return b.StateHeatFlows[s, t] == 0
-            else:
-                return b.StateTemperatures[s, t + 1] == b.StateTemperatures[s, t] + \
-                       1 / self.states[s].C * b.StateHeatFlows[s, t] * self.params['time_step'].v()
+            ##### Temperature change state
 
-        self.block.temp_change = Constraint(self.block.control_states, self.TIME, rule=_temp_change)
+            def _temp_change(b, s, t):
+                if self.states[s].C is None:
+                    return b.StateHeatFlows[s, t] == 0
+                else:
+                    return b.StateTemperatures[s, t + 1] == b.StateTemperatures[s, t] + \
+                           1 / self.states[s].C * b.StateHeatFlows[s, t] * self.params['time_step'].v()
+
+            self.block.temp_change = Constraint(self.block.control_states, self.TIME, rule=_temp_change)
+
+            ##### Heat flow through edge
+
+            def _edge_heat_flow(b, e, t):
+                e_ob = self.edges[e]
+                if e_ob.start in b.control_states:
+                    start_temp = b.StateTemperatures[e_ob.start, t]
+                else:
+                    start_temp = b.FixedTemperatures[e_ob.start, t]
+                if e_ob.stop in b.control_states:
+                    stop_temp = b.StateTemperatures[e_ob.stop, t]
+                else:
+                    stop_temp = b.FixedTemperatures[e_ob.stop, t]
+                return b.EdgeHeatFlows[e, t] == e_ob.U * (start_temp - stop_temp)
+
+            self.block.edge_heat_flow = Constraint(self.block.edge_names, self.TIME, rule=_edge_heat_flow)
 
         def _init_temp(b, s):
             if self.params[s + '0'].get_init_type() == 'fixedVal':
@@ -775,23 +1340,8 @@ class TeaserFourElement(Component):
                 raise Exception('{} is an initialization type that has not '
                                 'been implemented for the building RC models'.format(self.params[s + '0']))
 
-        self.block.init_temp = Constraint(self.block.control_states, rule=_init_temp)
-
-        ##### Heat flow through edge
-
-        def _edge_heat_flow(b, e, t):
-            e_ob = self.edges[e]
-            if e_ob.start in b.control_states:
-                start_temp = b.StateTemperatures[e_ob.start, t]
-            else:
-                start_temp = b.FixedTemperatures[e_ob.start, t]
-            if e_ob.stop in b.control_states:
-                stop_temp = b.StateTemperatures[e_ob.stop, t]
-            else:
-                stop_temp = b.FixedTemperatures[e_ob.stop, t]
-            return b.EdgeHeatFlows[e, t] == e_ob.U * (start_temp - stop_temp)
-
-        self.block.edge_heat_flow = Constraint(self.block.edge_names, self.TIME, rule=_edge_heat_flow)
+        if not uses_reduction(self):
+            self.block.init_temp = Constraint(self.block.control_states, rule=_init_temp)
 
         ##### Limit temperatures
 
@@ -921,74 +1471,44 @@ class TeaserFourElement(Component):
             # self.block.decl_temperatures = Constraint(self.TIME, rule=_decl_temperatures)
             # self.block.init_temperatures = Constraint(self.lines, rule=_init_temperatures)
 
-
-class RCmodel(Component):
-
-    def __init__(self, name, temperature_driven=False, repr_days=None):
+    def get_handover(self, n_steps):
         """
+        Temperatures of the controlled states after n_steps time steps, the initial states of an optimization that
+        starts n_steps later
 
-        :param name: Name of the component
-        :param horizon: Horizon of the optimization problem, in seconds
-        :param time_step: Time between two points
+        :param n_steps: Number of time steps the start time is moved forward
+        :return: dict with the names of the initial temperature parameters as keys
         """
-        Component.__init__(self, name,
-                           direction=-1,
-                           temperature_driven=temperature_driven, repr_days=repr_days)
-        self.model_types = ['SFH_D_1_2zone_TAB', 'SFH_D_1_2zone_REF1', 'SFH_D_1_2zone_REF2', 'SFH_D_2_2zone_TAB',
-                            'SFH_D_2_2zone_REF1', 'SFH_D_2_2zone_REF2', 'SFH_D_3_2zone_TAB', 'SFH_D_3_2zone_REF1',
-                            'SFH_D_3_2zone_REF2', 'SFH_D_4_2zone_TAB', 'SFH_D_4_2zone_REF1', 'SFH_D_4_2zone_REF2',
-                            'SFH_D_5_2zone_TAB', 'SFH_D_5_ins_TAB', 'SFH_SD_1_2zone_TAB', 'SFH_SD_1_2zone_REF1',
-                            'SFH_SD_1_2zone_REF2', 'SFH_SD_2_2zone_TAB', 'SFH_SD_2_2zone_REF1',
-                            'SFH_SD_2_2zone_REF2',
-                            'SFH_SD_3_2zone_TAB', 'SFH_SD_3_2zone_REF1', 'SFH_SD_3_2zone_REF2',
-                            'SFH_SD_4_2zone_TAB',
-                            'SFH_SD_4_2zone_REF1', 'SFH_SD_4_2zone_REF2', 'SFH_SD_5_TAB', 'SFH_SD_5_Ins_TAB',
-                            'SFH_T_1_2zone_TAB', 'SFH_T_1_2zone_REF1', 'SFH_T_1_2zone_REF2', 'SFH_T_2_2zone_TAB',
-                            'SFH_T_2_2zone_REF1', 'SFH_T_2_2zone_REF2', 'SFH_T_3_2zone_TAB', 'SFH_T_3_2zone_REF1',
-                            'SFH_T_3_2zone_REF2', 'SFH_T_4_2zone_TAB', 'SFH_T_4_2zone_REF1', 'SFH_T_4_2zone_REF2',
-                            'SFH_T_5_TAB', 'SFH_T_5_ins_TAB']
+        if uses_reduction(self):
+            return get_zoh_handover(self, n_steps)
+        return {s + '0': value(self.block.StateTemperatures[s, n_steps]) for s in self.block.control_states
+                if s + '0' in self.params}
 
-        self.params = self.create_params()
 
-        self.structure = None
-        self.states = {}
-        self.edges = {}
-        self.controlVariables = []
+_rc_structures = {}  # Model type -> structure, states and edges shared by all RCmodel objects, see get_rc_structure
 
-    def build(self):
-        """
-        Create all states and edges
-
-        :return:
-        """
-        self.get_model_data(self.params['model_type'].v())
-
-        for state in self.structure.nodes():
-            self.states[state] = State(name=state,
-                                       node_object=self.structure.nodes[state])
 
-        for edge in self.structure.edges():
-            self.edges[''.join(edge)] = Edge(name=''.join(edge),
-                                             tuple=edge,
-                                             edge_object=self.structure.edges[edge])
+def get_rc_params():
+    """
+    :return: Table with the parameters of all RCmodel types (rows) per model type (columns), read only once per process
+    """
+    return ut.read_file(os.path.join(resource_filename('modesto', 'Data'), 'BuildingModels'),
+                        'buildParamSummary.csv', timestamp=False)
 
-    def get_model_data(self, model_type):
-        """
-        Set up networkX object describing model structure
 
-        :param model_type: Type of model indicating parameters of a specific type of model
-        :return: NetworkX object
-        """
-        if model_type not in self.model_types:
-            raise ValueError('The given model type {} is not valid.'.format(model_type))
+def get_rc_structure(model_type):
+    """
+    Return the networkX structure of an RCmodel type together with its State and Edge objects. They are built the first
+    time a model type is asked for and shared afterwards, so they should not be changed.
 
+    :param model_type: Type of model, a column of buildParamSummary.csv
+    :return: dict with the frozen networkX graph ('structure'), dicts of State ('states') and Edge ('edges') objects
+        and the names of the control variables ('control_variables')
+    """
+    if model_type not in _rc_structures:
+        bp = get_rc_params()[model_type]
         G = nx.Graph()
 
-        file = os.path.join(resource_filename('modesto', 'Data'), 'BuildingModels', 'buildParamSummary.csv')
-        model_params = pd.read_csv(file, sep=';', index_col=0)
-
-        bp = model_params[model_type]
-
         # Day zone
         G.add_node('TiD',
                    C=bp['CiD'],
@@ -1088,8 +1608,78 @@ class RCmodel(Component):
         G.add_edge('TwN', 'Te', U=bp['UwN'])
         G.add_edge('TiN', 'Te', U=bp['infN'])
 
-        self.structure = G
-        self.controlVariables += ['Q_hea_D', 'Q_hea_N']
+        nx.freeze(G)
+        _rc_structures[model_type] = {
+            'structure': G,
+            'states': {state: State(name=state, node_object=G.nodes[state]) for state in G.nodes()},
+            'edges': {''.join(edge): Edge(name=''.join(edge), tuple=edge, edge_object=G.edges[edge])
+                      for edge in G.edges()},
+            'control_variables': ('Q_hea_D', 'Q_hea_N')}
+
+    return _rc_structures[model_type]
+
+
+class RCmodel(Component):
+
+    def __init__(self, name, temperature_driven=False, repr_days=None):
+        """
+
+        :param name: Name of the component
+        :param horizon: Horizon of the optimization problem, in seconds
+        :param time_step: Time between two points
+        """
+        Component.__init__(self, name,
+                           direction=-1,
+                           temperature_driven=temperature_driven, repr_days=repr_days)
+        self.model_types = ['SFH_D_1_2zone_TAB', 'SFH_D_1_2zone_REF1', 'SFH_D_1_2zone_REF2', 'SFH_D_2_2zone_TAB',
+                            'SFH_D_2_2zone_REF1', 'SFH_D_2_2zone_REF2', 'SFH_D_3_2zone_TAB', 'SFH_D_3_2zone_REF1',
+                            'SFH_D_3_2zone_REF2', 'SFH_D_4_2zone_TAB', 'SFH_D_4_2zone_REF1', 'SFH_D_4_2zone_REF2',
+                            'SFH_D_5_2zone_TAB', 'SFH_D_5_ins_TAB', 'SFH_SD_1_2zone_TAB', 'SFH_SD_1_2zone_REF1',
+                            'SFH_SD_1_2zone_REF2', 'SFH_SD_2_2zone_TAB', 'SFH_SD_2_2zone_REF1',
+                            'SFH_SD_2_2zone_REF2',
+                            'SFH_SD_3_2zone_TAB', 'SFH_SD_3_2zone_REF1', 'SFH_SD_3_2zone_REF2',
+                            'SFH_SD_4_2zone_TAB',
+                            'SFH_SD_4_2zone_REF1', 'SFH_SD_4_2zone_REF2', 'SFH_SD_5_TAB', 'SFH_SD_5_Ins_TAB',
+                            'SFH_T_1_2zone_TAB', 'SFH_T_1_2zone_REF1', 'SFH_T_1_2zone_REF2', 'SFH_T_2_2zone_TAB',
+                            'SFH_T_2_2zone_REF1', 'SFH_T_2_2zone_REF2', 'SFH_T_3_2zone_TAB', 'SFH_T_3_2zone_REF1',
+                            'SFH_T_3_2zone_REF2', 'SFH_T_4_2zone_TAB', 'SFH_T_4_2zone_REF1', 'SFH_T_4_2zone_REF2',
+                            'SFH_T_5_TAB', 'SFH_T_5_ins_TAB']
+
+        self.params = self.create_params()
+
+        self.structure = None
+        self.states = {}
+        self.edges = {}
+        self.controlVariables = []
+
+    def build(self):
+        """
+        Create all states and edges
+
+        :return:
+        """
+        self.get_model_data(self.params['model_type'].v())
+        shared = get_rc_structure(self.params['model_type'].v())
+
+        self.states = dict(shared['states'])
+        self.edges = dict(shared['edges'])
+        self.controlVariables = list(shared['control_variables'])
+
+    def get_model_data(self, model_type):
+        """
+        Set up networkX object describing model structure. The structure of each model type is built only once and
+        shared by all RCmodel objects, see get_rc_structure.
+
+        :param model_type: Type of model indicating parameters of a specific type of model
+        :return: NetworkX object
+        """
+        if model_type not in self.model_types:
+            raise ValueError('The given model type {} is not valid.'.format(model_type))
+
+        self.structure = get_rc_structure(model_type)['structure']
+
+        return self.structure
+
 
     def compile(self, model, start_time):
         """
@@ -1125,12 +1715,10 @@ class RCmodel(Component):
 
         ##### Variables
 
-        self.block.StateTemperatures = Var(self.block.control_states, self.X_TIME)
-        self.block.StateHeatFlows = Var(self.block.control_states, self.TIME)
+        self.block.temperature_states = Set(initialize=get_temperature_states(self, control_states), ordered=True)
+        self.block.StateTemperatures = Var(self.block.temperature_states, self.X_TIME)
         self.block.ControlHeatFlows = Var(self.block.control_variables, self.TIME,
                                           doc='Controlling heat flows, to be optimized')
-        self.block.EdgeHeatFlows = Var(self.block.edge_names, self.TIME,
-                                       doc='Variable heat flow rate between two nodes')
         self.block.mass_flow = Var(self.TIME)
         self.block.heat_flow = Var(self.TIME)
 
@@ -1156,24 +1744,47 @@ class RCmodel(Component):
         self.block.FixedTemperatures = Param(self.block.fixed_states,
                                              self.TIME, rule=decl_fixed_temperature, mutable=True)
 
-        ##### State energy balances
+        if self.params['discretization'].v() == 'zoh':
+            compile_zoh(self)
+        else:
+            self.block.StateHeatFlows = Var(self.block.control_states, self.TIME)
+            self.block.EdgeHeatFlows = Var(self.block.edge_names, self.TIME,
+                                           doc='Variable heat flow rate between two nodes')
 
-        def _energy_balance(b, s, t):
-            return sum(b.ControlHeatFlows[i, t] * self.states[s].get_q_factor(i) for i in b.control_variables) \
-                   + b.fixed_state_heat[s, t] + \
-                   sum(b.EdgeHeatFlows[e, t] * b.directions[s, e] for e in b.edge_names) == \
-                   b.StateHeatFlows[s, t]
+            ##### State energy balances
 
-        self.block.energy_balance = Constraint(self.block.control_states,
-                                               self.TIME, rule=_energy_balance)
+            def _energy_balance(b, s, t):
+                return sum(b.ControlHeatFlows[i, t] * self.states[s].get_q_factor(i) for i in b.control_variables) \
+                       + b.fixed_state_heat[s, t] + \
+                       sum(b.EdgeHeatFlows[e, t] * b.directions[s, e] for e in b.edge_names) == \
+                       b.StateHeatFlows[s, t]
 
-        ##### Temperature change state
+            self.block.energy_balance = Constraint(self.block.control_states,
+                                                   self.TIME, rule=_energy_balance)
 
-        def _temp_change(b, s, t):
-            return b.StateTemperatures[s, t + 1] == b.StateTemperatures[s, t] + \
-                   b.StateHeatFlows[s, t] / self.states[s].C * self.params['time_step'].v()
+            ##### Temperature change state
 
-        self.block.temp_change = Constraint(self.block.control_states, self.TIME, rule=_temp_change)
+            def _temp_change(b, s, t):
+                return b.StateTemperatures[s, t + 1] == b.StateTemperatures[s, t] + \
+                       b.StateHeatFlows[s, t] / self.states[s].C * self.params['time_step'].v()
+
+            self.block.temp_change = Constraint(self.block.control_states, self.TIME, rule=_temp_change)
+
+            ##### Heat flow through edge
+
+            def _edge_heat_flow(b, e, t):
+                e_ob = self.edges[e]
+                if e_ob.start in b.control_states:
+                    start_temp = b.StateTemperatures[e_ob.start, t]
+                else:
+                    start_temp = b.FixedTemperatures[e_ob.start, t]
+                if e_ob.stop in b.control_states:
+                    stop_temp = b.StateTemperatures[e_ob.stop, t]
+                else:
+                    stop_temp = b.FixedTemperatures[e_ob.stop, t]
+                return b.EdgeHeatFlows[e, t] == (start_temp - stop_temp) * e_ob.U
+
+            self.block.edge_heat_flow = Constraint(self.block.edge_names, self.TIME, rule=_edge_heat_flow)
 
         def _init_temp(b, s):
             if self.params[s + '0'].get_init_type() == 'fixedVal':
@@ -1186,23 +1797,8 @@ class RCmodel(Component):
                 raise Exception('{} is an initialization type that has not '
                                 'been implemented for the building RC models'.format(self.params[s + '0']))
 
-        self.block.init_temp = Constraint(self.block.control_states, rule=_init_temp)
-
-        ##### Heat flow through edge
-
-        def _edge_heat_flow(b, e, t):
-            e_ob = self.edges[e]
-            if e_ob.start in b.control_states:
-                start_temp = b.StateTemperatures[e_ob.start, t]
-            else:
-                start_temp = b.FixedTemperatures[e_ob.start, t]
-            if e_ob.stop in b.control_states:
-                stop_temp = b.StateTemperatures[e_ob.stop, t]
-            else:
-                stop_temp = b.FixedTemperatures[e_ob.stop, t]
-            return b.EdgeHeatFlows[e, t] == (start_temp - stop_temp) * e_ob.U
-
-        self.block.edge_heat_flow = Constraint(self.block.edge_names, self.TIME, rule=_edge_heat_flow)
+        if not uses_reduction(self):
+            self.block.init_temp = Constraint(self.block.control_states, rule=_init_temp)
 
         ##### Limit temperatures
 
@@ -1328,6 +1924,19 @@ class RCmodel(Component):
             # self.block.decl_temperatures = Constraint(self.TIME, rule=_decl_temperatures)
             # self.block.init_temperatures = Constraint(self.lines, rule=_init_temperatures)
 
+    def get_handover(self, n_steps):
+        """
+        Temperatures of the controlled states after n_steps time steps, the initial states of an optimization that
+        starts n_steps later
+
+        :param n_steps: Number of time steps the start time is moved forward
+        :return: dict with the names of the initial temperature parameters as keys
+        """
+        if uses_reduction(self):
+            return get_zoh_handover(self, n_steps)
+        return {s + '0': value(self.block.StateTemperatures[s, n_steps]) for s in self.block.control_states
+                if s + '0' in self.params}
+
     def create_params(self):
         params = Component.create_params(self)
 
@@ -1449,7 +2058,29 @@ class RCmodel(Component):
                                        'K'),
             'max_heat': DesignParameter('max_heat',
                                         'Maximum heating power through substation',
-                                        'W')
+                                        'W'),
+            'discretization': DesignParameter('discretization',
+                                              'Discretization of the state equations: \'euler\' (forward Euler, '
+                                              'with a heat flow variable per edge) or \'zoh\' (exact, inputs constant '
+                                              'during a time step)',
+                                              '-',
+                                              val='euler'),
+            'reduction': DesignParameter('reduction',
+                                         'Model order reduction of the \'zoh\' state equations: \'none\', '
+                                         '\'balanced\' (balanced truncation) or \'modal\' (modal truncation)',
+                                         '-',
+                                         val='none'),
+            'reduction_order': DesignParameter('reduction_order',
+                                               'Number of states of the reduced model. If 0, the smallest number of '
+                                               'states for which the error bound is at most reduction_tol',
+                                               '-',
+                                               val=0),
+            'reduction_tol': DesignParameter('reduction_tol',
+                                             'Error bound of the reduced model (H-infinity norm of the error on the '
+                                             'limited temperatures, per W or K of the inputs), used if '
+                                             'reduction_order is 0',
+                                             'K',
+                                             val=0)
         })
         return params
 
@@ -0,0 +1,249 @@
+"""
+Module to reduce a neighbourhood of building models to one aggregate building model per cluster of similar buildings.
+
+The buildings are given as a dict with the parameters of each building, as they would be passed to change_param of
+an RCmodel or TeaserFourElement. An aggregate model represents the average building of its cluster, with a
+multiplicity factor mult equal to the total mult of the cluster.
+
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from modesto.LTIModels.RCmodels import RCmodel, TeaserFourElement, TEASER_ORIENTATIONS, readTeaserParam, \
+    rc_state_space, discretize_zoh
+from pyomo.core.base import ConcreteModel
+from scipy.cluster.hierarchy import linkage, fcluster
+
+logger = logging.getLogger('modesto.LTIModels.aggregation')
+
+TEASER_NAMES = ['neighbName', 'streetName', 'buildingName']
+
+
+def get_teaser_params(params):
+    """
+    Return the TEASER parameters of a building
+
+    :param params: Parameters of the building
+    :return: dict as returned by readTeaserParam, or None if the building is not a TEASER building
+    """
+    if params.get('teaser_params') is not None:
+        return params['teaser_params']
+    elif all(name in params for name in TEASER_NAMES):
+        return readTeaserParam(*[params[name] for name in TEASER_NAMES])
+    return None
+
+
+def teaser_features(teaser_params):
+    """
+    Features of a TEASER building used to cluster buildings: all its parameters, with one value per orientation for
+    the parameters that are given per orientation
+
+    :param teaser_params: dict as returned by readTeaserParam
+    :return: np.array with the features
+    """
+    features = []
+    for key in sorted(teaser_params):
+        val = teaser_params[key]
+        if isinstance(val, dict):
+            features.extend(val[ori] for ori in TEASER_ORIENTATIONS)
+        else:
+            features.append(val)
+
+    return np.array(features, dtype=float)
+
+
+def cluster_buildings(buildings, n_clusters=None, max_distance=None):
+    """
+    Group buildings that can be represented by one aggregate model. RCmodel buildings are grouped by model_type. TEASER
+    buildings are clustered by their standardized parameters with Ward's hierarchical clustering, into n_clusters
+    clusters or into clusters of which the Ward distance stays below max_distance.
+
+    :param buildings: dict with the parameters of each building, see aggregate_buildings
+    :param n_clusters: Number of clusters of the TEASER buildings
+    :param max_distance: Maximum Ward distance between the TEASER buildings of a cluster, used if n_clusters is None
+    :return: dict with the names of the buildings (list) of each cluster
+    """
+    clusters = {}
+    teaser = []
+    for name in sorted(buildings):
+        params = buildings[name]
+        if 'model_type' in params:
+            clusters.setdefault(params['model_type'], []).append(name)
+        elif get_teaser_params(params) is not None:
+            teaser.append(name)
+        else:
+            raise ValueError('Building {} has neither a model_type nor TEASER parameters'.format(name))
+
+    if len(teaser) == 1:
+        clusters['teaser_0'] = teaser
+    elif teaser:
+        if n_clusters is None and max_distance is None:
+            raise ValueError('Give n_clusters or max_distance to cluster the TEASER buildings')
+
+        features = np.array([teaser_features(get_teaser_params(buildings[name])) for name in teaser])
+        std = features.std(axis=0)
+        std[std == 0] = 1
+        tree = linkage((features - features.mean(axis=0)) / std, method='ward')
+
+        if n_clusters is not None:
+            labels = fcluster(tree, t=n_clusters, criterion='maxclust')
+        else:
+            labels = fcluster(tree, t=max_distance, criterion='distance')
+
+        for label in sorted(set(labels)):
+            clusters['teaser_{}'.format(label - 1)] = [name for name, lab in zip(teaser, labels) if lab == label]
+
+    logger.info('{} buildings grouped in {} clusters'.format(len(buildings), len(clusters)))
+
+    return clusters
+
+
+def _weighted_mean(values, weights, key):
+    """
+    Weighted mean of the parameter values of the buildings in a cluster. Resistances (TEASER parameters starting with
+    R) are averaged as conductances.
+
+    :param values: List of values, all numbers, dicts or pd.Series
+    :param weights: np.array with the weights, adding up to 1
+    :param key: Name of the parameter
+    :return: Mean value
+    """
+    if isinstance(values[0], dict):
+        return {k: _weighted_mean([val[k] for val in values], weights, key) for k in values[0]}
+    elif isinstance(values[0], pd.Series):
+        return sum(w * val for w, val in zip(weights, values))
+    elif key.startswith('R'):
+        return 1 / sum(w / val for w, val in zip(weights, values))
+
+    return sum(w * val for w, val in zip(weights, values))
+
+
+def aggregate_buildings(buildings, clusters):
+    """
+    Make the parameters of the aggregate model of each cluster. Numbers and time series are averaged with mult as
+    weight, the TEASER parameters are averaged as well and given as teaser_params. mult becomes the total mult of the
+    cluster. Other parameters, e.g. model_type, must be the same for all buildings of a cluster.
+
+    :param buildings: dict with a dict of parameters of each building, as passed to change_param of an RCmodel or
+        TeaserFourElement. A missing mult counts as 1.
+    :param clusters: dict with the names of the buildings of each cluster, see cluster_buildings
+    :return: dict with the parameters of the aggregate model of each cluster
+    """
+    aggregates = {}
+
+    for cluster, names in clusters.items():
+        members = [dict(buildings[name]) for name in names]
+        mults = np.array([params.get('mult', 1) for params in members], dtype=float)
+        weights = mults / mults.sum()
+
+        teaser_params = [get_teaser_params(params) for params in members]
+        if teaser_params[0] is not None:
+            for params, tp in zip(members, teaser_params):
+                for name in TEASER_NAMES:
+                    params.pop(name, None)
+                params['teaser_params'] = tp
+
+        aggregate = {}
+        for key in members[0]:
+            if key == 'mult':
+                continue
+            if not all(key in params for params in members):
+                raise ValueError('Parameter {} is not given for all buildings of cluster {}'.format(key, cluster))
+
+            values = [params[key] for params in members]
+            first = values[0]
+            if key == 'teaser_params':
+                aggregate[key] = {k: _weighted_mean([val[k] for val in values], weights, k) for k in first}
+            elif isinstance(first, (pd.Series, dict)) or \
+                    (isinstance(first, (int, float, np.number)) and not isinstance(first, bool)):
+                aggregate[key] = _weighted_mean(values, weights, key)
+            elif all(val == first for val in values):
+                aggregate[key] = first
+            else:
+                raise ValueError('Parameter {} differs between the buildings of cluster {}'.format(key, cluster))
+
+        aggregate['mult'] = mults.sum()
+        aggregates[cluster] = aggregate
+
+    return aggregates
+
+
+def building_response(params, time_step=3600, n_steps=48):
+    """
+    Linear characteristics of a building model: the heat loss coefficient (steady state heating power per K of
+    temperature increase of the day zone), the dominant time constant and the response of the day zone temperature to
+    a step of 1 kW heating, divided equally over the control heat flows.
+
+    :param params: Parameters of the building, see aggregate_buildings. Only the parameters that describe the
+        building itself are used.
+    :param time_step: Time step of the step response in seconds
+    :param n_steps: Number of time steps of the step response
+    :return: dict with the heat loss coefficient in W/K ('H'), the time constant in seconds ('tau') and the step
+        response in K (np.array, 'step')
+    """
+    if 'model_type' in params:
+        comp = RCmodel('building')
+    else:
+        comp = TeaserFourElement('building')
+        comp.change_param('teaser_params', get_teaser_params(params))
+    for key in ['model_type', 'fra_rad', 'ACH']:
+        if key in params:
+            comp.change_param(key, params[key])
+
+    comp._make_block(ConcreteModel())
+    comp.build()
+
+    fixed_states = [s for s, obj in comp.states.items() if obj.input['temperature'] is not None]
+    control_states = [s for s in comp.states if s not in fixed_states]
+    ss = rc_state_space(comp.states, comp.edges, control_states, fixed_states, comp.controlVariables)
+
+    output = ss['dynamic'].index([s for s in ss['dynamic'] if comp.states[s].state_type == 'day'][0])
+    u = np.zeros(len(ss['inputs']))
+    for i in comp.controlVariables:
+        u[ss['inputs'].index(i)] = 1000 / len(comp.controlVariables)
+
+    A, B = discretize_zoh(ss['A'], ss['B'], time_step)
+    x = np.zeros(len(ss['dynamic']))
+    step = []
+    for t in range(n_steps):
+        x = A.dot(x) + B.dot(u)
+        step.append(x[output])
+
+    return {'H': 1000 / -np.linalg.solve(ss['A'], ss['B'].dot(u))[output],
+            'tau': -1 / np.max(np.linalg.eigvals(ss['A']).real),
+            'step': np.array(step)}
+
+
+def aggregation_error(buildings, clusters, aggregates=None, time_step=3600, n_steps=48):
+    """
+    Compare each building with the aggregate model of its cluster, see building_response
+
+    :param buildings: dict with the parameters of each building, see aggregate_buildings
+    :param clusters: dict with the names of the buildings of each cluster, see cluster_buildings
+    :param aggregates: dict with the parameters of the aggregate models, made by aggregate_buildings if None
+    :param time_step: Time step of the step responses in seconds
+    :param n_steps: Number of time steps of the step responses
+    :return: pd.DataFrame with a row per building with its cluster, its heat loss coefficient (H, W/K) and time
+        constant (tau, s), those of the aggregate model (H_cluster, tau_cluster), the relative error of the heat loss
+        coefficient (H_error) and the maximum difference of the step responses to 1 kW (step_error, K)
+    """
+    if aggregates is None:
+        aggregates = aggregate_buildings(buildings, clusters)
+
+    rows = []
+    for cluster, names in clusters.items():
+        agg = building_response(aggregates[cluster], time_step=time_step, n_steps=n_steps)
+        for name in names:
+            res = building_response(buildings[name], time_step=time_step, n_steps=n_steps)
+            rows.append({'building': name,
+                         'cluster': cluster,
+                         'H': res['H'],
+                         'H_cluster': agg['H'],
+                         'H_error': (agg['H'] - res['H']) / res['H'],
+                         'tau': res['tau'],
+                         'tau_cluster': agg['tau'],
+                         'step_error': np.max(np.abs(agg['step'] - res['step']))})
+
+    return pd.DataFrame(rows).set_index('building')
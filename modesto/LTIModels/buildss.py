@@ -9,6 +9,7 @@ discretize and transform them into optimization constraints.
 import numpy as np
 import scipy.io as sio
 from . import buildrc as rcm
+from .RCmodels import reduce_state_space
 from control import ss
 import pandas as pd
 
@@ -85,6 +86,48 @@ class StateSpace(object):
 
 
 
+    def reduce(self, order=0, tol=0, method='balanced', outputs=None):
+        """
+        Reduce the order of the continuous state space system, see
+        RCmodels.reduce_state_space. The states are replaced by the states of
+        the reduced model, named z0, z1, ...; C, DB and DE then give the
+        original states. Discretize after reducing.
+
+        :param order: Number of states of the reduced model, if 0 chosen with tol
+        :param tol: Error bound, used if order is 0
+        :param method: 'balanced' or 'modal'
+        :param outputs: Names of the states that have to be approximated well,
+            all states if None
+        :return: Error bound of the reduced model
+        """
+        A = np.asarray(self.cont['A'])
+        B = np.asarray(self.cont['B'])
+        E = np.asarray(self.cont['E'])
+        if outputs is None:
+            C = np.eye(len(A))
+        else:
+            C = np.eye(len(A))[[self.sta.index(s) for s in outputs]]
+
+        red = reduce_state_space(A, np.hstack([B, E]), C, method=method,
+                                 order=order, tol=tol)
+        n_inp = B.shape[1]
+
+        self.cont['A'] = red['A']
+        self.cont['B'] = red['B'][:, :n_inp]
+        self.cont['E'] = red['B'][:, n_inp:]
+        self.cont['C'] = red['X']
+        self.cont['DB'] = red['Y'][:, :n_inp]
+        self.cont['DE'] = red['Y'][:, n_inp:]
+        self.ssContB = ss(self.cont['A'], self.cont['B'], self.cont['C'],
+                          self.cont['DB'])
+        self.ssContE = ss(self.cont['A'], self.cont['E'], self.cont['C'],
+                          self.cont['DE'])
+        self.projection = red['P']
+        self.outputs = self.sta
+        self.sta = ['z' + str(i) for i in range(len(red['A']))]
+
+        return red['bound']
+
     def set_disturbance(self, dist=['Te', 'Tg', 'QsolN', 'QsolE', 'QsolS',
                                     'QsolW', 'QintD', 'QintN']):
         """
@@ -4,10 +4,13 @@ Description
 """
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+import pytest
 
 import modesto.utils as ut
 from modesto.main import Modesto
+from modesto.pipe import get_pipe_catalog, plug_flow_windows, register_pipe_catalog
 
 
 def setup_graph(forward=True):
@@ -296,6 +299,111 @@ def test_pipe_investment():
     # print(opt.components[])
 
 
+def test_pipe_catalog():
+    catalog = get_pipe_catalog()
+    assert get_pipe_catalog('Twin200Compound1000') is catalog
+    assert catalog.get('Di', 200) == catalog['Di'][list(catalog.dn).index(200)]
+    with pytest.raises(ValueError):
+        catalog['Rs'][0] = 0
+    with pytest.raises(KeyError):
+        catalog.get('Di', 123)
+
+    # Archived catalogs are found by name, custom ones can be registered
+    assert 'Max mflow' not in get_pipe_catalog('IsoPlusDoubleStandard').columns
+    custom = register_pipe_catalog('custom', pd.DataFrame({'Di': [0.1], 'Do': [0.11], 'Rs': [5.]},
+                                                          index=pd.Index([100], name='DN')))
+    assert get_pipe_catalog('custom') is custom
+    with pytest.raises(KeyError):
+        get_pipe_catalog('unknown')
+
+
+def test_pipe_catalog_parameter(monkeypatch):
+    catalog = get_pipe_catalog()
+
+    def read_csv(*args, **kwargs):
+        raise AssertionError('The pipe catalog should not be read again')
+
+    monkeypatch.setattr(pd, 'read_csv', read_csv)
+
+    G = setup_graph()
+    G.add_node('cons2', x=2000, y=0, z=0, comps={})
+    G.add_edge('cons', 'cons2', name='pipe2')
+    optmodel = Modesto(pipe_model='ExtensivePipe', graph=G)
+    assert optmodel.get_component('pipe').get_pipe_catalog() is catalog
+
+    register_pipe_catalog('copy', catalog.to_frame())
+    optmodel.change_param(node=None, comp='pipe2', param='pipe_catalog', val='copy')
+    assert optmodel.get_component('pipe2').get_pipe_catalog().name == 'copy'
+    assert optmodel.get_component('pipe').get_pipe_catalog() is catalog
+
+
+def test_plug_flow_windows():
+    # Reference: the step by step definitions of n, m, R, S and tk of the NodeMethod
+    def reference(mf_history, mass_flow, Z, dt):
+        n_steps = len(mass_flow)
+        result = {key: [] for key in ['n', 'm', 'R', 'S', 'tk']}
+        for t in range(n_steps):
+            a = n_steps - 1 - t
+            sums = np.cumsum(mf_history[a:] * dt)
+            n = int(np.argmax(sums > Z)) if (sums > Z).any() else len(sums) - 1
+            m = int(np.argmax(sums > Z + mass_flow[t] * dt)) if (sums > Z + mass_flow[t] * dt).any() else len(sums) - 1
+            R = sum(mf_history[i] * dt for i in range(a, a + n + 1))
+            S = sum(mf_history[i] * dt for i in range(a, a + m)) if m > n else R
+            if mass_flow[t] == 0:
+                tk = np.nan
+            else:
+                tk = dt * ((R - Z) * n + sum(mf_history[a + i] * dt * i for i in range(n + 1, m))
+                           + (mass_flow[t] * dt - S + Z) * m) / mass_flow[t] / dt
+            for key, val in zip(['n', 'm', 'R', 'S', 'tk'], [n, m, R, S, tk]):
+                result[key].append(val)
+        return result
+
+    rng = np.random.RandomState(0)
+    mass_flow = rng.uniform(0, 5, 48)
+    mass_flow[[3, 10]] = 0
+    history = rng.uniform(0, 5, 100)
+    mf_history = np.concatenate([mass_flow[::-1], history])
+
+    for Z in [100., 5000., 1e6]:
+        windows = plug_flow_windows(mf_history, mass_flow, Z, 900)
+        expected = reference(mf_history, mass_flow, Z, 900)
+        for key in ['n', 'm']:
+            assert np.array_equal(windows[key], expected[key])
+        for key in ['R', 'S', 'tk']:
+            assert np.allclose(windows[key], expected[key], equal_nan=True)
+        # The largest mass does not fit in the history
+        assert windows['found_n'].all() == (Z < 1e6)
+
+    # Negative flows
+    mf_history[[5, 60]] *= -1
+    windows = plug_flow_windows(mf_history, mass_flow, 5000., 900)
+    expected = reference(mf_history, mass_flow, 5000., 900)
+    assert np.array_equal(windows['n'], expected['n'])
+    assert np.allclose(windows['tk'], expected['tk'], equal_nan=True)
+
+
+def test_plug_flow_windows_batch():
+    rng = np.random.RandomState(1)
+    n_steps = 24
+    lengths = np.array([n_steps + 10, n_steps + 60, n_steps + 35])
+    mass_flow = rng.uniform(0, 5, (3, n_steps))
+    mass_flow[1, 5] = 0
+    mf_history = np.zeros((3, lengths.max()))
+    for i, length in enumerate(lengths):
+        mf_history[i, :length] = np.concatenate([mass_flow[i, ::-1], rng.uniform(0, 5, length - n_steps)])
+    mf_history[2, 30] = -1
+    mass = np.array([2000., 3e5, 8000.])
+
+    windows = plug_flow_windows(mf_history, mass_flow, mass, 900, lengths)
+    for i, length in enumerate(lengths):
+        expected = plug_flow_windows(mf_history[i, :length], mass_flow[i], mass[i], 900)
+        for key, val in expected.items():
+            assert np.allclose(windows[key][i], val, equal_nan=True)
+    # The history of the second pipe is too short, padding is not used
+    assert not windows['found_n'][1].all()
+    assert windows['n'][1].max() == lengths[1] - 1
+
+
 if __name__ == '__main__':
     test_pipe_investment()
 
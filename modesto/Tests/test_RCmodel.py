@@ -41,6 +41,184 @@ def test_rc_model():
         return False
 
 
+def test_rc_structure_shared():
+    from modesto.LTIModels.RCmodels import RCmodel, get_rc_structure
+
+    buildings = [RCmodel('building' + str(i)) for i in range(3)]
+    for building in buildings:
+        building.change_param('model_type', 'SFH_D_1_2zone_TAB')
+        building.build()
+    buildings[2].change_param('model_type', 'SFH_T_5_TAB')
+    buildings[2].build()
+    buildings[2].build()
+
+    shared = get_rc_structure('SFH_D_1_2zone_TAB')
+    assert buildings[0].structure is buildings[1].structure is shared['structure']
+    assert all(buildings[1].states[state] is obj for state, obj in buildings[0].states.items())
+    assert buildings[2].states['TiD'] is not buildings[0].states['TiD']
+    assert buildings[2].controlVariables == ['Q_hea_D', 'Q_hea_N']
+
+
+def test_rc_zoh():
+    from modesto.LTIModels.RCmodels import RCmodel, TeaserFourElement, rc_state_space, discretize_zoh
+    import numpy as np
+    import pandas as pd
+
+    building = RCmodel('building')
+    building.change_param('model_type', 'SFH_D_1_2zone_TAB')
+    building.build()
+    fixed_states = [s for s, obj in building.states.items() if obj.input['temperature'] is not None]
+    control_states = [s for s in building.states if s not in fixed_states]
+    ss = rc_state_space(building.states, building.edges, control_states, fixed_states, building.controlVariables)
+    A, B = discretize_zoh(ss['A'], ss['B'], 3600)
+
+    # Forward Euler with small time steps converges to the exact discretization
+    x = np.full(len(ss['dynamic']), 293.15)
+    w = np.random.RandomState(0).uniform(0, 1000, len(ss['inputs']))
+    x_exact = A.dot(x) + B.dot(w)
+    for i in range(3600):
+        x = x + 1 * (ss['A'].dot(x) + ss['B'].dot(w))
+    np.testing.assert_allclose(x, x_exact, atol=1e-2)
+
+    index = pd.date_range('20140201', freq='3600S', periods=30)
+    teaser = TeaserFourElement('teaser')
+    params = {'neighbName': 'OudWinterslag',
+              'streetName': 'Gierenshof',
+              'buildingName': 'Gierenshof_22_1589272',
+              'day_min_temperature': pd.Series(16 + 273.15, index=index),
+              'day_max_temperature': pd.Series(24 + 273.15, index=index),
+              'floor_min_temperature': pd.Series(16 + 273.15, index=index),
+              'floor_max_temperature': pd.Series(30 + 273.15, index=index),
+              'Te': pd.Series(273.15, index=index),
+              'Tg': pd.Series(283.15, index=index),
+              'Q_int_rad': pd.Series(0, index=index),
+              'Q_int_con': pd.Series(0, index=index),
+              'delta_T': 20,
+              'mult': 1,
+              'max_heat': 10000,
+              'time_step': 3600,
+              'horizon': 24 * 3600,
+              'TAir0': 20 + 273.15,
+              'discretization': 'zoh'}
+    for ori in ['N', 'E', 'S', 'W']:
+        params['Q_sol_' + ori] = pd.Series(0, index=index)
+    for param in params:
+        teaser.change_param(param, params[param])
+    teaser.compile(model=ConcreteModel(), start_time=pd.Timestamp('20140201'))
+
+    assert not hasattr(teaser.block, 'EdgeHeatFlows')
+    assert len(teaser.block.state_equation) == 5 * 24
+    assert set(teaser.block.algebraic_states) == {'TRoofRad', 'TWinRad', 'TExtRad', 'TFloorRad', 'TIntRad'}
+
+
+def test_rc_reduction():
+    from modesto.LTIModels.RCmodels import RCmodel, TeaserFourElement, readTeaserParam, rc_state_space, \
+        reduce_state_space
+    import numpy as np
+    import pandas as pd
+
+    building = RCmodel('building')
+    building.change_param('model_type', 'SFH_D_1_2zone_TAB')
+    building.build()
+    fixed_states = [s for s, obj in building.states.items() if obj.input['temperature'] is not None]
+    control_states = [s for s in building.states if s not in fixed_states]
+    ss = rc_state_space(building.states, building.edges, control_states, fixed_states, building.controlVariables)
+    A, B = ss['A'], ss['B']
+    C = np.eye(len(A))[[ss['dynamic'].index('TiD'), ss['dynamic'].index('TiN')]]
+
+    for method in ['balanced', 'modal']:
+        full = reduce_state_space(A, B, C, method=method, order=len(A))
+        np.testing.assert_allclose(full['X'].dot(full['A']).dot(full['P']), A, atol=1e-12)
+
+        red = reduce_state_space(A, B, C, method=method, order=3)
+        assert red['A'].shape == (3, 3) and red['X'].shape == (len(A), 3)
+        np.testing.assert_allclose(red['P'].dot(red['X']), np.eye(3), atol=1e-9)
+
+        # The steady state gains are kept
+        gain = -C.dot(np.linalg.solve(A, B))
+        gain_red = C.dot(-red['X'].dot(np.linalg.solve(red['A'], red['B'])) + red['Y'])
+        np.testing.assert_allclose(gain_red, gain, rtol=1e-6, atol=1e-12)
+
+        # The error on a sine input stays below the bound
+        w = np.random.RandomState(0).uniform(-1, 1, B.shape[1])
+        for freq in [1e-6, 1e-5, 1e-4]:
+            y = C.dot(np.linalg.solve(2j * np.pi * freq * np.eye(len(A)) - A, B.dot(w)))
+            x_red = np.linalg.solve(2j * np.pi * freq * np.eye(3) - red['A'], red['B'].dot(w))
+            y_red = C.dot(red['X'].dot(x_red) + red['Y'].dot(w))
+            assert np.linalg.norm(y - y_red) <= red['bound'] * np.linalg.norm(w) * (1 + 1e-6)
+
+    assert reduce_state_space(A, B, C, tol=1e-2)['bound'] <= 1e-2
+
+    index = pd.date_range('20140201', freq='3600S', periods=30)
+    teaser = TeaserFourElement('teaser')
+    params = {'teaser_params': readTeaserParam('OudWinterslag', 'Gierenshof', 'Gierenshof_22_1589272'),
+              'day_min_temperature': pd.Series(16 + 273.15, index=index),
+              'day_max_temperature': pd.Series(24 + 273.15, index=index),
+              'floor_min_temperature': pd.Series(16 + 273.15, index=index),
+              'floor_max_temperature': pd.Series(30 + 273.15, index=index),
+              'Te': pd.Series(273.15, index=index),
+              'Tg': pd.Series(283.15, index=index),
+              'Q_int_rad': pd.Series(0, index=index),
+              'Q_int_con': pd.Series(0, index=index),
+              'delta_T': 20,
+              'mult': 1,
+              'max_heat': 10000,
+              'time_step': 3600,
+              'horizon': 24 * 3600,
+              'TAir0': 20 + 273.15,
+              'discretization': 'zoh',
+              'reduction': 'balanced',
+              'reduction_order': 2}
+    for ori in ['N', 'E', 'S', 'W']:
+        params['Q_sol_' + ori] = pd.Series(0, index=index)
+    for param in params:
+        teaser.change_param(param, params[param])
+    teaser.compile(model=ConcreteModel(), start_time=pd.Timestamp('20140201'))
+
+    assert len(teaser.block.reduced_states) == 2
+    assert len(teaser.block.state_equation) == 2 * 24
+    assert list(teaser.block.temperature_states) == ['TAir']
+    assert not hasattr(teaser.block, 'init_temp')
+
+
+def test_aggregation():
+    from modesto.LTIModels.RCmodels import TeaserFourElement, readTeaserParam, read_teaser_street
+    from modesto.LTIModels.aggregation import cluster_buildings, aggregate_buildings, aggregation_error
+    import numpy as np
+
+    names = sorted(read_teaser_street('OudWinterslag', 'Gierenshof')['rows'])[:6]
+    buildings = {name: {'neighbName': 'OudWinterslag', 'streetName': 'Gierenshof', 'buildingName': name,
+                        'mult': i + 1, 'delta_T': 20} for i, name in enumerate(names)}
+    buildings['rc0'] = {'model_type': 'SFH_D_1_2zone_TAB', 'mult': 10, 'delta_T': 20}
+    buildings['rc1'] = {'model_type': 'SFH_D_1_2zone_TAB', 'mult': 5, 'delta_T': 10}
+
+    clusters = cluster_buildings(buildings, n_clusters=2)
+    assert clusters['SFH_D_1_2zone_TAB'] == ['rc0', 'rc1']
+    assert sorted(sum((clusters[c] for c in clusters if c.startswith('teaser')), [])) == names
+    assert len(clusters) == 3
+
+    aggregates = aggregate_buildings(buildings, clusters)
+    assert aggregates['SFH_D_1_2zone_TAB']['model_type'] == 'SFH_D_1_2zone_TAB'
+    assert aggregates['SFH_D_1_2zone_TAB']['mult'] == 15
+    assert np.isclose(aggregates['SFH_D_1_2zone_TAB']['delta_T'], (10 * 20 + 5 * 10) / 15)
+    assert sum(agg['mult'] for agg in aggregates.values()) == 15 + 21
+
+    # A cluster of one building reproduces it
+    single = {'single': [names[0]]}
+    teaser_params = aggregate_buildings(buildings, single)['single']['teaser_params']
+    assert teaser_params == readTeaserParam('OudWinterslag', 'Gierenshof', names[0])
+
+    report = aggregation_error(buildings, clusters, aggregates)
+    assert list(report.index) == sum(clusters.values(), [])
+    assert np.allclose(report.loc[['rc0', 'rc1'], ['H_error', 'step_error']], 0)
+    assert (report['H'] > 0).all() and (report['tau'] > 0).all()
+
+    teaser = TeaserFourElement('teaser')
+    teaser.change_param('teaser_params', aggregates['teaser_0']['teaser_params'])
+    assert not any(name in teaser.check_data()[0] for name in ['neighbName', 'streetName', 'buildingName',
+                                                               'teaser_params'])
+
+
 def test_splitfactor_intgains():
     from modesto.LTIModels.RCmodels import splitFactor
     AExt = {'S': 82.906123538469942,
@@ -156,6 +334,42 @@ def test_readTeaserParam():
                                                                                             'N': 21.868839102889993}}
 
 
+def test_readTeaserParams(tmpdir, monkeypatch):
+    import pandas as pd
+    import pytest
+    from modesto.LTIModels import RCmodels as rc
+
+    rc.clear_teaser_cache()
+    read_csv = pd.read_csv
+    reads = []
+
+    def counting_read_csv(*args, **kwargs):
+        reads.append(args[0])
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', counting_read_csv)
+
+    # Every street is parsed once
+    params = rc.readTeaserParams('OudWinterslag')
+    assert len(reads) == len(params)
+    building = params['Gierenshof']['Gierenshof_22_1589272']
+    assert building == rc.readTeaserParam('OudWinterslag', 'Gierenshof', 'Gierenshof_22_1589272')
+    assert building['AWin']['E'] == pytest.approx(22.835507350388625)
+    assert isinstance(building['nOrientations'], int)
+    assert len(reads) == len(params)
+
+    # The binary dump replaces the csv files
+    path = str(tmpdir.join('teaser.pkl'))
+    rc.dump_teaser_data(path)
+    rc.clear_teaser_cache()
+    reads.clear()
+    rc.load_teaser_data(path)
+    assert rc.readTeaserParams('OudWinterslag') == params
+    assert reads == []
+    with pytest.raises(KeyError):
+        rc.readTeaserParam('OudWinterslag', 'Gierenshof', 'unknown')
+
+
 def test_teaser_four_element():
     from modesto.LTIModels.RCmodels import TeaserFourElement
     import pandas as pd
@@ -68,3 +68,52 @@ def test_mass_flow_calculation():
 
     if not flag:
         raise Exception('The mass flow calculation was incorrect')
+
+
+def test_edge_mf_dataframe():
+    n_steps = 10
+    test = MfCalculation(make_graph(), horizon=(n_steps - 2) * 300, time_step=300)
+    test.set_producer_component('plant')
+    test.set_producer_node('ThorPark')
+
+    heat_profile = pd.Series(np.linspace(0, 1000, n_steps),
+                             index=pd.date_range(start='20140101', freq='300S', periods=n_steps))
+    test.add_mf(node='waterscheiGarden', name='buildingD', mf_df=heat_profile, dir='out')
+    test.add_mf(node='zwartbergNE', name='buildingD', mf_df=2 * heat_profile, dir='out')
+    test.calculate_mf()
+
+    edge_mf = test.get_edge_mfs()
+    assert list(edge_mf.columns) == ['bbThor', 'spWaterschei', 'spZwartbergNE']
+    assert np.allclose(edge_mf['bbThor'].iloc[:-2], 3 * heat_profile.iloc[:-2])
+    assert np.allclose(edge_mf['spZwartbergNE'].iloc[:-2], 2 * heat_profile.iloc[:-2])
+    # Time steps after the horizon are not calculated
+    assert (edge_mf.iloc[-2:] == 0).all().all()
+    assert np.allclose(test.get_comp_mf('ThorPark', 'plant').iloc[:-2], 3 * heat_profile.iloc[:-2])
+
+
+def test_meshed_network_producer_shares():
+    G = nx.DiGraph()
+    for node in ['a', 'b', 'c', 'd']:
+        G.add_node(node, x=0, y=0, z=0, comps={'building': 'BuildingFixed', 'plant': 'ProducerVariable'})
+    for start, end in [('a', 'b'), ('b', 'c'), ('c', 'd'), ('d', 'a')]:
+        G.add_edge(start, end, name=start + end)
+
+    test = MfCalculation(G, horizon=3 * 3600, time_step=3600)
+    test.set_producer_node('a')
+    test.set_producer_component('plant')
+    test.add_producer('c', 'plant', 0.25)
+
+    index = pd.date_range(start='20140101', freq='H', periods=3)
+    for node in ['a', 'b', 'c', 'd']:
+        test.add_mf(node=node, name='building', mf_df=pd.Series(1., index=index), dir='out')
+    for node in ['b', 'd']:
+        test.add_mf(node=node, name='plant', mf_df=pd.Series(0., index=index), dir='in')
+    result = test.calculate_mf()
+
+    assert np.allclose(result['a']['plant'], 3)
+    assert np.allclose(result['c']['plant'], 1)
+    # Flows through the ring are split symmetrically
+    edge_mf = test.get_edge_mfs()
+    assert np.allclose(edge_mf['ab'], 1)
+    assert np.allclose(edge_mf['da'], -1)
+    assert np.allclose(edge_mf[['bc', 'cd']], 0)
@@ -2,3 +2,296 @@
 """
 Description
 """
+import networkx as nx
+import pandas as pd
+import pytest
+from pyomo.core.base import value
+from pyomo.opt import SolverFactory
+
+from modesto.main import Modesto
+
+
+def set_up_modesto(pipe_model='SimplePipe'):
+    G = nx.DiGraph()
+
+    G.add_node('plant', x=0, y=0, z=0, comps={'gen': 'ProducerVariable'})
+    G.add_node('user', x=10, y=0, z=0, comps={'building': 'BuildingFixed'})
+    G.add_node('user2', x=20, y=0, z=0, comps={'building': 'BuildingFixed'})
+
+    G.add_edge('plant', 'user', name='pipe')
+    G.add_edge('user', 'user2', name='pipe2')
+
+    time_index = pd.date_range(start='20140101', freq='H', periods=48)
+    zeros = pd.Series(0., index=time_index)
+    ones = pd.Series(1., index=time_index)
+
+    optmodel = Modesto(pipe_model=pipe_model, graph=G)
+    optmodel.change_params({'Te': zeros,
+                            'Tg': zeros,
+                            'Q_sol_E': zeros,
+                            'Q_sol_W': zeros,
+                            'Q_sol_S': zeros,
+                            'Q_sol_N': zeros,
+                            'horizon': 24 * 3600,
+                            'time_step': 3600,
+                            'cost_elec': ones,
+                            'PEF_elec': ones,
+                            'CO2_elec': ones})
+
+    for node in ['user', 'user2']:
+        optmodel.change_params({'temperature_supply': 80 + 273.15,
+                                'temperature_return': 60 + 273.15,
+                                'mult': 1,
+                                'DHW_demand': zeros,
+                                'heat_profile': ones * 1e4},
+                               node=node, comp='building')
+
+    optmodel.change_params({'delta_T': 20,
+                            'efficiency': 0.95,
+                            'CO2': 0.2052,
+                            'fuel_cost': ones,
+                            'Qmax': 1e5,
+                            'Qmin': 0,
+                            'ramp_cost': 1,
+                            'ramp': 1e5,
+                            'cost_inv': 1},
+                           node='plant', comp='gen')
+
+    if pipe_model == 'ExtensivePipe':
+        for pipe in ['pipe', 'pipe2']:
+            optmodel.change_params({'temperature_supply': 80 + 273.15,
+                                    'temperature_return': 60 + 273.15,
+                                    'diameter': 50},
+                                   comp=pipe)
+
+    return optmodel
+
+
+def test_dirty_components():
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+    assert optmodel.get_dirty_components() == set()
+
+    optmodel.change_param(node='user2', comp='building', param='temperature_supply', val=90 + 273.15)
+    assert optmodel.get_dirty_components() == {'user2.building'}
+
+    # Mutable parameters do not require a rebuild
+    optmodel.change_param(node='user', comp='building', param='mult', val=2)
+    assert optmodel.get_dirty_components() == {'user2.building'}
+
+    # General parameters are shared by all components
+    optmodel.change_general_param('Te', pd.Series(1., index=pd.date_range(start='20140101', freq='H', periods=48)))
+    assert {'pipe', 'pipe2', 'user2.building'} == optmodel.get_dirty_components()
+
+
+def test_incremental_recompilation():
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+    optmodel.set_objective('cost')
+
+    kept = {name: optmodel.model.component(name) for name in ['plant', 'user', 'pipe', 'pipe2', 'plant.gen',
+                                                                'user.building']}
+    rebuilt = {name: optmodel.model.component(name) for name in ['user2', 'user2.building']}
+
+    optmodel.change_param(node='user2', comp='building', param='temperature_supply', val=90 + 273.15)
+    optmodel.compile('20140101', recompile=True)
+
+    assert all(block is optmodel.model.component(name) for name, block in kept.items())
+    assert all(block is not optmodel.model.component(name) for name, block in rebuilt.items())
+    assert optmodel.get_dirty_components() == set()
+    assert round(value(optmodel.model.component('user2.building').mass_flow[0]), 6) == round(1e4 / 4180 / 30, 6)
+    assert optmodel.get_objective(get_value=False).active
+
+
+@pytest.mark.skipif(not SolverFactory('appsi_highs').available(exception_flag=False),
+                    reason='HiGHS is not available')
+def test_persistent_solve():
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+    optmodel.set_objective('cost')
+
+    assert optmodel.solve(solver='appsi_highs', persistent=True) == 0
+    solver = optmodel.solver
+    base_cost = optmodel.get_objective()
+
+    # Mutable parameter
+    optmodel.change_param(node='user', comp='building', param='mult', val=3)
+    optmodel.compile('20140101')
+    assert optmodel.solve(solver='appsi_highs', persistent=True) == 0
+    assert optmodel.get_objective() == pytest.approx(2 * base_cost)
+
+    # Rebuilt component
+    optmodel.change_param(node='user2', comp='building', param='heat_profile',
+                          val=pd.Series(3e4, index=pd.date_range(start='20140101', freq='H', periods=48)))
+    optmodel.compile('20140101', recompile=True)
+    assert optmodel.solve(solver='appsi_highs', persistent=True) == 0
+    assert optmodel.get_objective() == pytest.approx(3 * base_cost)
+    assert optmodel.solver is solver
+
+
+def test_profiling():
+    optmodel = set_up_modesto()
+    optmodel.enable_profiling(memory=True)
+    optmodel.compile('20140101')
+
+    report = optmodel.get_profile()
+    assert set(report['step']) == {'edge', 'component', 'balance', 'objectives'}
+    assert set(report.loc[report['step'] == 'edge', 'name']) == {'pipe', 'pipe2'}
+    assert set(report.loc[report['step'] == 'component', 'name']) == {'plant.gen', 'user.building',
+                                                                      'user2.building'}
+    assert (report['time'] >= 0).all()
+    assert (report['peak_memory'].dropna() >= 0).all()
+
+    producer = report[report['name'] == 'plant.gen'].iloc[0]
+    assert producer['vars'] > 0 and producer['constraints'] > 0
+    assert optmodel.get_profile(summary=True).loc['balance', 'calls'] == 3
+
+    # Only the rebuilt component is recorded
+    optmodel.enable_profiling()
+    optmodel.change_param(node='user2', comp='building', param='temperature_supply', val=90 + 273.15)
+    optmodel.compile('20140101', recompile=True)
+    report = optmodel.get_profile()
+    assert 'peak_memory' not in report
+    assert list(report.loc[report['step'] == 'balance', 'name']) == ['user2']
+
+    # Updating the mutable parameters of existing blocks creates nothing
+    optmodel.enable_profiling()
+    optmodel.compile('20140101')
+    report = optmodel.get_profile()
+    components = report[report['step'] == 'component']
+    assert len(components) == 3
+    assert (components[['vars', 'constraints', 'params']] == 0).all().all()
+
+    optmodel.disable_profiling()
+    optmodel.compile('20140101')
+    assert optmodel.profiler is None
+
+
+def test_lazy_objectives():
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+    assert optmodel.objectives == {}
+
+    optmodel.set_objective('cost')
+    assert list(optmodel.objectives) == ['cost']
+    assert optmodel.model.component('OBJ_ENERGY') is None
+    cost = optmodel.get_objective(get_value=False)
+    assert cost.active
+
+    # The buildings do not contribute to the cost, rebuilding them keeps the objective
+    optmodel.get_objective('energy', get_value=False)
+    optmodel.change_param(node='user2', comp='building', param='temperature_supply', val=90 + 273.15)
+    optmodel.compile('20140101', recompile=True)
+    assert optmodel.get_objective(get_value=False) is cost
+
+    # The producer contributes to all objectives, the active one is rebuilt right away
+    optmodel.change_param(node='plant', comp='gen', param='efficiency', val=0.9)
+    optmodel.compile('20140101', recompile=True)
+    assert list(optmodel.objectives) == ['cost']
+    assert optmodel.get_objective(get_value=False) is not cost
+    assert optmodel.get_objective(get_value=False).active
+
+    optmodel.add_objective('weighted', weights={'cost': 1, 'co2': 100})
+    optmodel.set_objective('weighted')
+    assert optmodel.model.component('OBJ_WEIGHTED').active
+    assert not optmodel.objectives['cost'].active
+
+    with pytest.raises(ValueError):
+        optmodel.set_objective('unknown')
+
+
+@pytest.mark.skipif(not SolverFactory('appsi_highs').available(exception_flag=False),
+                    reason='HiGHS is not available')
+def test_sizing():
+    optmodel = set_up_modesto()
+    optmodel.change_param(node='plant', comp='gen', param='cost_inv',
+                          val=pd.Series([0., 5e4, 8e4], index=[0., 1e4, 1e5]))
+    optmodel.change_sizing(node='plant', comp='gen', lb=0, ub=2e5, pw_repn='INC')
+    optmodel.compile('20140101')
+    optmodel.set_objective('cost_total')
+    assert optmodel.solve(solver='appsi_highs') == 0
+
+    # The smallest producer that covers both buildings
+    gen = optmodel.get_component('gen', node='plant')
+    assert value(gen.block.Qmax) == pytest.approx(2e4)
+    assert gen.get_investment_cost() == pytest.approx(5e4 + 1e4 * 3e4 / 9e4)
+    annual = gen.annualize_investment(0.05) + gen.fixed_maintenance()
+    assert optmodel.get_objective() == pytest.approx(optmodel.get_objective('cost') + annual / 365)
+
+    optmodel.change_sizing(node='plant', comp='gen')
+    assert optmodel.get_dirty_components() == {'plant.gen'}
+    optmodel.compile('20140101', recompile=True)
+    assert optmodel.model.component('plant.gen').component('investment') is None
+
+
+@pytest.mark.skipif(not SolverFactory('appsi_highs').available(exception_flag=False),
+                    reason='HiGHS is not available')
+def test_pipe_sizing():
+    optmodel = set_up_modesto('ExtensivePipe')
+    optmodel.compile('20140101')
+    optmodel.set_objective('cost')
+    assert optmodel.solve(solver='appsi_highs') == 0
+    fixed_cost = optmodel.get_objective()
+
+    # A single candidate gives the model with a fixed diameter
+    for pipe in ['pipe', 'pipe2']:
+        optmodel.change_sizing(comp=pipe, lb=50, ub=50)
+    optmodel.compile('20140101', recompile=True)
+    assert optmodel.solve(solver='appsi_highs') == 0
+    assert optmodel.get_objective() == pytest.approx(fixed_cost)
+    assert optmodel.get_component('pipe').get_diameter() == 50
+
+    for pipe in ['pipe', 'pipe2']:
+        optmodel.change_sizing(comp=pipe, lb=0, ub=500)
+    optmodel.order_sizes(['pipe', 'pipe2'])
+    optmodel.compile('20140101', recompile=True)
+    optmodel.set_objective('cost_total')
+    assert optmodel.solve(solver='appsi_highs') == 0
+
+    pipe, pipe2 = optmodel.get_component('pipe'), optmodel.get_component('pipe2')
+    catalog = pipe.get_pipe_catalog()
+    assert pipe.get_diameter() >= pipe2.get_diameter() > 0
+    assert pipe.get_investment_cost() == pytest.approx(10 * (308.46 + 2.18 * pipe.get_diameter()))
+    for comp in [pipe, pipe2]:
+        mass_flow = optmodel.get_result('mass_flow', comp=comp.name)
+        assert mass_flow.abs().max() <= catalog.get('Max mflow', comp.get_diameter()) + 1e-6
+
+
+@pytest.mark.skipif(not SolverFactory('appsi_highs').available(exception_flag=False),
+                    reason='HiGHS is not available')
+def test_get_results():
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+    optmodel.set_objective('cost')
+    assert optmodel.solve(solver='appsi_highs') == 0
+
+    wide = optmodel.get_results()
+    assert len(wide) == 24
+    assert 'plant.gen.heat_flow' in wide and 'pipe2.mass_flow' in wide
+    assert (wide['plant.gen.heat_flow'] == optmodel.get_result('heat_flow', node='plant', comp='gen')).all()
+
+    long = optmodel.get_results(names='heat_flow', components=['plant.gen', 'user.building', 'pipe'], form='long')
+    assert list(long.columns) == ['time', 'component', 'name', 'element', 'value']
+    assert set(long['component']) == {'plant.gen', 'user.building'}
+    producer = long[long['component'] == 'plant.gen']
+    assert producer['value'].sum() == pytest.approx(wide['plant.gen.heat_flow'].sum())
+
+
+@pytest.mark.skipif(not SolverFactory('appsi_highs').available(exception_flag=False),
+                    reason='HiGHS is not available')
+@pytest.mark.parametrize('extension, module', [('.parquet', 'pyarrow'), ('.h5', 'tables')])
+def test_write_results(tmpdir, extension, module):
+    pytest.importorskip(module)
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+    optmodel.set_objective('cost')
+    assert optmodel.solve(solver='appsi_highs') == 0
+
+    path = str(tmpdir.join('results' + extension))
+    assert optmodel.get_results(path=path) is None
+    if extension == '.parquet':
+        written = pd.read_parquet(path)
+    else:
+        written = pd.read_hdf(path, 'results')
+    pd.testing.assert_frame_equal(written.reset_index(drop=True), optmodel.get_results(form='long'),
+                                  check_dtype=False)
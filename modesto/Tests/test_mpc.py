@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Description
+"""
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+from pyomo.core.base import value
+from pyomo.opt import SolverFactory
+
+from modesto.main import Modesto
+from modesto.mpc import MPCRunner
+
+
+def set_up_modesto(heat_stor=0):
+    G = nx.DiGraph()
+
+    G.add_node('plant', x=0, y=0, z=0, comps={'gen': 'ProducerVariable'})
+    G.add_node('user', x=10, y=0, z=0, comps={'building': 'BuildingFixed', 'stor': 'StorageVariable'})
+
+    G.add_edge('plant', 'user', name='pipe')
+
+    time_index = pd.date_range(start='20140101', freq='H', periods=72)
+    zeros = pd.Series(0., index=time_index)
+    ones = pd.Series(1., index=time_index)
+    ambient = pd.Series(283.15, index=time_index)
+    price = pd.Series(np.where(time_index.hour < 12, 1., 3.), index=time_index)
+
+    optmodel = Modesto(pipe_model='SimplePipe', graph=G)
+    optmodel.change_params({'Te': ambient,
+                            'Tg': ambient,
+                            'Q_sol_E': zeros,
+                            'Q_sol_W': zeros,
+                            'Q_sol_S': zeros,
+                            'Q_sol_N': zeros,
+                            'horizon': 24 * 3600,
+                            'time_step': 3600,
+                            'cost_elec': ones,
+                            'PEF_elec': ones,
+                            'CO2_elec': ones})
+
+    optmodel.change_params({'temperature_supply': 80 + 273.15,
+                            'temperature_return': 60 + 273.15,
+                            'mult': 1,
+                            'DHW_demand': zeros,
+                            'heat_profile': ones * 1e5},
+                           node='user', comp='building')
+
+    optmodel.change_params({'temperature_supply': 80 + 273.15,
+                            'temperature_return': 60 + 273.15,
+                            'mflo_max': 100,
+                            'mflo_min': -100,
+                            'volume': 100,
+                            'heat_stor': heat_stor,
+                            'stor_type': 1,
+                            'mflo_use': zeros,
+                            'cost_inv': 1},
+                           node='user', comp='stor')
+
+    optmodel.change_params({'delta_T': 20,
+                            'efficiency': 0.95,
+                            'CO2': 0.2052,
+                            'fuel_cost': price,
+                            'Qmax': 1e6,
+                            'Qmin': 0,
+                            'ramp_cost': 0,
+                            'ramp': 1e6,
+                            'cost_inv': 1},
+                           node='plant', comp='gen')
+
+    return optmodel
+
+
+def test_n_steps():
+    with pytest.raises(ValueError):
+        MPCRunner(set_up_modesto(), n_steps=25)
+
+
+def test_init_type_needs_rebuild():
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+
+    # The initial value is mutable, the type of initialization constraint is not
+    optmodel.change_param(node='user', comp='stor', param='heat_stor', val=100)
+    assert optmodel.get_dirty_components() == set()
+    optmodel.change_init_type('heat_stor', 'cyclic', node='user', comp='stor')
+    assert optmodel.get_dirty_components() == {'user.stor'}
+
+
+@pytest.mark.skipif(not SolverFactory('appsi_highs').available(exception_flag=False),
+                    reason='HiGHS is not available')
+def test_receding_horizon():
+    optmodel = set_up_modesto()
+    runner = MPCRunner(optmodel, n_steps=6, solve_kwargs={'solver': 'appsi_highs'})
+
+    start_time = pd.Timestamp('20140101')
+    blocks = []
+    for _ in range(3):
+        status, start_time = runner.step(start_time)
+        assert status == 0
+        storage = optmodel.components['user.stor']
+        heat_stor = value(storage.block.heat_stor[6])
+        assert storage.params['heat_stor'].v() == heat_stor
+        blocks.append(storage.block)
+
+    assert start_time == pd.Timestamp('20140101 18:00')
+    # The storage model is reused, only its initial state changes
+    assert blocks[0] is blocks[1] is blocks[2]
+
+    # Compare the last window with a model that is built from scratch
+    status, _ = runner.step(start_time)
+    fresh = set_up_modesto(heat_stor=heat_stor)
+    fresh.compile(start_time)
+    fresh.set_objective('cost')
+    assert fresh.solve(solver='appsi_highs') == 0
+    assert optmodel.get_objective() == pytest.approx(fresh.get_objective())
+
+
+@pytest.mark.parametrize('solver', ['appsi_highs', 'gurobi_persistent', 'cplex_persistent'])
+def test_persistent_variable_bounds(solver):
+    if not SolverFactory(solver).available(exception_flag=False):
+        pytest.skip('{} is not available'.format(solver))
+
+    optmodel = set_up_modesto()
+    optmodel.compile('20140101')
+    optmodel.set_objective('cost')
+    assert optmodel.solve(solver=solver, persistent=True) == 0
+    base_cost = optmodel.get_objective()
+
+    # The mass flow bounds of the storage are mutable parameters
+    for param, val in [('mflo_max', 0.1), ('mflo_min', -0.1)]:
+        optmodel.change_param(node='user', comp='stor', param=param, val=val)
+    optmodel.compile('20140101')
+    assert optmodel.solve(solver=solver, persistent=True) == 0
+    storage = optmodel.components['user.stor']
+    assert max(abs(value(storage.block.mass_flow[t])) for t in storage.TIME) <= 0.1 + 1e-6
+
+    fresh = set_up_modesto()
+    for param, val in [('mflo_max', 0.1), ('mflo_min', -0.1)]:
+        fresh.change_param(node='user', comp='stor', param=param, val=val)
+    fresh.compile('20140101')
+    fresh.set_objective('cost')
+    assert fresh.solve(solver=solver) == 0
+    assert optmodel.get_objective() == pytest.approx(fresh.get_objective())
+    assert optmodel.get_objective() > base_cost
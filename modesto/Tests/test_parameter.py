@@ -2,11 +2,12 @@
 """
 Description
 """
+import numpy as np
 import pandas as pd
 from pkg_resources import resource_filename
 
 from modesto import utils
-from modesto.parameter import SeriesParameter
+from modesto.parameter import SeriesParameter, UserDataParameter
 
 
 def test_extrapolate_down():
@@ -59,4 +60,63 @@ def test_cost_data_extrap():
 
 def test_fixed_cost():
     param = SeriesParameter('cost', 'cost in function of volume', 'EUR', 'm3', val=10)
-    assert param.v(1000) == 10000
\ No newline at end of file
+    assert param.v(1000) == 10000
+
+
+def test_interpolate_array():
+    from scipy.interpolate import interp1d
+
+    table = pd.Series(index=[10., 0., 50., 20.], data=[100., 30., 200., 110.])
+    param = SeriesParameter('cost', 'cost in function of volume', 'EUR', 'm3', val=table)
+    volumes = np.array([-5., 0., 5., 15., 20., 49., 80.])
+    expected = interp1d(table.index.values, table.values, fill_value='extrapolate')(volumes)
+    assert np.allclose(param.v(volumes), expected)
+    assert param.v(15) == expected[3]
+
+    # The look-up table is rebuilt after a change
+    interpolator = param.get_interpolator()
+    assert param.get_interpolator() is interpolator
+    param.change_value(pd.Series(index=[0, 1], data=[0, 2]))
+    assert param.v(3) == 6
+
+###########################
+# TEST TIME SERIES ACCESS #
+###########################
+
+
+def set_up_time_series_param():
+    index = pd.date_range(start='20140101', periods=24 * 10, freq='H')
+    param = UserDataParameter('heat_profile', 'Heat use', 'W')
+    param.change_time_step(3600)
+    param.change_value(pd.Series(index=index, data=range(len(index)), dtype=float))
+    param.change_start_time(pd.Timestamp('20140102'))
+    param.change_horizon(24 * 3600)
+    return param
+
+
+def test_horizon_values():
+    param = set_up_time_series_param()
+    values = param.get_horizon_values()
+    assert len(values) == 24
+    assert all(values[t] == param.v(t) for t in range(24))
+
+
+def test_horizon_values_repr_day():
+    param = set_up_time_series_param()
+    values = param.get_horizon_values(n_steps=12, c=3)
+    assert len(values) == 12
+    assert all(values[t] == param.v(t, 3) for t in range(12))
+
+
+def test_window_invalidation():
+    param = set_up_time_series_param()
+    assert param.v(0) == 24
+    param.change_start_time(pd.Timestamp('20140103'))
+    assert param.v(0) == 48
+    param.change_value(param.value * 2)
+    assert param.v(0) == 96
+
+
+def test_window_outside_horizon():
+    param = set_up_time_series_param()
+    assert param.v(5, 4) == param.value[pd.Timestamp('20140106 05:00')]
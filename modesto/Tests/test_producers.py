@@ -91,5 +91,33 @@ def test_producer():
         return False
 
 
+def test_solar_profile_default(monkeypatch):
+    import numpy as np
+    import pandas as pd
+    import modesto.utils as ut
+    from modesto.component import SolarThermalCollector
+
+    radiation = pd.DataFrame({'0_40': np.arange(48.)}, index=pd.date_range(start='20140101', freq='H', periods=48))
+    reads = []
+
+    def read_file(path, name, timestamp, cache=True):
+        reads.append(name)
+        return radiation
+
+    monkeypatch.setattr(ut, 'read_file', read_file)
+
+    # The default profile is only read if no profile is given
+    collectors = [SolarThermalCollector('solar' + str(i)) for i in range(3)]
+    collectors[0].change_param('solar_profile', radiation['0_40'] * 2)
+    assert reads == []
+
+    collectors[0].check_data()
+    assert reads == []
+    for collector in collectors[1:]:
+        collector.check_data()
+        assert np.shares_memory(collector.params['solar_profile'].value.values, radiation.values)
+    assert reads == ['RenewableProduction/GlobalRadiation.csv'] * 2
+
+
 if __name__ == '__main__':
     print(test_producer())
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Tests for the scenario batch runner
+"""
+import pandas as pd
+import pytest
+from pyomo.opt import SolverFactory
+
+from modesto.scenario import ScenarioBatch
+from modesto.Tests.test_modesto import set_up_modesto
+
+
+def test_get_param():
+    optmodel = set_up_modesto()
+    scenarios = pd.DataFrame({'plant.gen.Qmax': [1e5, 5e4], 'Te': [None, None]}, index=['base', 'small'])
+    batch = ScenarioBatch(optmodel, scenarios)
+
+    assert batch.get_param('plant.gen.Qmax') is optmodel.get_component('gen', 'plant').get_param('Qmax')
+    assert batch.get_param('Te') is optmodel.params['Te']
+    with pytest.raises(KeyError):
+        batch.get_param('plant.Qmax')
+
+
+def test_model_factory():
+    batch = ScenarioBatch(set_up_modesto, pd.DataFrame({'plant.gen.Qmax': [1e5]}))
+    assert batch.get_model() is batch.get_model()
+
+
+@pytest.mark.skipif(not SolverFactory('appsi_highs').available(exception_flag=False),
+                    reason='HiGHS is not available')
+def test_run():
+    scenarios = pd.DataFrame({'plant.gen.Qmax': [1e5, 1e4, None],
+                              'user.building.mult': [1, 1, 3]},
+                             index=['base', 'small', 'large'])
+    batch = ScenarioBatch(set_up_modesto, scenarios, solve_kwargs={'solver': 'appsi_highs'})
+    summary = batch.run()
+
+    assert list(summary['status']) == [0, -1, 0]
+    assert summary.loc['large', 'cost'] == pytest.approx(2 * summary.loc['base', 'cost'])
+    assert batch.get_param('plant.gen.Qmax').v() == 1e5
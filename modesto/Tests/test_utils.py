@@ -13,3 +13,72 @@ def test_geothermal_cop():
     assert round(res[1], 4) == 5.6803
     assert round(res[0]) == 11165695
 
+
+def test_resample_cache():
+    import pandas as pd
+    from modesto.utils import resample, clear_resample_cache
+
+    clear_resample_cache()
+    index = pd.date_range(start='20140101', periods=48, freq='H')
+    df = pd.Series(index=index, data=range(48), dtype=float)
+
+    first = resample(df, new_sample_time=900)
+    assert first.iloc[1] == 0.25
+    assert resample(df.copy(), new_sample_time=900) is first
+    assert resample(df, new_sample_time=900, cache=False) is not first
+
+    changed = resample(df * 2, new_sample_time=900)
+    assert changed.iloc[1] == 0.5
+
+
+def test_read_file_cache(tmpdir, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    import pytest
+    from modesto.utils import read_file, read_time_data, clear_data_cache
+
+    monkeypatch.setenv('MODESTO_CACHE_DIR', str(tmpdir.join('cache')))
+    clear_data_cache()
+    index = pd.date_range(start='20140101', periods=48, freq='H')
+    pd.DataFrame({'a': range(48), 'b': 1.5}, index=index, dtype=float).to_csv(str(tmpdir.join('data.csv')), sep=';')
+
+    parsed = read_file(str(tmpdir), 'data.csv', timestamp=True)
+    assert read_file(str(tmpdir), 'data.csv', timestamp=True) is parsed
+    with pytest.raises(ValueError):
+        parsed.values[0, 0] = 1
+
+    # Other processes load the stored values instead of parsing the file
+    clear_data_cache()
+
+    def read_csv(*args, **kwargs):
+        raise AssertionError('The file should not be parsed again')
+
+    with monkeypatch.context() as m:
+        m.setattr(pd, 'read_csv', read_csv)
+        loaded = read_time_data(str(tmpdir), 'data.csv')
+    pd.testing.assert_frame_equal(loaded, parsed)
+    loaded.iloc[0, 0] = 1
+
+    # A damaged cache folder is parsed and stored again
+    folder = tmpdir.join('cache').listdir()[0]
+    folder.join('index.npy').remove()
+    clear_data_cache()
+    pd.testing.assert_frame_equal(read_file(str(tmpdir), 'data.csv', timestamp=True), parsed)
+    assert folder.join('index.npy').check()
+
+    # A failed write leaves no temporary folder behind
+    clear_data_cache(disk=True)
+
+    def save(*args, **kwargs):
+        raise OSError('Disk full')
+
+    with monkeypatch.context() as m:
+        m.setattr(np, 'save', save)
+        pd.testing.assert_frame_equal(read_file(str(tmpdir), 'data.csv', timestamp=True), parsed)
+    assert tmpdir.join('cache').listdir() == []
+
+    # A changed file is parsed again
+    pd.DataFrame({'a': 2.}, index=index).to_csv(str(tmpdir.join('data.csv')), sep=';')
+    assert list(read_file(str(tmpdir), 'data.csv', timestamp=True).columns) == ['a']
+    clear_data_cache(disk=True)
+    assert not tmpdir.join('cache').check()
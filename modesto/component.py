@@ -4,13 +4,14 @@ from functools import reduce
 from math import pi, log, exp
 
 import modesto.utils as ut
+import numpy as np
 import pandas as pd
 from modesto.parameter import StateParameter, DesignParameter, \
     UserDataParameter, SeriesParameter, WeatherDataParameter
 from modesto.submodel import Submodel
 from pkg_resources import resource_filename
 from pyomo.core.base import Param, Var, Constraint, NonNegativeReals, value, \
-    Set, Binary, NonPositiveReals
+    Set, Binary, NonPositiveReals, Piecewise
 
 datapath = resource_filename('modesto', 'Data')
 
@@ -53,6 +54,10 @@ class Component(Submodel):
         self.direction = direction
         self.compiled = False
 
+        self.size_param = None  # Name of the design parameter that is the size of the component, see change_sizing
+        self.interest_rate = 0.05
+        self.pw_repn = 'SOS2'
+
     def create_params(self):
         """
         Create all required parameters to set up the model
@@ -190,6 +195,88 @@ class Component(Submodel):
 
         return inv * CRF
 
+    def change_sizing(self, lb=None, ub=None, interest_rate=None, pw_repn=None):
+        """
+        Optimize the size of this component between lb and ub instead of using the value of its size parameter. The
+        investment cost follows from the cost_inv table as a piecewise linear function of the size and its annualized
+        value is added to the 'cost_total' objective. The value of the size parameter is used as initial value and
+        wherever the model needs a fixed estimate of the size.
+
+        :param lb: Lower bound of the size, None together with ub to use the value of the size parameter again
+        :param ub: Upper bound of the size
+        :param interest_rate: Interest rate (decimal) used to annualize the investment, see annualize_investment
+        :param pw_repn: Pyomo Piecewise representation of the cost table, e.g. 'SOS2' or 'INC' for solvers without
+            SOS constraints
+        :return:
+        """
+        if self.size_param is None:
+            raise ValueError('The size of {} cannot be optimized'.format(self.name))
+
+        param = self.params[self.size_param]
+        param.change_bounds(lb, ub)
+        if interest_rate is not None and not interest_rate == self.interest_rate:
+            self.interest_rate = interest_rate
+            param.structure_dirty = param.structure_dirty or param.is_variable()
+        if pw_repn is not None and not pw_repn == self.pw_repn:
+            self.pw_repn = pw_repn
+            param.structure_dirty = param.structure_dirty or param.is_variable()
+
+    def is_sized(self):
+        """
+        :return: True if the size of the component is a decision variable, see change_sizing
+        """
+        return self.size_param is not None and self.params[self.size_param].is_variable()
+
+    def get_size(self):
+        """
+        :return: The size of the component, the Var if the size is optimized
+        """
+        if self.is_sized():
+            return self.block.find_component(self.size_param)
+        return self.params[self.size_param].v()
+
+    def _make_investment_cost(self):
+        """
+        Add the investment cost as a piecewise linear function of the size. The breakpoints are those of the cost_inv
+        table between the bounds of the size, a single unit cost gives a linear function.
+
+        :return:
+        """
+        cost = self.params['cost_inv']
+        size = self.get_size()
+        lb, ub = self.params[self.size_param].bounds
+
+        self.block.investment = Var()
+        if isinstance(cost.value, (int, float)):
+            self.block.def_investment = Constraint(expr=self.block.investment == cost.value * size)
+        elif lb == ub:
+            self.block.def_investment = Constraint(expr=self.block.investment == float(cost.v(lb)))
+        else:
+            table = np.sort(np.asarray(cost.value.index.values, dtype=float))
+            points = [lb] + [x for x in table if lb < x < ub] + [ub]
+            values = [float(val) for val in cost.v(np.array(points))]
+            self.block.def_investment = Piecewise(self.block.investment, size, pw_pts=points, f_rule=values,
+                                                  pw_constr_type='EQ', pw_repn=self.pw_repn)
+
+    def obj_investment(self):
+        """
+        Annualized investment and fixed maintenance cost of a component of which the size is optimized, for the part of
+        the year that is optimized (the whole year with representative days)
+
+        :return:
+        """
+        if not self.is_sized():
+            return 0
+
+        i = self.interest_rate
+        t = self.params['lifespan'].v()
+        CRF = i * (1 + i) ** t / ((1 + i) ** t - 1)
+        annual = self.block.investment * (CRF + self.params['fix_maint'].v())
+
+        if self.repr_days is None:
+            return annual * self.params['horizon'].v() / (365 * 24 * 3600)
+        return annual
+
     def fixed_maintenance(self):
         """
         Return annual fixed maintenance cost as a percentage of the investment
@@ -291,6 +378,36 @@ class Component(Submodel):
         """
         return 0
 
+    def get_horizon_values(self, name):
+        """
+        Get the values of a time series parameter for all time steps of the optimization horizon in one look-up
+
+        :param name: Name of the parameter
+        :return: np.array with shape (len(TIME),), or (len(TIME), len(REPR_DAYS)) if representative days are used
+        """
+        param = self.params[name]
+        n_steps = len(self.TIME)
+
+        if self.repr_days is None:
+            return param.get_horizon_values(n_steps)
+        else:
+            return np.column_stack([param.get_horizon_values(n_steps, c)
+                                    for c in self.REPR_DAYS])
+
+    def horizon_dict(self, values):
+        """
+        Convert an array as returned by get_horizon_values to a dict that can be used to initialize or update a
+        Param indexed by TIME (and REPR_DAYS)
+
+        :param values: np.array with shape (len(TIME),) or (len(TIME), len(REPR_DAYS))
+        :return: dict
+        """
+        if self.repr_days is None:
+            return dict(zip(self.TIME, values.tolist()))
+        else:
+            return {(t, c): val for t, row in zip(self.TIME, values.tolist())
+                    for c, val in zip(self.REPR_DAYS, row)}
+
     def get_known_mflo(self, t, start_time):
 
         """
@@ -354,6 +471,9 @@ class Component(Submodel):
                 self.params[param].set_block(self.block)
                 self.params[param].construct()
 
+            if self.is_sized():
+                self._make_investment_cost()
+
     def reinit(self):
         """
         Reinitialize component and its parameters
@@ -438,76 +558,63 @@ class FixedProfile(Component):
 
         return params
 
-    def compile(self, model, start_time):
+    def calculate_flows(self):
         """
-        Build the structure of fixed profile
+        Calculate the mass and heat flow of the component for the whole optimization horizon in one vectorized pass
 
-        :param model: The main optimization model
-        :param pd.Timestamp start_time: Start time of optimization horizon.
-        :return:
+        :return: mass flow and heat flow as dicts, indexed by time step (and representative day)
         """
-        Component.compile(self, model, start_time)
-
-        heat_profile = self.params['heat_profile']
-
-        def _heat_flow(b, t, c=None):
-            return b.mult * heat_profile.v(t, c)
+        mult = self.params['mult'].v()
+        heat_flow = mult * self.get_horizon_values('heat_profile')
 
-        if not self.temperature_driven:
-            if not self.compiled:
-                def _mass_flow(b, t, c=None):
-                    return b.mult * heat_profile.v(t, c) / self.cp / (
-                            self.params['temperature_supply'].v() - self.params['temperature_return'].v())
+        if self.temperature_driven:
+            mass_flow = np.abs(self.get_horizon_values('mass_flow'))
+        else:
+            mass_flow = heat_flow / self.cp / (
+                    self.params['temperature_supply'].v() - self.params['temperature_return'].v())
 
-                if self.repr_days is None:
+        return self.horizon_dict(mass_flow), self.horizon_dict(heat_flow)
 
-                    self.block.mass_flow = Param(self.TIME, rule=_mass_flow,
-                                                 mutable=not self.temperature_driven)
-                    self.block.heat_flow = Param(self.TIME, rule=_heat_flow,
-                                                 mutable=not self.temperature_driven)
-                else:
-                    self.block.mass_flow = Param(self.TIME, self.REPR_DAYS,
-                                                 rule=_mass_flow,
-                                                 mutable=not self.temperature_driven)
-                    self.block.heat_flow = Param(self.TIME, self.REPR_DAYS,
-                                                 rule=_heat_flow,
-                                                 mutable=not self.temperature_driven)
-            else:
-                if self.repr_days is None:
-                    for t in self.TIME:
-                        self.block.mass_flow[t] = self.block.mult * heat_profile.v(
-                            t) / self.cp / self.block.delta_T
-                        self.block.heat_flow[t] = self.block.mult * heat_profile.v(
-                            t)
-                else:
-                    for t in self.TIME:
-                        for c in self.REPR_DAYS:
-                            self.block.mass_flow[
-                                t, c] = self.block.mult * heat_profile.v(
-                                t, c) / self.cp / self.block.delta_T
-                            self.block.heat_flow[
-                                t, c] = self.block.mult * heat_profile.v(t, c)
-
-        else:
-            lines = self.params['lines'].v()
-            self.block.temperatures = Var(lines, self.TIME)
+    def build_flows(self):
+        """
+        Add the mass and heat flow Params to the block, or update their values if the component was already compiled
 
-            def _mass_flow(b, t, c=None):
-                return abs(self.params['mass_flow'].v(t, c))
+        :return:
+        """
+        mass_flow, heat_flow = self.calculate_flows()
 
+        if not self.compiled or self.temperature_driven:
             if self.repr_days is None:
-                self.block.mass_flow = Param(self.TIME,
-                                             rule=_mass_flow,
+                self.block.mass_flow = Param(self.TIME, initialize=mass_flow,
                                              mutable=not self.temperature_driven)
-                self.block.heat_flow = Param(self.TIME, rule=_heat_flow,
+                self.block.heat_flow = Param(self.TIME, initialize=heat_flow,
                                              mutable=not self.temperature_driven)
             else:
                 self.block.mass_flow = Param(self.TIME, self.REPR_DAYS,
-                                             rule=_mass_flow,
+                                             initialize=mass_flow,
                                              mutable=not self.temperature_driven)
                 self.block.heat_flow = Param(self.TIME, self.REPR_DAYS,
-                                             rule=_heat_flow,
+                                             initialize=heat_flow,
                                              mutable=not self.temperature_driven)
+        else:
+            self.block.mass_flow.store_values(mass_flow)
+            self.block.heat_flow.store_values(heat_flow)
+
+    def compile(self, model, start_time):
+        """
+        Build the structure of fixed profile
+
+        :param model: The main optimization model
+        :param pd.Timestamp start_time: Start time of optimization horizon.
+        :return:
+        """
+        Component.compile(self, model, start_time)
+
+        self.build_flows()
+
+        if self.temperature_driven:
+            lines = self.params['lines'].v()
+            self.block.temperatures = Var(lines, self.TIME)
 
             def _decl_temperatures(b, t):
                 if t == 0:
@@ -622,70 +729,39 @@ class BuildingFixed(FixedProfile):
         """
         Component.compile(self, model, start_time)
 
-        heat_profile = self.params['heat_profile']
-        DHW_profile = self.params['DHW_demand']
-
         if self.params['temperature_return'].v() <= 45 + 273.15:
             self.COP = 0.4 * (55 + 273.15) / (55 + 273.15 - self.params['temperature_return'].v())
         elif self.params['temperature_return'].v() <= 55 + 273.15:
             self.COP = 1
         else:
             self.COP = None
-        t_supply = self.params['temperature_supply'].v()
-        t_return = self.params['temperature_return'].v()
-        if not self.compiled:
-            def _mass_flow(b, t, c=None):
-                return b.mult * (
-                        heat_profile.v(t, c) / self.cp + DHW_profile.v(t, c) / 60 * (
-                        min(t_supply, 55 + 273.15) - 283.15)) / (
-                               t_supply - t_return)
 
-            def _heat_flow(b, t, c=None):
-                return b.mult * (
-                        heat_profile.v(t, c) + DHW_profile.v(t, c) / 60 * (
-                        min(t_supply, 55 + 273.15) - 283.15) * self.cp)
-
-            if self.repr_days is None:
-
-                self.block.mass_flow = Param(self.TIME, rule=_mass_flow,
-                                             mutable=not self.temperature_driven)
-                self.block.heat_flow = Param(self.TIME, rule=_heat_flow,
-                                             mutable=not self.temperature_driven)
-            else:
-                self.block.mass_flow = Param(self.TIME, self.REPR_DAYS,
-                                             rule=_mass_flow,
-                                             mutable=not self.temperature_driven)
-                self.block.heat_flow = Param(self.TIME, self.REPR_DAYS,
-                                             rule=_heat_flow,
-                                             mutable=not self.temperature_driven)
-        else:
-            if self.repr_days is None:
-                for t in self.TIME:
-                    self.block.mass_flow[t] = self.block.mult * (
-                            heat_profile.v(t) / self.cp + DHW_profile.v(t) / 60 * (
-                            min(self.params['temperature_supply'].v(), 55 + 273.15) - 283.15)) / (
-                                                      self.params['temperature_supply'].v() - self.params[
-                                                  'temperature_return'].v())
-                    self.block.heat_flow[t] = self.block.mult * (
-                            heat_profile.v(t) + DHW_profile.v(t) / 60 * (
-                            min(self.params['temperature_supply'].v(), 55 + 273.15) - 283.15) * self.cp)
-            else:
-                for t in self.TIME:
-                    for c in self.REPR_DAYS:
-                        self.block.mass_flow[t, c] = self.block.mult * (
-                                heat_profile.v(t, c) / self.cp + DHW_profile.v(t, c) / 60 * (
-                                min(self.params['temperature_supply'].v(), 55 + 273.15) - 283.15)) / (
-                                                             self.params['temperature_supply'].v() - self.params[
-                                                         'temperature_return'].v())
-                        self.block.heat_flow[t, c] = self.block.mult * (
-                                heat_profile.v(t, c) + DHW_profile.v(t, c) / 60 * (
-                                min(self.params['temperature_supply'].v(), 55 + 273.15) - 283.15) * self.cp)
+        self.build_flows()
 
         self.logger.info('Optimization model {} {} compiled'.
                          format(self.__class__, self.name))
 
         self.compiled = True
 
+    def calculate_flows(self):
+        """
+        Calculate the mass and heat flow of the building, including domestic hot water, for the whole optimization
+        horizon in one vectorized pass
+
+        :return: mass flow and heat flow as dicts, indexed by time step (and representative day)
+        """
+        mult = self.params['mult'].v()
+        t_supply = self.params['temperature_supply'].v()
+        t_return = self.params['temperature_return'].v()
+
+        heat_profile = self.get_horizon_values('heat_profile')
+        dhw_heat = self.get_horizon_values('DHW_demand') / 60 * (min(t_supply, 55 + 273.15) - 283.15) * self.cp
+
+        heat_flow = mult * (heat_profile + dhw_heat)
+        mass_flow = heat_flow / self.cp / (t_supply - t_return)
+
+        return self.horizon_dict(mass_flow), self.horizon_dict(heat_flow)
+
     def dhw_boost(self, t, c=None):
         """
         Calculate the amount of boost heat needed each time step
@@ -859,6 +935,7 @@ class ProducerVariable(VariableComponent):
                                    repr_days=repr_days)
 
         self.params = self.create_params()
+        self.size_param = 'Qmax'
 
         self.logger = logging.getLogger('modesto.components.VarProducer')
         self.logger.info('Initializing VarProducer {}'.format(name))
@@ -1011,6 +1088,9 @@ class ProducerVariable(VariableComponent):
             self.block.dec_temp_mf0 = Constraint(self.TIME, rule=_decl_temp_mf0)
 
         elif not self.compiled:
+            # A sized Qmax times on is bilinear, on then limits the heat flow to the largest size and max_size to Qmax
+            Qmax_on = self.params['Qmax'].bounds[1] if self.is_sized() else self.block.Qmax
+
             if self.repr_days is None:
                 self.block.heat_flow = Var(self.TIME, within=NonNegativeReals)
                 self.block.ramping_cost = Var(self.TIME, initialize=0,
@@ -1023,7 +1103,10 @@ class ProducerVariable(VariableComponent):
                         return b.Qmin * b.on[t] <= b.heat_flow[t]
 
                     def _max_heat(b, t):
-                        return b.heat_flow[t] <= b.Qmax * b.on[t]
+                        return b.heat_flow[t] <= Qmax_on * b.on[t]
+
+                    if self.is_sized():
+                        self.block.max_size = Constraint(self.TIME, rule=lambda b, t: b.heat_flow[t] <= b.Qmax)
 
                 else:
                     def _min_heat(b, t):
@@ -1065,7 +1148,11 @@ class ProducerVariable(VariableComponent):
                         return b.Qmin * b.on[t, c] <= b.heat_flow[t, c]
 
                     def _max_heat(b, t, c):
-                        return b.heat_flow[t, c] <= b.Qmax * b.on[t, c]
+                        return b.heat_flow[t, c] <= Qmax_on * b.on[t, c]
+
+                    if self.is_sized():
+                        self.block.max_size = Constraint(self.TIME, self.REPR_DAYS,
+                                                         rule=lambda b, t, c: b.heat_flow[t, c] <= b.Qmax)
 
                 else:
                     def _min_heat(b, t, c):
@@ -1216,7 +1303,7 @@ class ProducerVariable(VariableComponent):
 
         :return: Cost in EUR
         """
-        return self.params['cost_inv'].v(self.params['Qmax'].v())
+        return self.params['cost_inv'].v(value(self.get_size()))
 
     def obj_energy(self):
         """
@@ -2040,6 +2127,7 @@ class SolarThermalCollector(VariableComponent):
                                    repr_days=repr_days)
 
         self.params = self.create_params()
+        self.size_param = 'area'
 
         self.logger = logging.getLogger('modesto.components.SolThermCol')
         self.logger.info('Initializing SolarThermalCollector {}'.format(name))
@@ -2058,7 +2146,9 @@ class SolarThermalCollector(VariableComponent):
                                                   unit='K',
                                                   mutable=False),
             'solar_profile': UserDataParameter(name='solar_profile',
-                                               description='Maximum heat generation per unit area of the solar panel',
+                                               description='Maximum heat generation per unit area of the solar panel. '
+                                                           'Defaults to the 0_40 column of '
+                                                           'RenewableProduction/GlobalRadiation.csv',
                                                unit='W/m2'),
             'cost_inv': SeriesParameter(name='cost_inv',
                                         description='Investment cost in function of installed area',
@@ -2092,11 +2182,30 @@ class SolarThermalCollector(VariableComponent):
                                          mutable=False, val=0.05)  # TODO find statistics
         })
 
-        params['solar_profile'].change_value(ut.read_time_data(datapath,
-                                                               name='RenewableProduction/GlobalRadiation.csv',
-                                                               expand=False)['0_40'])
         return params
 
+    def load_default_profile(self):
+        """
+        Use the default solar profile if none was set. The radiation file is read only once and its data is shared by
+        all collectors, see utils.read_file.
+
+        :return:
+        """
+        if self.params['solar_profile'].value is None:
+            self.params['solar_profile'].change_value(
+                ut.read_file(datapath, name='RenewableProduction/GlobalRadiation.csv', timestamp=True)['0_40'])
+
+    def check_data(self):
+        """
+        Check if all data required to build the optimization problem is available, after loading the default solar
+        profile if needed
+
+        :return missing_params: dict containing all missing parameters and their descriptions
+        :return flag: True if there are missing params, False if not
+        """
+        self.load_default_profile()
+        return Component.check_data(self)
+
     def compile(self, model, start_time):
         """
         Compile this component's equations
@@ -2106,6 +2215,7 @@ class SolarThermalCollector(VariableComponent):
         :param pd.Timestamp start_time: Start time of optimization horizon.
         :return:
         """
+        self.load_default_profile()
         Component.compile(self, model, start_time)
 
         solar_profile = self.params['solar_profile']
@@ -2115,21 +2225,23 @@ class SolarThermalCollector(VariableComponent):
         a_2 = self.params['a_2'].v()
         T_m = 0.5 * (self.params['temperature_supply'].v() + self.params['temperature_return'].v())
         Te = self.params['Te']
+        # If the area is optimized, heat_flow_max is the heat flow per unit area
+        area = 1 if self.is_sized() else self.params['area'].v()
         if self.compiled:
             if self.repr_days is None:
                 for t in self.TIME:
-                    self.block.heat_flow_max[t] = self.params['area'].v() * max(0, solar_profile.v(t) * eta_0 - a_1 * (
+                    self.block.heat_flow_max[t] = area * max(0, solar_profile.v(t) * eta_0 - a_1 * (
                             T_m - Te.v(t)) - a_2 * (T_m - Te.v(t)) ** 2)
             else:
                 for t in self.TIME:
                     for c in self.REPR_DAYS:
-                        self.block.heat_flow_max[t, c] = self.params['area'].v() * max(
+                        self.block.heat_flow_max[t, c] = area * max(
                             0, solar_profile.v(t, c) * eta_0 - a_1 * (T_m - Te.v(t, c)) - a_2 * (T_m - Te.v(t, c)) ** 2)
 
         else:
             if self.repr_days is None:
                 def _heat_flow_max(m, t):
-                    return self.params['area'].v() * max(0, solar_profile.v(t) * eta_0 - a_1 * (
+                    return area * max(0, solar_profile.v(t) * eta_0 - a_1 * (
                             T_m - Te.v(t)) - a_2 * (T_m - Te.v(t)) ** 2)
 
                 self.block.heat_flow_max = Param(self.TIME, rule=_heat_flow_max,
@@ -2143,6 +2255,8 @@ class SolarThermalCollector(VariableComponent):
                 # Equations
 
                 def _heat_bal(m, t):
+                    if self.is_sized():
+                        return m.heat_flow[t] + m.heat_flow_curt[t] == m.heat_flow_max[t] * m.area
                     return m.heat_flow[t] + m.heat_flow_curt[t] == m.heat_flow_max[t]
 
                 def _mass_lb(m, t):
@@ -2159,7 +2273,7 @@ class SolarThermalCollector(VariableComponent):
                 self.block.eq_mass_ub = Constraint(self.TIME, rule=_mass_ub)
             else:
                 def _heat_flow_max(m, t, c):
-                    return self.params['area'].v() * max(0, solar_profile.v(t, c) * eta_0 - a_1 * (
+                    return area * max(0, solar_profile.v(t, c) * eta_0 - a_1 * (
                             T_m - Te.v(t, c)) - a_2 * (T_m - Te.v(t, c)) ** 2)
 
                 self.block.heat_flow_max = Param(self.TIME, self.REPR_DAYS,
@@ -2176,6 +2290,8 @@ class SolarThermalCollector(VariableComponent):
                 # Equations
 
                 def _heat_bal(m, t, c):
+                    if self.is_sized():
+                        return m.heat_flow[t, c] + m.heat_flow_curt[t, c] == m.heat_flow_max[t, c] * m.area
                     return m.heat_flow[t, c] + m.heat_flow_curt[t, c] == m.heat_flow_max[t, c]
 
                 def _mass_lb(m, t, c):
@@ -2207,7 +2323,7 @@ class SolarThermalCollector(VariableComponent):
         :return: Investment cost in EUR
         """
 
-        return self.params['cost_inv'].v(self.params['area'].v())
+        return self.params['cost_inv'].v(value(self.get_size()))
 
 
 class StorageFixed(FixedProfile):
@@ -2244,6 +2360,7 @@ class StorageVariable(VariableComponent):
                                    repr_days=repr_days)
 
         self.params = self.create_params()
+        self.size_param = 'volume'
         self.max_en = 0
         self.max_mflo = None
         self.min_mflo = None
@@ -2297,7 +2414,8 @@ class StorageVariable(VariableComponent):
                                         description='Heat stored in the thermal storage unit',
                                         unit='kWh',
                                         init_type='fixedVal',
-                                        slack=False),
+                                        slack=False,
+                                        mutable=True),
             'mflo_use': UserDataParameter(name='mflo_use',
                                           description='Use of warm water stored in the tank, replaced by cold water, e.g. DHW. standard is 0',
                                           unit='kg/s'),
@@ -2502,8 +2620,15 @@ class StorageVariable(VariableComponent):
             def _ineq_soc_u(b, t):
                 return b.soc[t] <= 100
 
+            def _ineq_capacity(b, t):
+                # The state of charge is relative to the value of the volume parameter
+                return b.heat_stor[t] <= b.volume * self.cp * self.temp_diff * self.rho / 1000 / 3600
+
             self.block.ineq_soc_l = Constraint(self.X_TIME, rule=_ineq_soc_l)
-            self.block.ineq_soc_u = Constraint(self.X_TIME, rule=_ineq_soc_u)
+            if self.is_sized():
+                self.block.ineq_capacity = Constraint(self.X_TIME, rule=_ineq_capacity)
+            else:
+                self.block.ineq_soc_u = Constraint(self.X_TIME, rule=_ineq_soc_u)
 
             #############################################################################################
             # Initial state
@@ -2518,7 +2643,7 @@ class StorageVariable(VariableComponent):
                 self.block.eq_cyclic = Constraint(rule=_eq_cyclic)
             else:  # Fixed initial
                 def _init_eq(b):
-                    return b.heat_stor[0] == self.params['heat_stor'].v()
+                    return b.heat_stor[0] == b.heat_stor_0
 
                 self.block.init_eq = Constraint(rule=_init_eq)
 
@@ -2546,6 +2671,15 @@ class StorageVariable(VariableComponent):
         """
         return self.block.heat_stor
 
+    def get_handover(self, n_steps):
+        """
+        Stored heat after n_steps time steps, the initial state of an optimization that starts n_steps later
+
+        :param n_steps: Number of time steps the start time is moved forward
+        :return: dict with the new value of heat_stor
+        """
+        return {'heat_stor': value(self.block.heat_stor[n_steps])}
+
     def get_investment_cost(self):
         """
         Return investment cost of the storage unit, expressed in terms of equivalent water volume.
@@ -2553,7 +2687,7 @@ class StorageVariable(VariableComponent):
         :return: Investment cost in EUR
         """
 
-        return self.params['cost_inv'].v(self.params['volume'].v())
+        return self.params['cost_inv'].v(value(self.get_size()))
 
 
 class StorageCondensed(StorageVariable):
@@ -2574,6 +2708,7 @@ class StorageCondensed(StorageVariable):
                                  'representative days.')
         StorageVariable.__init__(self, name=name,
                                  temperature_driven=temperature_driven)
+        self.size_param = None  # The volume determines the condensed state equation
 
         self.N = None  # Number of flow time steps
         self.R = None  # Number of repetitions
@@ -2683,8 +2818,7 @@ class StorageCondensed(StorageVariable):
 
             else:
                 self.block.init_eq = Constraint(
-                    expr=self.block.heat_stor_init == self.params[
-                        'heat_stor'].v())
+                    expr=self.block.heat_stor_init == self.block.heat_stor_0)
 
             ## Mass flow and heat flow link
             def _heat_bal(b, t):
@@ -2746,6 +2880,15 @@ class StorageCondensed(StorageVariable):
     def get_heat_stor_init(self):
         return self.block.heat_stor_init
 
+    def get_handover(self, n_steps):
+        """
+        Stored heat after n_steps time steps of the first repetition
+
+        :param n_steps: Number of time steps the start time is moved forward
+        :return: dict with the new value of heat_stor
+        """
+        return {'heat_stor': value(self.block.heat_stor[n_steps, 0])}
+
     def get_heat_stor_final(self):
         return self.block.heat_stor_final
 
@@ -2800,6 +2943,7 @@ class StorageRepr(StorageVariable):
         StorageVariable.__init__(self, name=name,
                                  temperature_driven=temperature_driven,
                                  repr_days=repr_days)
+        self.size_param = None  # The volume determines the state equations between representative days
 
     def compile(self, model, start_time):
         """
@@ -2984,10 +3128,10 @@ class StorageRepr(StorageVariable):
                                         self.get_heat_stor_intra(d, t)))
             result.append(value(self.get_heat_stor_inter(self.DAYS_OF_YEAR[-1], self.TIME[-1]+1) +
                                 self.get_heat_stor_intra(self.DAYS_OF_YEAR[-1], self.TIME[-1]+1)))
-            index = pd.DatetimeIndex(start=start_time,
-                                     freq=str(
-                                         self.params['time_step'].v()) + 'S',
-                                     periods=len(result))
+            index = pd.date_range(start=start_time,
+                                  freq=str(
+                                      self.params['time_step'].v()) + 'S',
+                                  periods=len(result))
             if name is 'soc':
                 return pd.Series(index=index, name=self.name + '.' + name,
                                  data=result) / self.max_en * 100
@@ -3000,9 +3144,9 @@ class StorageRepr(StorageVariable):
 
             for d in self.DAYS_OF_YEAR:
                 result.append(value(self.get_heat_stor_inter(d, 0)))
-            index = pd.DatetimeIndex(start=start_time,
-                                     freq='1D',
-                                     periods=365)
+            index = pd.date_range(start=start_time,
+                                  freq='1D',
+                                  periods=365)
             return pd.Series(index=index, data=result,
                              name=self.name + '.heat_stor_inter')
         elif name is 'heat_loss':
@@ -3012,8 +3156,8 @@ class StorageRepr(StorageVariable):
                     result.append(value(self.block.heat_loss_ct[t, self.repr_days[d]] + 1000 * 3600 / self.params[
                         'time_step'].v() * (self.get_heat_stor_inter(d, t) + self.get_heat_stor_intra(d, t)) * (
                                                 1 - self.block.exp_ttau)))
-            index = pd.DatetimeIndex(start=start_time, freq=str(self.params['time_step'].v()) + 'S',
-                                     periods=len(result))
+            index = pd.date_range(start=start_time, freq=str(self.params['time_step'].v()) + 'S',
+                                  periods=len(result))
             return pd.Series(index=index, data=result,
                              name=self.name + '.heat_loss')
         else:
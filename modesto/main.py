@@ -2,7 +2,11 @@ import collections
 from math import sqrt
 
 import networkx as nx
-from pyomo.core.base import ConcreteModel, Objective, minimize, value, Constraint, Var, NonNegativeReals, Block
+from pyomo.common.collections import ComponentMap, ComponentSet
+from pyomo.core.base import ConcreteModel, Objective, minimize, value, Constraint, ConstraintList, Var, \
+    NonNegativeReals, Block
+from pyomo.core.expr.numvalue import is_constant
+from pyomo.core.expr.visitor import identify_mutable_parameters
 from pyomo.opt import SolverFactory
 from pyomo.opt import SolverStatus, TerminationCondition
 import pyomo.environ
@@ -11,6 +15,7 @@ import modesto.component as co
 import modesto.pipe as pip
 from modesto.LTIModels import RCmodels as rc
 from modesto.parameter import *
+from modesto.profiler import Profiler, profile
 from modesto.submodel import Submodel
 
 
@@ -39,6 +44,10 @@ class Modesto:
             self.temperature_driven = False
 
         self.allow_flow_reversal = True
+        self.precompute_workers = 1  # Workers used to precompute NodeMethod pipes, see pipe.precompute_node_method
+        self.precompute_processes = False
+        self.size_order = []  # Lists of components of which the sizes do not increase, see order_sizes
+        self.size_order_dirty = False
         self.start_time = None
         if repr_days is not None:
             self.repr_days = {i: int(round(j)) for i, j in repr_days.items()}
@@ -55,9 +64,22 @@ class Modesto:
 
         self.build(graph)
         self.compiled = False
+        self.compiled_start_time = None
+        self.dependencies = {}
+        self.adjacent_nodes = {}
 
-        self.objectives = {}
+        self.objectives = {}  # Objectives that have been built, see set_objective
+        self.objective_comps = {}  # Names of the components that contribute to each built objective
         self.act_objective = None
+        self.__register_objectives()
+
+        self.solver = None  # Persistent solver instance, see solve
+        self.solver_name = None
+        self.solver_model = None
+        self.solver_params = None
+        self.structure_changed = True
+
+        self.profiler = None  # See enable_profiling
 
     def create_params(self):
         params = {
@@ -108,7 +130,12 @@ class Modesto:
                                           '-'),
             'cost_elec': UserDataParameter('cost_elec',
                                              'Electricity cost, used for pumping power',
-                                             'EUR/kWh')
+                                             'EUR/kWh'),
+            'pipe_catalog': DesignParameter('pipe_catalog',
+                                            unit='-',
+                                            description='Name of the catalog with the pipe dimensions per diameter, '
+                                                        'see register_pipe_catalog',
+                                            val=pip.DEFAULT_CATALOG)
         }
 
         return params
@@ -182,68 +209,133 @@ class Modesto:
             end_node.add_pipe(self.edges[name].pipe)
             self.components[name] = self.edges[name].pipe
 
-    def __build_objectives(self):
+    def __register_objectives(self):
         """
-        Initialize different objectives
+        Register the standard objectives, see add_objective
 
         :return:
         """
+        self.objective_rules = {}
+        self.add_objective('energy', rule=lambda comp: comp.obj_energy(), obj_name='OBJ_ENERGY')
+        self.add_objective('cost', rule=lambda comp: comp.obj_fuel_cost() + comp.obj_elec_cost(),
+                           obj_name='OBJ_COST')
+        self.add_objective('cost_ramp', rule=lambda comp: comp.obj_cost_ramp(), obj_name='OBJ_COST_RAMP')
+        self.add_objective('co2', rule=lambda comp: comp.obj_co2(), obj_name='OBJ_CO2')
+        self.add_objective('cost_fuel_co2', rule=lambda comp: comp.obj_co2_cost() + comp.obj_fuel_cost(),
+                           obj_name='OBJ_COST_CO2_FUEL')
+        self.add_objective('cost_total',
+                           rule=lambda comp: comp.obj_fuel_cost() + comp.obj_elec_cost() + comp.obj_investment(),
+                           obj_name='OBJ_COST_TOTAL')
+        if self.temperature_driven:
+            self.add_objective('temp', rule=lambda comp: comp.obj_temp(), obj_name='OBJ_TEMP')
 
-        self.model.Slack = Var(within=NonNegativeReals)
+    def add_objective(self, objtype, rule=None, weights=None, obj_name=None):
+        """
+        Register an objective. Objectives are built when they are first used, see set_objective.
 
-        def _decl_slack(model):
-            return model.Slack == 10 ** 6 * sum(
-                comp.obj_slack() for comp in self.iter_components())
+        :param objtype: Name of the objective
+        :param rule: Function that returns the contribution of a component to the objective, e.g.
+            lambda comp: comp.obj_fuel_cost()
+        :param weights: Dict of registered objectives mapped to weights, the new objective is their weighted sum,
+            e.g. {'cost': 1, 'co2': 0.05}. Only used if rule is None.
+        :param obj_name: Name of the Pyomo Objective component. Default: 'OBJ_' + objtype in capitals.
+        :return:
+        """
+        if rule is None:
+            if not weights:
+                raise ValueError('Give either a rule or weights for objective {}'.format(objtype))
+            for other in weights:
+                if other not in self.objective_rules:
+                    raise ValueError('Choose an objective type from {}'.format(list(self.objective_rules)))
+            rules = {other: self.objective_rules[other][1] for other in weights}
 
-        self.model.decl_slack = Constraint(rule=_decl_slack)
+            def rule(comp):
+                return sum(weight * rules[other](comp) for other, weight in weights.items())
 
-        def obj_energy(model):
-            return model.Slack + sum(
-                comp.obj_energy() for comp in self.iter_components())
+        active = False
+        if objtype in self.objectives:
+            active = self.objectives[objtype] is self.act_objective
+            self.__remove_objective(objtype)
+        self.objective_rules[objtype] = (obj_name or 'OBJ_' + objtype.upper(), rule)
 
-        def obj_cost(model):
-            return model.Slack + sum(
-                comp.obj_fuel_cost() for comp in self.iter_components()) + sum(
-                comp.obj_elec_cost() for comp in self.iter_components())
+        if active:
+            self.set_objective(objtype)
 
-        def obj_cost_ramp(model):
-            return model.Slack + sum(
-                comp.obj_cost_ramp() for comp in self.iter_components())
+    def __build_objective(self, objtype):
+        """
+        Build an objective, deactivated, and register which components contribute to it
 
-        def obj_co2(model):
-            return model.Slack + sum(
-                comp.obj_co2() for comp in self.iter_components())
+        :param objtype: Name of the objective
+        :return: Objective object
+        """
+        if self.model.component('Slack') is None:
+            raise Exception('Compile the optimization problem before using objective {}'.format(objtype))
+        obj_name, rule = self.objective_rules[objtype]
 
-        def obj_co2_fuel_cost(model):
-            return model.Slack + sum(comp.obj_co2_cost() + comp.obj_fuel_cost()
-                                     for comp in self.iter_components())
+        with profile(self.profiler, 'objectives', objtype):
+            terms = {name: rule(comp) for name, comp in self.components.items()}
+            self.objective_comps[objtype] = {name for name, term in terms.items() if not is_constant(term)}
 
-        self.model.OBJ_ENERGY = Objective(rule=obj_energy, sense=minimize)
-        self.model.OBJ_COST = Objective(rule=obj_cost, sense=minimize)
-        self.model.OBJ_COST_RAMP = Objective(rule=obj_cost_ramp, sense=minimize)
-        self.model.OBJ_CO2 = Objective(rule=obj_co2, sense=minimize)
-        self.model.OBJ_COST_CO2_FUEL = Objective(rule=obj_co2_fuel_cost,
-                                                 sense=minimize)
+            self.model.add_component(obj_name, Objective(expr=self.model.Slack + sum(terms.values()),
+                                                         sense=minimize))
+            objective = self.model.component(obj_name)
+            objective.deactivate()
 
-        self.objectives = {
-            'energy': self.model.OBJ_ENERGY,
-            'cost': self.model.OBJ_COST,
-            'cost_ramp': self.model.OBJ_COST_RAMP,
-            'co2': self.model.OBJ_CO2,
-            'cost_fuel_co2': self.model.OBJ_COST_CO2_FUEL
-        }
+        self.objectives[objtype] = objective
+        return objective
 
-        for objective in self.objectives.values():
-            objective.deactivate()
+    def __remove_objective(self, objtype):
+        """
+        Remove a built objective from the model
 
-        if self.temperature_driven:
-            def obj_temp(model):
-                return model.Slack + sum(
-                    comp.obj_temp() for comp in self.iter_components())
+        :param objtype: Name of the objective
+        :return:
+        """
+        objective = self.objectives.pop(objtype)
+        self.objective_comps.pop(objtype, None)
+        if self.model.component(objective.name) is objective:
+            self.model.del_component(objective)
+
+    def __build_objectives(self, slack=True, names=None):
+        """
+        Remove the objectives that are out of date. They are rebuilt when they are used again, the active objective
+        is rebuilt right away.
+
+        :param slack: If False, the slack variable and its definition are kept, e.g. because only the time dependent
+            costs changed with the start time
+        :param names: Names of the components that were rebuilt. Only the objectives these components contribute to
+            are removed and the slack variable is kept. If None, all objectives are removed.
+        :return:
+        """
+        active = [objtype for objtype, obj in self.objectives.items() if obj is self.act_objective]
+
+        if names is None:
+            outdated = list(self.objectives)
+        else:
+            # Rebuilt components may contribute to objectives they were not part of before
+            outdated = [objtype for objtype in self.objectives if self.objective_comps[objtype] & set(names) or any(
+                not is_constant(self.objective_rules[objtype][1](self.components[name])) for name in names)]
+        for objtype in outdated:
+            self.__remove_objective(objtype)
 
-            self.model.OBJ_TEMP = Objective(rule=obj_temp, sense=minimize)
+        if slack:
+            if names is None and self.model.component('Slack') is not None:
+                self.model.del_component('Slack')
+            if self.model.component('decl_slack') is not None:
+                self.model.del_component('decl_slack')
 
-            self.objectives['temp'] = self.model.OBJ_TEMP
+            with profile(self.profiler, 'objectives', 'slack'):
+                if self.model.component('Slack') is None:
+                    self.model.Slack = Var(within=NonNegativeReals)
+
+                def _decl_slack(model):
+                    return model.Slack == 10 ** 6 * sum(
+                        comp.obj_slack() for comp in self.iter_components())
+
+                self.model.decl_slack = Constraint(rule=_decl_slack)
+
+        if active and active[0] in outdated:
+            self.set_objective(active[0])
 
     def compile(self, start_time='20140101', recompile=False):
         """
@@ -251,7 +343,8 @@ class Modesto:
 
         :param start_time: Start time of this modesto instance. Either a pandas Timestamp object or a string of format
             'yyyymmdd'. Default '20140101'.
-        :param recompile: True if model should be recompiled. If False, only mutable parameters are reloaded.
+        :param recompile: True if the components of which a parameter changed should be rebuilt. Temperature driven
+            models are rebuilt entirely if the start time changed. If False, only mutable parameters are reloaded.
         :return:
         """
 
@@ -265,11 +358,18 @@ class Modesto:
                           "either string of format 'yyyymmdd' or pd.Timestamp.")
 
         # Check if not compiled already
+        rebuild = None
+        self.structure_changed = not self.compiled or self.structure_changed
         if self.compiled:
             if not recompile and not self.temperature_driven:
                 self.logger.info(
                     'Model was already compiled. Only changing mutable parameters.')
 
+            elif self.start_time == self.compiled_start_time or not self.temperature_driven:
+                rebuild = self.get_dirty_components()
+                self.logger.info(
+                    'Recompiling changed components: {}'.format(sorted(rebuild)))
+
             else:
                 self.model = ConcreteModel()
                 self.compiled = False
@@ -281,24 +381,152 @@ class Modesto:
         self.check_data()
         self.update_time(self.start_time)
 
-        # Components
-        for name in self.get_edges():
-            edge_obj = self.get_component(name=name)
-            edge_obj.compile(self.model, start_time)
+        if rebuild is not None:
+            self.__compile_changed(rebuild)
+        else:
+            # Components
+            self.__precompute_pipes(self.get_edges())
+            for name in self.get_edges():
+                edge_obj = self.get_component(name=name)
+                with profile(self.profiler, 'edge', name, edge_obj):
+                    edge_obj.compile(self.model, start_time)
 
-        nodes = self.get_nodes()
+            nodes = self.get_nodes()
 
-        for node in nodes:
-            node_obj = self.get_component(name=node)
-            node_obj.compile(self.model, start_time)
+            for node in nodes:
+                node_obj = self.get_component(name=node)
+                node_obj.compile(self.model, start_time)
 
-        if not self.compiled or recompile:
-            self.__build_objectives()
+            if not self.compiled:
+                self.__build_objectives()
+            elif not self.start_time == self.compiled_start_time:
+                # Costs and prices enter the objectives as constants
+                self.__build_objectives(slack=False)
+
+        self.__build_size_order(rebuild or set() if self.compiled else None)
 
         self.compiled = True  # Change compilation flag
+        self.compiled_start_time = self.start_time
+        self.__build_dependencies()
 
         return
 
+    def __compile_changed(self, names):
+        """
+        Rebuild the blocks of the given components and the balance equations of the nodes they are connected to. All
+        other blocks are kept. Components that are not rebuilt only update their mutable parameters, except in
+        temperature driven models, where they are left untouched.
+
+        :param names: Names of the components to be rebuilt
+        :return:
+        """
+        nodes = set()
+        for name in names:
+            nodes.update(self.adjacent_nodes[name])
+            self.components[name].reinit()
+
+        self.__precompute_pipes([name for name in self.get_edges() if name in names or not self.temperature_driven])
+        for name in self.get_edges():
+            edge_obj = self.get_component(name=name)
+            if name in names or not self.temperature_driven:
+                with profile(self.profiler, 'edge', name, edge_obj):
+                    edge_obj.compile(self.model, self.start_time)
+
+        for node in self.get_nodes():
+            node_obj = self.get_component(name=node)
+            if node in nodes:
+                node_obj.reinit()
+                node_obj.compile(self.model, self.start_time)
+            elif not self.temperature_driven:
+                node_obj.compile(self.model, self.start_time)
+
+        start_time_changed = not self.start_time == self.compiled_start_time
+        if names:
+            self.__build_objectives(names=None if start_time_changed else names)
+            self.structure_changed = True
+        elif start_time_changed:
+            self.__build_objectives(slack=False)
+
+    def __build_size_order(self, names=None):
+        """
+        (Re)build the constraints that order the sizes of components, see order_sizes
+
+        :param names: Names of the components that were rebuilt, None if all of them were
+        :return:
+        """
+        ordered = set(name for order in self.size_order for name in order)
+        if not self.size_order_dirty and names is not None and not ordered & set(names):
+            return
+
+        if self.model.component('ineq_size_order') is not None:
+            self.model.del_component('ineq_size_order')
+            self.structure_changed = True
+        if self.size_order:
+            self.model.ineq_size_order = ConstraintList()
+            self.structure_changed = True
+        for order in self.size_order:
+            for larger, smaller in zip(order[:-1], order[1:]):
+                if self.components[larger].is_sized() or self.components[smaller].is_sized():
+                    self.model.ineq_size_order.add(
+                        self.components[larger].get_size() >= self.components[smaller].get_size())
+
+        self.size_order_dirty = False
+
+    def __precompute_pipes(self, names):
+        """
+        Precompute the NodeMethod pipes among the given edges at once, see pipe.precompute_node_method
+
+        :param names: Names of the edges that are about to be compiled
+        :return:
+        """
+        pipes = [self.components[name] for name in names if isinstance(self.components[name], pip.NodeMethod)]
+        if pipes:
+            with profile(self.profiler, 'precompute'):
+                pip.precompute_node_method(pipes, workers=self.precompute_workers,
+                                           processes=self.precompute_processes)
+
+    def __build_dependencies(self):
+        """
+        Register which components use which parameter objects and which nodes each component is connected to. General
+        parameters can be shared by many components. All parameters are marked clean afterwards.
+
+        :return:
+        """
+        self.dependencies = {}
+        self.adjacent_nodes = {}
+
+        for param in self.params.values():
+            self.dependencies[id(param)] = (param, set())
+
+        for name, comp in self.components.items():
+            for param in comp.params.values():
+                self.dependencies.setdefault(id(param), (param, set()))[1].add(name)
+
+        for node in self.get_nodes():
+            self.adjacent_nodes[node] = {node}
+            for comp in self.components[node].get_components():
+                self.adjacent_nodes[comp] = {node}
+        for name, edge in self.edges.items():
+            self.adjacent_nodes[name] = {edge.start_node.name, edge.end_node.name}
+
+        for param, _ in self.dependencies.values():
+            param.clean()
+
+    def get_dirty_components(self):
+        """
+        Find the components that have to be rebuilt because one of their parameters changed since the last
+        compilation. Changes to mutable parameters are taken over without rebuild, except in temperature driven
+        models.
+
+        :return: set of component names
+        """
+        dirty = set()
+        for param, names in self.dependencies.values():
+            if param.is_dirty() and (self.temperature_driven or param.needs_rebuild()):
+                dirty.update(names)
+
+        return dirty
+
     def check_data(self):
         """
         Checks whether all parameters have been assigned a value,
@@ -337,18 +565,19 @@ class Modesto:
 
     def set_objective(self, objtype):
         """
-        Set optimization objective.
+        Set optimization objective. The objective is built if it was not used before.
 
-        :param objtype:
+        :param objtype: Name of the objective, see add_objective
         :return:
         """
-        if objtype not in self.objectives:
+        if objtype not in self.objective_rules:
             raise ValueError('Choose an objective type from {}'.format(
-                self.objectives.keys()))
-
+                list(self.objective_rules)))
         for obj in self.objectives.values():
             obj.deactivate()
 
+        if objtype not in self.objectives:
+            self.__build_objective(objtype)
         self.objectives[objtype].activate()
         self.act_objective = self.objectives[objtype]
 
@@ -384,9 +613,61 @@ class Modesto:
         """
         return self.components.values()
 
+    def enable_profiling(self, memory=False):
+        """
+        Record the wall time and the number of Vars, Constraints and Params of every edge, component, node balance
+        and objective that is compiled, and the time spent writing, solving and loading results. Previous records
+        are removed.
+
+        :param memory: If True, the peak memory use of every step is recorded as well. This slows down compilation.
+        :return: Profiler object
+        """
+        self.disable_profiling()
+        self.profiler = Profiler(memory=memory)
+        for node in self.get_nodes():
+            self.components[node].profiler = self.profiler
+
+        return self.profiler
+
+    def disable_profiling(self):
+        """
+        Stop recording compilation and solver steps
+
+        :return:
+        """
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.profiler = None
+        for node in self.get_nodes():
+            self.components[node].profiler = None
+
+    def get_profile(self, summary=False):
+        """
+        Return the recorded compilation and solver steps, see enable_profiling
+
+        :param summary: If True, the total time and number of calls per type of step are returned
+        :return: pd.DataFrame
+        """
+        if self.profiler is None:
+            raise Exception('Profiling is not enabled, use enable_profiling first')
+        if summary:
+            return self.profiler.get_summary()
+        return self.profiler.get_report()
+
+    def print_profile(self, n=20):
+        """
+        Print the total time per type of step and the n slowest steps, see enable_profiling
+
+        :param n: Number of steps to be printed
+        :return:
+        """
+        if self.profiler is None:
+            raise Exception('Profiling is not enabled, use enable_profiling first')
+        self.profiler.print_report(n=n)
+
     def solve(self, tee=False, mipgap=None, mipfocus=None, verbose=False,
               solver='gurobi', warmstart=False, probe=False,
-              timelim=None, threads=None):
+              timelim=None, threads=None, persistent=False):
         """
         Solve a new optimization
 
@@ -398,15 +679,30 @@ class Modesto:
         :param mipgap: Set mip optimality gap. Default 10%
         :param verbose: True to print extra diagnostic information
         :param timelim: Time limit for solver in seconds. Default: no time limit.
+        :param persistent: If True, the model is kept loaded in the solver between calls and only changes are sent to
+            the solver on a re-solve. The previous solution is used as a MIP start. Supported for the appsi solvers
+            (e.g. 'appsi_highs', 'appsi_cbc', 'appsi_gurobi') and the persistent solver plugins (e.g.
+            'gurobi_persistent', 'cplex_persistent'). Other solvers are solved as usual.
         :return:
         """
 
         if verbose:
             self.model.pprint()
 
-        opt = SolverFactory(solver, warmstart=warmstart)
+        appsi = solver.startswith('appsi_')
+        if persistent and (appsi or solver.endswith('_persistent')):
+            opt = self.get_persistent_solver(solver)
+            warmstart = warmstart or self.results is not None
+        else:
+            if persistent:
+                self.logger.warning('{} has no persistent interface, solving as usual.'.format(solver))
+            persistent = False
+            if appsi:
+                opt = SolverFactory(solver)
+            else:
+                opt = SolverFactory(solver, warmstart=warmstart)
 
-        if solver == 'gurobi':
+        if solver in ['gurobi', 'gurobi_persistent']:
             # opt.options["Crossover"] = 0
             # opt.options['ImproveStartTime'] = 10
             # opt.options['PumpPasses'] = 2
@@ -421,7 +717,7 @@ class Modesto:
 
             if threads is not None:
                 opt.options["Threads"] = threads
-        elif solver == 'cplex':
+        elif solver in ['cplex', 'cplex_persistent']:
             opt.options['mip display'] = 3
             if probe:
                 opt.options['mip strategy probe'] = 3
@@ -438,8 +734,17 @@ class Modesto:
                 'mip strategy fpheur'] = 2  # Feasibility pump heuristics
             opt.options['parallel'] = -1
 
+        elif solver.startswith('appsi_'):
+            if mipgap is not None and 'mip_gap' in opt.config:
+                opt.config.mip_gap = mipgap
+
         try:
-            self.results = opt.solve(self.model, tee=tee)
+            if persistent or appsi:
+                self.results = self.__solve_persistent(opt, solver, tee=tee, warmstart=warmstart, timelim=timelim)
+            else:
+                # Includes writing the problem and loading the results
+                with profile(self.profiler, 'solve'):
+                    self.results = opt.solve(self.model, tee=tee)
         except ValueError:
             # self.logger.warning('No solution found before time limit.')
             return -2
@@ -472,14 +777,125 @@ class Modesto:
 
         return status
 
+    def get_persistent_solver(self, solver):
+        """
+        Return the persistent solver instance for the current model. A new instance is made if another solver is
+        asked or if the model was rebuilt from scratch.
+
+        :param solver: Name of the solver
+        :return: Solver object
+        """
+        if self.solver is None or self.solver_name != solver or self.solver_model is not self.model:
+            self.solver = SolverFactory(solver)
+            self.solver_name = solver
+            self.solver_model = self.model
+            self.solver_params = None
+            self.structure_changed = True
+
+        return self.solver
+
+    def __solve_persistent(self, opt, solver, tee, warmstart, timelim):
+        """
+        Solve the model with a persistent solver, only sending changes since the previous solve
+
+        :return: Solver results
+        """
+        if solver.startswith('appsi_'):
+            # appsi solvers find added and removed components and changed mutable parameters themselves
+            # Includes sending the changes to the solver
+            with profile(self.profiler, 'solve'):
+                results = opt.solve(self.model, tee=tee, load_solutions=False, warmstart=warmstart,
+                                    timelimit=timelim)
+        else:
+            with profile(self.profiler, 'write'):
+                if self.structure_changed or self.solver_params is None:
+                    opt.set_instance(self.model)
+                    self.__map_mutable_params()
+                else:
+                    self.__update_mutable_params(opt)
+                opt.set_objective(self.act_objective)
+            with profile(self.profiler, 'solve'):
+                results = opt.solve(tee=tee, load_solutions=False, warmstart=warmstart and opt.warm_start_capable(),
+                                    save_results=False)
+
+        self.structure_changed = False
+
+        if results.solver.termination_condition in [TerminationCondition.optimal, TerminationCondition.feasible,
+                                                     TerminationCondition.maxTimeLimit]:
+            with profile(self.profiler, 'load'):
+                opt.load_vars()
+
+        return results
+
+    def __map_mutable_params(self):
+        """
+        Register which constraints and variable bounds contain which mutable parameters, together with the parameter
+        values that were sent to the solver
+
+        :return:
+        """
+        self.solver_params = ComponentMap()
+
+        def _register(param, index, component):
+            if param not in self.solver_params:
+                self.solver_params[param] = [value(param), ComponentSet(), ComponentSet()]
+            self.solver_params[param][index].add(component)
+
+        for con in self.model.component_data_objects(Constraint, active=True):
+            for expr in [con.lower, con.body, con.upper]:
+                if expr is None:
+                    continue
+                for param in identify_mutable_parameters(expr):
+                    _register(param, 1, con)
+
+        for var in self.model.component_data_objects(Var):
+            for bound in [var.lower, var.upper]:
+                if bound is None:
+                    continue
+                for param in identify_mutable_parameters(bound):
+                    _register(param, 2, var)
+
+    def __update_mutable_params(self, opt):
+        """
+        Send the constraints and variables that contain mutable parameters of which the value changed since the previous
+        solve to the persistent solver again
+
+        :param opt: Persistent solver
+        :return:
+        """
+        changed = ComponentSet()
+        changed_vars = ComponentSet()
+        for param, (old_val, constraints, variables) in self.solver_params.items():
+            new_val = value(param)
+            if not new_val == old_val:
+                changed.update(constraints)
+                changed_vars.update(variables)
+                self.solver_params[param][0] = new_val
+
+        for con in changed:
+            opt.remove_constraint(con)
+            opt.add_constraint(con)
+        for var in changed_vars:
+            try:
+                opt.update_var(var)
+            except ValueError:
+                # Variables that are not used in any constraint or objective were not sent to the solver
+                pass
+
+        self.logger.debug('{} constraints and {} variables updated in persistent solver'.format(len(changed),
+                                                                                                len(changed_vars)))
+
     def opt_settings(self, objective=None,
-                     pipe_model=None, allow_flow_reversal=None):
+                     pipe_model=None, allow_flow_reversal=None, precompute_workers=None, precompute_processes=None):
         """
         Change the setting of the optimization problem
 
         :param objective: Name of the optimization objective
         :param pipe_model: The name of the type of pipe model to be used
         :param allow_flow_reversal: Boolean indicating whether mass flow reversals are possible in the pipes
+        :param precompute_workers: Number of workers that precompute the NodeMethod pipes before compilation. Only worth
+            it for very large networks.
+        :param precompute_processes: If True, the precompute workers are processes instead of threads
         :return:
         """
         if objective is not None:  # TODO Do we need this to be defined at the top level of modesto?
@@ -488,6 +904,10 @@ class Modesto:
             self.pipe_model = pipe_model
         if allow_flow_reversal is not None:
             self.allow_flow_reversal = allow_flow_reversal
+        if precompute_workers is not None:
+            self.precompute_workers = precompute_workers
+        if precompute_processes is not None:
+            self.precompute_processes = precompute_processes
 
     def change_general_param(self, param, val):
         """
@@ -559,6 +979,44 @@ class Modesto:
 
         comp_obj.params[state].change_init_type(new_type)
 
+    def change_sizing(self, node=None, comp=None, lb=None, ub=None, interest_rate=None, pw_repn=None):
+        """
+        Optimize the size of a component (Qmax of a ProducerVariable, area of a SolarThermalCollector, volume of a
+        StorageVariable or diameter of an ExtensivePipe) between lb and ub, see Component.change_sizing. The annualized
+        investment cost of the chosen size is part of the 'cost_total' objective. Pipe diameters are chosen among the
+        DNs of the pipe catalog, see ExtensivePipe._make_investment_cost.
+
+        :param node: Name of the node, None for a pipe
+        :param comp: Name of the component
+        :param lb: Lower bound of the size, None together with ub to use the value of the size parameter again
+        :param ub: Upper bound of the size
+        :param interest_rate: Interest rate (decimal) used to annualize the investment
+        :param pw_repn: Pyomo Piecewise representation of the investment cost table, default 'SOS2'. For pipes
+            'binary' (default) or 'SOS1'.
+        :return:
+        """
+        self.get_component(comp, node).change_sizing(lb=lb, ub=ub, interest_rate=interest_rate, pw_repn=pw_repn)
+
+    def order_sizes(self, names):
+        """
+        Require that the sizes of the given components do not increase in the given order, e.g. the diameters of the
+        pipes along a branch of a radial network, starting at the producer. This breaks the symmetry between
+        interchangeable components and tightens the design problem, see change_sizing. Components of which the size is
+        not optimized take part with their fixed size.
+
+        :param names: List of component names, 'node.comp' for components and the edge name for pipes. An empty list
+            removes all orders.
+        :return:
+        """
+        if not names:
+            self.size_order = []
+        else:
+            for name in names:
+                if self.get_component(name).size_param is None:
+                    raise ValueError('The size of {} cannot be optimized'.format(name))
+            self.size_order.append(list(names))
+        self.size_order_dirty = True
+
     def get_component(self, name, node=None):
         """
         Find a component
@@ -595,6 +1053,114 @@ class Modesto:
 
         return obj.get_result(name, index, state, self.start_time)
 
+    def get_results(self, names=None, components=None, form='wide', path=None, check_results=True):
+        """
+        Returns the values of many time dependent variables and parameters at once. The values of each variable are
+        read in one pass and all results share one time index. Results that do not fit on this time index, e.g.
+        variables indexed by something else than time, are left out.
+
+        :param names: Name or list of names of the variables/parameters. Components that do not have a variable with
+            this name are skipped. Default None: all indexed variables.
+        :param components: List of names of the components, nodes and pipes. Default None: all of them.
+        :param form: 'wide' returns one column per result, named as in get_result, e.g. 'plant.gen.heat_flow' or
+            'pipe.temperatures.supply'. 'long' returns columns time, component, name, element and value, with element
+            the first index of variables with two indices, e.g. 'supply', and '' otherwise.
+        :param path: If given, the results are written to this file one component at a time in long form instead of
+            being returned. The format follows from the extension: '.parquet' (needs pyarrow) or '.h5'/'.hdf5'
+            (needs PyTables).
+        :param check_results: Check if model is solved. Default True.
+        :return: pd.DataFrame, or None if path is given
+        """
+        if self.results is None and check_results:
+            raise Exception('The optimization problem has not been solved yet.')
+        if form not in ['wide', 'long']:
+            raise ValueError('form should be either \'wide\' or \'long\', not {}'.format(form))
+        if isinstance(names, str):
+            names = [names]
+        if components is None:
+            components = list(self.components)
+
+        time_step = self.params['time_step'].v()
+        if self.repr_days is None:
+            n_time = int(self.params['horizon'].v() // time_step) + 1
+        else:
+            n_time = 365 * int(24 * 3600 // time_step) + 1
+        time_index = pd.date_range(start=self.start_time, freq=str(time_step) + 'S', periods=n_time)
+
+        if path is not None:
+            writer = _ResultWriter(path)
+            try:
+                for name in components:
+                    results = self.__get_component_results(name, names, n_time)
+                    if results:
+                        writer.write(self.__long_results(name, results, time_index))
+            finally:
+                writer.close()
+            return None
+
+        results = {name: self.__get_component_results(name, names, n_time) for name in components}
+
+        if form == 'long':
+            frames = [self.__long_results(name, comp_results, time_index) for name, comp_results in results.items()
+                      if comp_results]
+            if not frames:
+                return pd.DataFrame(columns=['time', 'component', 'name', 'element', 'value'])
+            return pd.concat(frames, ignore_index=True)
+
+        columns = []
+        data = np.full((n_time, sum(len(comp_results) for comp_results in results.values())), np.nan)
+        for name, comp_results in results.items():
+            for (var, index), values in comp_results.items():
+                data[:len(values), len(columns)] = values
+                columns.append('.'.join([name, var] if index is None else [name, var, index]))
+        result = pd.DataFrame(data, index=time_index, columns=columns)
+
+        # Drop the last time step if no result uses the state time axis
+        if all(len(values) < n_time for comp_results in results.values() for values in comp_results.values()):
+            result = result.iloc[:-1]
+        return result
+
+    def __get_component_results(self, name, names, n_time):
+        """
+        Collect the results of one component that fit on the time index of get_results
+
+        :return: dict with (name, index) tuples as keys and np.arrays as values
+        """
+        comp = self.get_component(name)
+        if comp.block is None:
+            return {}
+
+        if self.repr_days is None:
+            results = comp.get_results(names)
+        else:
+            # Representative days are mapped to the days of the year by the components themselves
+            results = {}
+            if names is None:
+                names = [var.local_name for var in comp.block.component_objects(Var, descend_into=False)]
+            for var in names:
+                if comp.block.find_component(var) is not None or isinstance(comp, co.StorageRepr):
+                    series = comp.get_result(var, None, False, self.start_time)
+                    if series is not None:
+                        results[(var, None)] = series.values
+
+        return {key: values for key, values in results.items() if n_time - 1 <= len(values) <= n_time}
+
+    @staticmethod
+    def __long_results(name, results, time_index):
+        """
+        Convert the results of one component to long form
+
+        :return: pd.DataFrame
+        """
+        frames = []
+        for (var, index), values in results.items():
+            frames.append(pd.DataFrame({'time': time_index[:len(values)],
+                                        'component': name,
+                                        'name': var,
+                                        'element': '' if index is None else index,
+                                        'value': values}))
+        return pd.concat(frames, ignore_index=True)
+
     def get_objective(self, objtype=None, get_value=True):
         """
         Return value of objective function. With no argument supplied, the active objective is returned. Otherwise, the
@@ -612,9 +1178,12 @@ class Modesto:
                 raise ValueError('No active objective found.')
 
         else:
-            assert objtype in self.objectives.keys(), 'Requested objective does not exist. Please choose from {}'.format(
-                self.objectives.keys())
-            obj = self.objectives[objtype]
+            assert objtype in self.objective_rules, 'Requested objective does not exist. Please choose from {}'.format(
+                list(self.objective_rules))
+            if objtype in self.objectives:
+                obj = self.objectives[objtype]
+            else:
+                obj = self.__build_objective(objtype)
 
         if get_value:
             return value(obj)
@@ -937,6 +1506,7 @@ class Node(Submodel):
 
         self.compiled = False
         self.repr_days = repr_days
+        self.profiler = None  # Set by Modesto.enable_profiling
 
         self.build()
 
@@ -1066,16 +1636,21 @@ class Node(Submodel):
         """
         if self.compiled:
             for name, comp in self.components.items():
-                comp.compile(model, start_time)
+                with profile(self.profiler, 'component', name, comp):
+                    comp.compile(model, start_time)
 
         else:
             self.set_time_axis()
             self._make_block(model)
 
             for name, comp in self.components.items():
-                comp.compile(model, start_time)
+                # Temperature driven components cannot update an existing block, unchanged ones are kept as they are
+                if not (comp.compiled and self.temperature_driven):
+                    with profile(self.profiler, 'component', name, comp):
+                        comp.compile(model, start_time)
 
-            self._add_bal()
+            with profile(self.profiler, 'balance', self.name, self):
+                self._add_bal()
 
             self.logger.info('Compilation of {} finished'.format(self.name))
 
@@ -1367,3 +1942,50 @@ class Edge(object):
             sumsq += (self.start_node.get_loc()[i] - self.end_node.get_loc()[
                 i]) ** 2
         return sqrt(sumsq)
+
+
+class _ResultWriter(object):
+    def __init__(self, path):
+        """
+        Writes results in long form to a Parquet or HDF5 file, one chunk at a time, see Modesto.get_results
+
+        :param path: Path of the file, the extension determines the format
+        """
+        self.path = path
+        self.writer = None
+
+        if path.endswith('.parquet'):
+            self.format = 'parquet'
+            import pyarrow.parquet  # Optional dependency, only needed to write Parquet files
+        elif path.endswith(('.h5', '.hdf5')):
+            self.format = 'hdf'
+            self.writer = pd.HDFStore(path, mode='w')
+        else:
+            raise ValueError('Results can be written to .parquet, .h5 or .hdf5 files, not {}'.format(path))
+
+    def write(self, results):
+        """
+        Append a chunk of results
+
+        :param results: pd.DataFrame in long form
+        :return:
+        """
+        if self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self.writer is None:
+                table = pa.Table.from_pandas(results, preserve_index=False)
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(results, schema=self.writer.schema, preserve_index=False)
+            self.writer.write_table(table)
+        else:
+            # String columns are stored with a fixed width
+            self.writer.append('results', results, format='table', index=False,
+                               data_columns=['component', 'name', 'element'],
+                               min_itemsize={'component': 100, 'name': 100, 'element': 100})
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
@@ -4,6 +4,9 @@ import numpy as np
 import pandas as pd
 import collections
 
+from scipy.sparse import csc_matrix
+from scipy.sparse.linalg import splu
+
 
 class MfCalculation(object):
 
@@ -14,12 +17,18 @@ class MfCalculation(object):
         self.time = range(0, int(self.horizon/self.time_step))
         self.index = None
 
-        self.inc_matrix = -nx.incidence_matrix(self.graph, oriented=True).todense()
+        # Sparse incidence matrix, +1 at the start node and -1 at the end node of each edge
+        self.inc_matrix = -nx.incidence_matrix(self.graph, oriented=True).tocsr()
         self.nodes, self.edges, self.components = self.get_model_structure()
         self.unknown_node = None
         self.unknown_comp = None
+        self.shares = {}  # Producers that supply a fixed share of the total mass flow, keys are (node, comp)
 
         self.mass_flows = collections.defaultdict(dict)
+        self.edge_mf = None
+
+        self.lu = None  # Factorization of the reduced Laplacian of the network
+        self.lu_row = None  # Number of the node that was left out of the factorization
 
     def get_model_structure(self):
         """
@@ -50,6 +59,26 @@ class MfCalculation(object):
     def set_producer_component(self, name):
         self.unknown_comp = name
 
+    def add_producer(self, node, name, share):
+        """
+        Add a producer that supplies a fixed share of the total mass flow rate taken from the network. The producer
+        set with set_producer_node and set_producer_component supplies the remainder. Producers with a known mass flow
+        rate are added with add_mf(..., dir='in') instead.
+
+        :param node: Name of the node of the producer
+        :param name: Name of the producer component
+        :param share: Share of the total mass flow rate, between 0 and 1
+        :return:
+        """
+        if not node in self.nodes:
+            raise KeyError('{} is not an existing node'.format(node))
+        if not name in self.components[node]:
+            raise KeyError('{} is not an existing component at node {}'.format(name, node))
+        if not 0 <= share <= 1:
+            raise ValueError('The share of {} at node {} should be between 0 and 1'.format(name, node))
+
+        self.shares[(node, name)] = share
+
     def add_mf(self, mf_df, node, name, dir='out'):
         if not node in self.nodes:
             raise KeyError('{} is not an existing node'.format(node))
@@ -68,79 +97,122 @@ class MfCalculation(object):
         else:
             return self.mass_flows[node][comp].iloc[index]
 
+    def get_edge_mfs(self):
+        """
+        :return: pd.DataFrame with the mass flow rates of all edges, one column per edge
+        """
+        return self.edge_mf
+
     def get_edge_mf(self, edge, index=None):
         if index is None:
             return self.mass_flows[edge]
         else:
             return self.mass_flows[edge].iloc[index]
 
+    def is_producer(self, node, comp):
+        return (node, comp) in self.shares or (node == self.unknown_node and comp == self.unknown_comp)
+
     def get_reduced_matrix(self):
         """
-        Remove the unknown node and the corresponding row from the matrix to make the system determined
+        Remove the unknown node (the first node if there is none) and the corresponding row from the matrix. The mass
+        balance of this node follows from those of all other nodes.
 
-        :return:the resulting matrix and deleted row
+        :return:the resulting sparse matrix, the deleted row and its number
         """
 
-        row_nr = self.nodes.index(self.unknown_node)
-        row = self.inc_matrix[row_nr, :]
-        matrix = np.delete(self.inc_matrix, row_nr, 0)
+        row_nr = 0 if self.unknown_node is None else self.nodes.index(self.unknown_node)
+        keep = [i for i in range(len(self.nodes)) if not i == row_nr]
+        row = self.inc_matrix[row_nr, :].toarray().ravel()
+        matrix = self.inc_matrix[keep, :]
 
         return matrix, row, row_nr
 
     def check_data(self):
+        if self.unknown_node is None and not np.isclose(sum(self.shares.values()), 1):
+            raise Exception('Set the producer node and component that supply the remainder of the mass flow, or make '
+                            'the shares of all producers add up to 1')
+
         for node in self.nodes:
             for comp in self.components[node]:
-                if comp == self.unknown_comp:
+                if self.is_producer(node, comp):
                     pass
                 elif not comp in self.mass_flows[node].keys():
                     raise Exception('Add a mass flow for {} at node {}'.format(comp, node))
 
-    def initialize_mass_flows(self):
-        for edge in self.edges:
-            self.mass_flows[edge] = pd.Series(0, index=self.index)
+    def get_factorization(self):
+        """
+        Sparse LU factorization of the reduced Laplacian A.A^T of the network, with A the reduced incidence matrix.
+        The edge flows A^T.y, with A.A^T.y equal to the node injections, are the unique solution of the mass balances
+        of a radial network. In a meshed network, they are the solution with the smallest sum of squared flow rates.
+        The factorization only depends on the network, so it is reused for all time steps and later calculations.
+
+        :return: the factorization, see scipy.sparse.linalg.splu
+        """
+        matrix, _, row_nr = self.get_reduced_matrix()
+        if self.lu is None or not self.lu_row == row_nr:
+            self.lu = splu(csc_matrix(matrix.dot(matrix.T)))
+            self.lu_row = row_nr
+
+        return self.lu
+
+    def get_injections(self):
+        """
+        Collect the known mass flow rates of all components and add them to the corresponding nodes
+
+        :return: np.array with one row per node and one column per time step
+        """
+        n_steps = len(self.time)
+        injections = np.zeros((len(self.nodes), n_steps))
+
+        for i, node in enumerate(self.nodes):
+            for comp in self.components[node]:
+                if not self.is_producer(node, comp):
+                    injections[i] += np.asarray(self.get_comp_mf(node, comp), dtype=float)[:n_steps]
 
-        self.mass_flows[self.unknown_node][self.unknown_comp] = pd.Series(0, index=self.index)
+        return injections
 
     def calculate_mf(self):
         """
-        Given the heat demands of all substations, calculate the mass flow throughout the entire network
-        !!!! Only one producer node possible at the moment, with only a single component at this node
+        Given the heat demands of all substations, calculate the mass flow throughout the entire network. All time
+        steps are solved at once, with the node injections as right hand side matrix. Producers with a share (see
+        add_producer) supply that share of the total mass flow, the producer component at the producer node supplies
+        the remainder.
+
         :return:
         """
-        # TODO Only one producer node possible at the moment, with only a single componenta at the node
-
         self.check_data()
-        self.initialize_mass_flows()
-        matrix, row, row_nr = self.get_reduced_matrix()
-
-        for t in self.time:
-            # initializing vector with node mass flow rates
-            vector = [0] * len(self.nodes)
+        n_steps = len(self.time)
 
-            # Collect known mass flow rates at components and add them to corresponding nodes
-            for i, node in enumerate(self.nodes):
-                if not node == self.unknown_node:
-                    node_comps = self.components[node]
-                    for comp in node_comps:
-                        vector[i] += self.get_comp_mf(node, comp, index=t)
+        injections = self.get_injections()
 
-            del vector[row_nr]
+        # Mass flow through the producers
+        total = -injections.sum(axis=0)
+        producer_mf = {producer: share * total for producer, share in self.shares.items()}
+        if self.unknown_node is not None:
+            producer_mf[(self.unknown_node, self.unknown_comp)] = total - sum(
+                producer_mf.values(), np.zeros(n_steps))
 
-            # Solve system
-            sol = np.linalg.solve(matrix, vector)
+        for (node, comp), mf in producer_mf.items():
+            injections[self.nodes.index(node)] += mf
 
-            # Save pipe mass flow rates
-            for i, edge in enumerate(self.edges):
-               self.mass_flows[edge].iloc[t] = sol[i]
+        # Solve system, one column per time step
+        matrix, _, row_nr = self.get_reduced_matrix()
+        if len(self.edges) > 0:
+            sol = matrix.T.dot(self.get_factorization().solve(np.delete(injections, row_nr, 0)))
+        else:
+            sol = np.zeros((0, n_steps))
 
-            # Calculate mass flow through producer node
-            unknown_node_mf = (sum(
-                self.mass_flows[edge][t] * row[0, i] for i, edge in
-                enumerate(self.edges)))
+        # Save pipe mass flow rates, values after the horizon are zero
+        edge_mf = np.zeros((len(self.index), len(self.edges)))
+        edge_mf[:n_steps] = sol.T
+        self.edge_mf = pd.DataFrame(edge_mf, index=self.index, columns=self.edges)
+        for edge in self.edges:
+            self.mass_flows[edge] = self.edge_mf[edge]
 
-            # Calculate mass flow through producer component
-            self.mass_flows[self.unknown_node][self.unknown_comp].iloc[t] = \
-                unknown_node_mf - sum(self.mass_flows[self.unknown_node][x].iloc[t]
-                                      for x in self.components[self.unknown_node])
+        # Save producer mass flow rates
+        for (node, comp), mf in producer_mf.items():
+            values = np.zeros(len(self.index))
+            values[:n_steps] = mf
+            self.mass_flows[node][comp] = pd.Series(values, index=self.index)
 
-        return self.mass_flows
\ No newline at end of file
+        return self.mass_flows
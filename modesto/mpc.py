@@ -0,0 +1,139 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from pyomo.core.base import value
+
+from modesto.parameter import StateParameter
+
+
+class MPCRunner(object):
+    def __init__(self, optmodel, n_steps=1, objective='cost', results=None, solve_kwargs=None):
+        """
+        Solve a Modesto model in receding horizon: after each optimization the start time is moved forward by n_steps
+        time steps and the states reached at that time become the initial states of the next optimization. The
+        compiled model is reused between windows, only components of which a non-mutable parameter changed are
+        rebuilt.
+
+        :param optmodel: Modesto object of which all parameters are set
+        :param n_steps: Number of time steps the start time is moved forward after each optimization. Only the
+            results of these time steps are kept.
+        :param objective: Name of the objective to be used
+        :param results: dict with labels as keys and tuples (node, comp, name) or (node, comp, name, index) as values.
+            The first n_steps values of these results are collected with Modesto.get_result after each window.
+        :param solve_kwargs: dict of keyword arguments passed on to Modesto.solve. Solvers with a persistent interface
+            are used in persistent mode unless 'persistent' is set to False.
+        """
+        self.logger = logging.getLogger('modesto.mpc.MPCRunner')
+
+        if optmodel.repr_days is not None:
+            raise ValueError('A receding horizon cannot be combined with representative days')
+
+        horizon_steps = int(optmodel.params['horizon'].v() / optmodel.params['time_step'].v())
+        if not 0 < n_steps <= horizon_steps:
+            raise ValueError('n_steps should be between 1 and the number of time steps in the horizon ({})'.format(
+                horizon_steps))
+
+        self.optmodel = optmodel
+        self.n_steps = n_steps
+        self.objective = objective
+        self.results = {} if results is None else results
+        self.solve_kwargs = {} if solve_kwargs is None else dict(solve_kwargs)
+        solver = self.solve_kwargs.get('solver', 'gurobi')
+        if solver.startswith('appsi_') or solver.endswith('_persistent'):
+            # Keep the model loaded in the solver between windows
+            self.solve_kwargs.setdefault('persistent', True)
+
+        self.summary = None
+        self.timeseries = None
+
+    def handover(self):
+        """
+        Move the states of the current solution after n_steps time steps to the initial state parameters of all
+        components and shift the histories of the pipe models. States that are not initialized with a fixed value
+        (init_type 'cyclic' or 'free') are left untouched.
+
+        :return: dict with component names as keys and dicts of the changed parameters as values
+        """
+        changed = {}
+        for name, comp in self.optmodel.components.items():
+            handover = {}
+            for param, val in comp.get_handover(self.n_steps).items():
+                param_obj = comp.get_param(param)
+                if isinstance(param_obj, StateParameter) and not param_obj.get_init_type() == 'fixedVal':
+                    continue
+                param_obj.change_value(val)
+                handover[param] = val
+            if handover:
+                changed[name] = handover
+
+        return changed
+
+    def step(self, start_time):
+        """
+        Optimize the window that starts at start_time and hand over the states to the next window
+
+        :param start_time: Start time of the window, pd.Timestamp or string of format 'yyyymmdd'
+        :return: Solver status and start time of the next window. If no solution was found, the states are not handed
+            over and the start time is not moved.
+        """
+        optmodel = self.optmodel
+        start_time = pd.Timestamp(start_time)
+
+        recompile = bool(optmodel.get_dirty_components()) if optmodel.compiled else False
+        optmodel.compile(start_time=start_time, recompile=recompile)
+        optmodel.set_objective(self.objective)
+
+        status = optmodel.solve(**self.solve_kwargs)
+        self.logger.info('Window starting at {} solved with status {}'.format(start_time, status))
+
+        if status not in [0, 2]:
+            return status, start_time
+
+        self.handover()
+
+        return status, start_time + pd.Timedelta(seconds=self.n_steps * optmodel.params['time_step'].v())
+
+    def run(self, start_time, n_windows):
+        """
+        Optimize n_windows consecutive windows. The run stops early if no solution is found for a window.
+
+        :param start_time: Start time of the first window, pd.Timestamp or string of format 'yyyymmdd'
+        :param n_windows: Number of windows
+        :return: pd.DataFrame with one row per window, indexed by its start time, containing the solver status and
+            the value of the objective. The first n_steps values of the requested results are stored in
+            self.timeseries, a pd.DataFrame with a column per result.
+        """
+        optmodel = self.optmodel
+        start_time = pd.Timestamp(start_time)
+
+        summary = []
+        timeseries = {label: [] for label in self.results}
+
+        for _ in range(n_windows):
+            status, next_time = self.step(start_time)
+
+            row = {'status': status}
+            solved = status in [0, 2]
+            row[self.objective] = value(optmodel.get_objective(self.objective, get_value=False)) if solved \
+                else np.nan
+            summary.append(pd.Series(row, name=start_time))
+
+            if not solved:
+                self.logger.error('No solution found for window starting at {}, stopping'.format(start_time))
+                break
+
+            for label, args in self.results.items():
+                result = optmodel.get_result(args[2], node=args[0], comp=args[1],
+                                             index=args[3] if len(args) > 3 else None)
+                timeseries[label].append(result.iloc[:self.n_steps])
+
+            start_time = next_time
+
+        self.summary = pd.DataFrame(summary)
+        if len(self.summary) > 0:
+            self.summary['status'] = self.summary['status'].astype(int)
+
+        self.timeseries = pd.DataFrame({label: pd.concat(series) for label, series in timeseries.items() if series})
+
+        return self.summary
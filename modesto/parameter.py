@@ -1,8 +1,9 @@
 import logging
 
 import modesto.utils as ut
+import numpy as np
 import pandas as pd
-from pyomo.core import Param
+from pyomo.core import Param, Var
 from scipy import interpolate
 
 
@@ -28,6 +29,7 @@ class Parameter(object):
 
         self.mutable = mutable
         self.constructed = False
+        self.dirty = False  # True if the parameter changed since the model was last compiled
 
         self.param = None
         self.block = None
@@ -50,6 +52,7 @@ class Parameter(object):
         :return:
         """
         self.value = new_val
+        self.dirty = True
         if not self.mutable:
             self.logger.info(
                 'Changing value in parameter {}. Model needs to be recompiled for changes to take effect.'.format(
@@ -61,6 +64,21 @@ class Parameter(object):
     def is_constructed(self):
         return self.constructed
 
+    def is_dirty(self):
+        return self.dirty
+
+    def needs_rebuild(self):
+        """
+        :return: True if the parameter changed in a way that cannot be taken over by updating its mutable Param
+        """
+        return self.dirty and not self.mutable
+
+    def clean(self):
+        """
+        Mark the parameter as up to date with the compiled model
+        """
+        self.dirty = False
+
     def resample(self):
         pass
 
@@ -131,8 +149,8 @@ class Parameter(object):
         if self.mutable:
             if not self.is_constructed():
                 self.constructed = True
-                self.block.add_component(self.name, self.make_param())
-                self.param = getattr(self.block, self.name)
+                self.block.add_component(self.get_param_name(), self.make_param())
+                self.param = getattr(self.block, self.get_param_name())
                 return
             else:
                 # Change parameter value
@@ -158,6 +176,12 @@ class Parameter(object):
     def make_param(self):
         return Param(mutable=True, initialize=self.v())
 
+    def get_param_name(self):
+        """
+        :return: Name of the Param that is added to the block for mutable parameters
+        """
+        return self.name
+
     def __str__(self):
         return self.name + ': ' + str(self.value)
 
@@ -176,6 +200,61 @@ class DesignParameter(Parameter):
         Parameter.__init__(self, name, description, unit, val=val,
                            mutable=mutable)
 
+        self.bounds = None  # (lower bound, upper bound) if the parameter is a decision variable
+        self.structure_dirty = False  # True if the bounds changed
+
+    def change_bounds(self, lb, ub):
+        """
+        Turn the parameter into a decision variable between lb and ub, e.g. to optimize the size of a component. The
+        value of the parameter is used as initial value of the variable. Only mutable parameters, of which the Param
+        is used in the equations, can become decision variables.
+
+        :param lb: Lower bound, None together with ub to use the value of the parameter again
+        :param ub: Upper bound
+        """
+        if lb is None and ub is None:
+            bounds = None
+        elif not self.mutable:
+            raise ValueError('{} is not mutable and cannot become a decision variable'.format(self.name))
+        elif lb is None or ub is None or lb > ub:
+            raise ValueError('Give a lower and upper bound for {}, with lb <= ub'.format(self.name))
+        else:
+            bounds = (lb, ub)
+
+        # The bounds determine the breakpoints of piecewise linear costs, so every change needs a rebuild
+        self.structure_dirty = self.structure_dirty or bounds != self.bounds
+        self.bounds = bounds
+        self.dirty = True
+
+    def is_variable(self):
+        """
+        :return: True if the parameter is a decision variable, see change_bounds
+        """
+        return self.bounds is not None
+
+    def needs_rebuild(self):
+        return Parameter.needs_rebuild(self) or self.structure_dirty
+
+    def clean(self):
+        Parameter.clean(self)
+        self.structure_dirty = False
+
+    def construct(self):
+        """
+        Construct the Param, or the Var if the parameter is a decision variable. If it exists, its value or its bounds
+        are updated.
+        """
+        if self.is_variable() and self.is_constructed():
+            self.param.setlb(self.bounds[0])
+            self.param.setub(self.bounds[1])
+        else:
+            Parameter.construct(self)
+
+    def make_param(self):
+        if self.is_variable():
+            return Var(bounds=self.bounds, initialize=self.v())
+        return Parameter.make_param(self)
+
 
 class StateParameter(Parameter):
     def __init__(self, name, description, unit, init_type, val=None, ub=None,
@@ -204,6 +283,23 @@ class StateParameter(Parameter):
         self.ub = ub
         self.lb = lb
         self.slack = slack
+        self.structure_dirty = False  # True if the initialization constraint or bounds changed
+
+    def get_param_name(self):
+        """
+        The state variable usually carries the name of the parameter, so the Param holding its initial value is
+        called '<name>_0'
+
+        :return: Name of the Param that is added to the block for mutable parameters
+        """
+        return self.name + '_0'
+
+    def needs_rebuild(self):
+        return Parameter.needs_rebuild(self) or self.structure_dirty
+
+    def clean(self):
+        Parameter.clean(self)
+        self.structure_dirty = False
 
     def change_init_type(self, new_type):
         """
@@ -218,6 +314,8 @@ class StateParameter(Parameter):
                     new_type))
 
         self.init_type = new_type
+        self.dirty = True
+        self.structure_dirty = True
 
     def change_upper_bound(self, new_ub):
         """
@@ -227,6 +325,8 @@ class StateParameter(Parameter):
         :param new_ub: New value of the upper bound
         """
         self.ub = new_ub
+        self.dirty = True
+        self.structure_dirty = True
 
     def change_lower_bound(self, new_lb):
         """
@@ -236,6 +336,8 @@ class StateParameter(Parameter):
         :param new_lb: New value of the upper bound
         """
         self.lb = new_lb
+        self.dirty = True
+        self.structure_dirty = True
 
     def change_slack(self, new_slack):
         """
@@ -246,6 +348,8 @@ class StateParameter(Parameter):
         :param new_slack: New value of the upper bound
         """
         self.slack = new_slack
+        self.dirty = True
+        self.structure_dirty = True
 
     def get_slack(self):
         """
@@ -297,6 +401,7 @@ class SeriesParameter(Parameter):
         if isinstance(self.value, pd.Series):
             self.value = self.value.astype('float')
         self.unit_index = unit_index
+        self.interpolator = None  # Cached look-up table, see get_interpolator
 
     def change_value(self, new_val):
         """
@@ -306,9 +411,30 @@ class SeriesParameter(Parameter):
         :return:
         """
         self.value = new_val
+        self.dirty = True
+        self.interpolator = None
         if isinstance(new_val, pd.Series):
             self.value.index = self.value.index.astype('float')
 
+    def get_interpolator(self):
+        """
+        Prepare the look-up table for interpolation. The table is built once per value and kept until change_value is
+        called.
+
+        :return: Tuple of np.arrays with the sorted independent and dependent variables for a single column, a
+            scipy.interpolate.interp1d object otherwise
+        """
+        if self.interpolator is None:
+            x = np.asarray(self.value.index.values, dtype=float)
+            y = np.asarray(self.value.values, dtype=float)
+            if y.ndim == 1 and len(x) > 1:
+                order = np.argsort(x, kind='stable')
+                self.interpolator = (x[order], y[order])
+            else:
+                self.interpolator = interpolate.interp1d(x, y, axis=0, fill_value='extrapolate')
+
+        return self.interpolator
+
     def get_value(self, index):
         """
         Returns the value of the dependent variable this parameter for a certain independent variable value.
@@ -316,17 +442,27 @@ class SeriesParameter(Parameter):
         index (input) is multiplied by this unit price to get the final value. If the cost is indicated in table format,
         the cost is returned as-is.
 
-        :param index:   independent variable value. Cannot be None.
+        :param index:   independent variable value, or an array of values. Cannot be None.
         :return:
         """
         if self.value is None:
             raise Exception('Parameter {} has no value yet'.format(self.name))
         elif isinstance(self.value, (int, float)):
+            if np.ndim(index) > 0:
+                index = np.asarray(index, dtype=float)
             return self.value * index
-        else:
-            f = interpolate.interp1d(self.value.index.values, self.value.values,
-                                     fill_value='extrapolate')
-            return f(index)
+
+        interpolator = self.get_interpolator()
+        if not isinstance(interpolator, tuple):
+            return interpolator(index)
+
+        x, y = interpolator
+        index = np.asarray(index, dtype=float)
+        out = np.interp(index, x, y)
+        # Linear extrapolation from the two extreme points
+        out = np.where(index < x[0], y[0] + (index - x[0]) * (y[1] - y[0]) / (x[1] - x[0]), out)
+        out = np.where(index > x[-1], y[-1] + (index - x[-1]) * (y[-1] - y[-2]) / (x[-1] - x[-2]), out)
+        return out if out.ndim > 0 else out[()]
 
     def v(self, index):
         """
@@ -353,6 +489,9 @@ class TimeSeriesParameter(Parameter):
         self.time_step = None
         self.horizon = None
         self.start_time = None
+        self.sample_time = None  # Time step to which the value has been resampled
+        self.window = None  # Values of the current horizon as a float array, see get_window
+        self.window_key = None
         Parameter.__init__(self, name, description, unit, val, mutable=mutable)
 
     # todo indexed time variables (such as return/supply temperature profile could use two or more columns to distinguish between indexes instead of using multiple indexes. These parameters would become real TimeDataFrameParameters. Just an idea ;)
@@ -393,6 +532,12 @@ class TimeSeriesParameter(Parameter):
             print('Warning: {} does not have a value yet'.format(self.name))
             return None
         else:
+            if self.time_data:
+                position = self.get_window_position(time, c)
+                window = self.get_window()
+                if 0 <= position < len(window):
+                    return window[position]
+
             if c is None:
                 if self.time_data:
                     timeindex = self.start_time + pd.Timedelta(
@@ -415,6 +560,83 @@ class TimeSeriesParameter(Parameter):
     def v(self, time=None, c=None):
         return self.get_value(time, c=c)
 
+    def get_window(self):
+        """
+        Returns the values of the parameter from the start time onwards, one value per time step, for the current
+        start time, time step and horizon. The window is cached and rebuilt only when one of these or the value of the
+        parameter changes. If the data does not cover the whole horizon, the window stops at the first missing value.
+
+        :return: np.array of floats
+        """
+        key = (self.start_time, self.time_step, self.horizon)
+        if self.window is None or self.window_key != key:
+            n_steps = int(self.horizon / self.time_step)
+            timeindex = pd.date_range(start=self.start_time, periods=n_steps,
+                                      freq=pd.Timedelta(seconds=self.time_step))
+            try:
+                positions = self.value.index.get_indexer(timeindex)
+                missing = np.flatnonzero(positions == -1)
+                if len(missing) > 0:
+                    positions = positions[:missing[0]]
+                self.window = np.ascontiguousarray(self.value.values[positions], dtype=float)
+            except (ValueError, TypeError, pd.errors.InvalidIndexError):
+                # Non-unique index or non-numeric data, fall back to label look-up
+                self.window = np.array([], dtype=float)
+            self.window_key = key
+
+        return self.window
+
+    def get_window_position(self, time, c=None):
+        """
+        Position of time step time of (representative) day c in the window returned by get_window
+
+        :param time: Time step
+        :param c: Offset in days with respect to the start time, None if not applicable
+        :return: int, -1 if the position cannot be expressed as a whole number of time steps
+        """
+        if c is None:
+            return time
+        steps_per_day = 24 * 3600 / self.time_step
+        if not steps_per_day == int(steps_per_day):
+            return -1
+        return int(c * steps_per_day) + time
+
+    def get_horizon_values(self, n_steps=None, c=None):
+        """
+        Returns the values of the parameter for a number of consecutive time steps as a NumPy array, in one look-up
+        instead of one look-up per time step. Element t equals v(t, c).
+
+        :param n_steps: Number of time steps, if None, the number of time steps in the horizon is used
+        :param c: Representative day (offset in days with respect to the start time), None if not applicable
+        :return: np.array of length n_steps
+        """
+        if self.start_time is None or self.horizon is None or self.time_step is None:
+            raise Exception(
+                'Start time, horizon and time step should be given to parameter {} first'.format(
+                    self.name))
+        if self.value is None:
+            raise Exception('{} does not have a value yet'.format(self.name))
+
+        if n_steps is None:
+            n_steps = int(self.horizon / self.time_step)
+
+        if self.time_data:
+            position = self.get_window_position(0, c)
+            window = self.get_window()
+            if 0 <= position and position + n_steps <= len(window):
+                return window[position:position + n_steps].copy()
+
+            start = self.start_time
+            if c is not None:
+                start = start + pd.Timedelta(days=c)
+            timeindex = pd.date_range(start=start, periods=n_steps,
+                                      freq=pd.Timedelta(seconds=self.time_step))
+            return self.value.loc[timeindex].values.astype(float)
+        elif not isinstance(self.value, pd.Series):
+            return np.full(n_steps, self.value, dtype=float)
+        else:
+            return self.value.loc[list(range(n_steps))].values.astype(float)
+
     def change_value(self, new_val):
         """
         Change the value of the Dataframe parameter
@@ -434,30 +656,44 @@ class TimeSeriesParameter(Parameter):
             new_val = ut.resample(new_val, new_sample_time=self.time_step)
 
         self.value = new_val
+        self.dirty = True
+        self.sample_time = self.time_step
+        self.window = None
 
     def change_start_time(self, val):
-        if isinstance(val, pd.Timestamp):
-            self.start_time = val
-        elif isinstance(val, str):
-            self.start_time = pd.Timestamp(val)
-        else:
+        if isinstance(val, str):
+            val = pd.Timestamp(val)
+        elif not isinstance(val, pd.Timestamp):
             raise TypeError(
                 'New start time should be pandas timestamp or string representation of a timestamp')
 
+        if not val == self.start_time:
+            self.window = None
+        self.start_time = val
+
     def change_horizon(self, val):
+        if not val == self.horizon:
+            self.window = None
         self.horizon = val
 
     def change_time_step(self, val):
+        if not val == self.time_step:
+            self.window = None
         self.time_step = val
 
     def resample(self):
         """
-        Change the sampling time of the parameter
+        Change the sampling time of the parameter. Parameter objects that are shared by several components are only
+        resampled by the first component that asks for it.
 
         :return:
         """
-        if self.time_data:  # TODO This is a TimeSeries Parameter, a Boolean indicating whether or not it contains time data should be unnecessary
-            self.value = ut.resample(self.value, new_sample_time=self.time_step)
+        if self.time_data and not self.sample_time == self.time_step:  # TODO This is a TimeSeries Parameter, a Boolean indicating whether or not it contains time data should be unnecessary
+            new_val = ut.resample(self.value, new_sample_time=self.time_step)
+            if new_val is not self.value:
+                self.window = None
+            self.value = new_val
+            self.sample_time = self.time_step
 
 
 class UserDataParameter(TimeSeriesParameter):
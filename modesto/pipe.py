@@ -1,6 +1,7 @@
 import os
 import sys
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import reduce
 from math import pi
 
@@ -10,9 +11,236 @@ from modesto.component import Component
 from modesto.parameter import DesignParameter, StateParameter, UserDataParameter, \
     WeatherDataParameter
 from pkg_resources import resource_filename
-from pyomo.core.base import Param, Var, Constraint, Set, NonNegativeReals
+from pyomo.core.base import Param, Var, Constraint, Set, NonNegativeReals, Binary, SOSConstraint, value
 
 CATALOG_PATH = resource_filename('modesto', 'Data/PipeCatalog')
+DEFAULT_CATALOG = 'Twin200Compound1000'
+PIPE_WALL_RHO = 7.85 * 10 ** 3  # http://www.steel-grades.com/Steel-Grades/Structure-Steel/en-p235.html kg/m^3
+PIPE_WALL_C = 461  # http://www.steel-grades.com/Steel-Grades/Structure-Steel/en-p235.html J/kg/K
+
+_catalogs = {}
+
+
+class PipeCatalog(object):
+    def __init__(self, data, name=None):
+        """
+        Dimensions and properties of a series of pipes, per nominal diameter DN. The columns are read-only np.arrays
+        in the order of dn.
+
+        :param data: pd.DataFrame with DN as index, or path of a csv file with ';' as separator and a DN column
+        :param name: Name of the catalog
+        """
+        if not isinstance(data, pd.DataFrame):
+            data = pd.read_csv(data, sep=';', index_col='DN')
+
+        self.name = name
+        self.dn = _read_only(data.index.values.astype(int))
+        self.columns = {column: _read_only(data[column].values.astype(float)) for column in data.columns}
+        self.rows = {dn: i for i, dn in enumerate(self.dn)}
+
+    def __getitem__(self, column):
+        if column not in self.columns:
+            raise KeyError('Pipe catalog {} has no column {}'.format(self.name, column))
+        return self.columns[column]
+
+    def get(self, column, dn):
+        """
+        :param column: Name of the column, e.g. 'Di' or 'Rs'
+        :param dn: Nominal diameter
+        :return: Value of the column for the given diameter
+        """
+        if dn not in self.rows:
+            raise KeyError('DN {} is not in pipe catalog {}'.format(dn, self.name))
+        return self[column][self.rows[dn]]
+
+    def to_frame(self):
+        """
+        :return: Copy of the catalog as a pd.DataFrame with DN as index
+        """
+        return pd.DataFrame(self.columns, index=pd.Index(self.dn, name='DN'))
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def register_pipe_catalog(name, data):
+    """
+    Make a pipe catalog available to all models in this process. Pipes use it if their pipe_catalog parameter, or the
+    general pipe_catalog parameter of the model, is set to name.
+
+    :param name: Name of the catalog
+    :param data: PipeCatalog, pd.DataFrame with DN as index or path of a csv file, see PipeCatalog
+    :return: PipeCatalog object
+    """
+    if not isinstance(data, PipeCatalog):
+        data = PipeCatalog(data, name=name)
+    _catalogs[name] = data
+
+    return data
+
+
+def get_pipe_catalog(name=DEFAULT_CATALOG):
+    """
+    Return a registered pipe catalog. The catalogs in Data/PipeCatalog and Data/PipeCatalog/Archive are read the first
+    time they are asked for, e.g. 'Twin200Compound1000' or 'IsoPlusDoubleStandard'.
+
+    :param name: Name of the catalog
+    :return: PipeCatalog object
+    """
+    if name not in _catalogs:
+        for folder in [CATALOG_PATH, os.path.join(CATALOG_PATH, 'Archive')]:
+            path = os.path.join(folder, name + '.csv')
+            if os.path.isfile(path):
+                register_pipe_catalog(name, path)
+                break
+        else:
+            raise KeyError('{} is not a registered pipe catalog'.format(name))
+
+    return _catalogs[name]
+
+
+def plug_flow_windows(mf_history, mass_flow, mass, time_step, lengths=None):
+    """
+    Find the parts of the mass flow history that leave a pipe during each time step of the horizon, see NodeMethod
+    (Eq. 3.4.3 and 3.4.7 - 3.4.11) and calculate the corresponding delay tk (Eq. 3.4.24). The history is summed
+    cumulatively once, after which each window boundary is found with a binary search. Several pipes can be treated at
+    once by passing 2-D arrays with one row per pipe.
+
+    :param mf_history: np.array with the mass flow rates of the horizon in reverse order, followed by the historic mass
+        flow rates, most recent first. 2-D for several pipes, rows that are shorter than others are padded with zeros.
+    :param mass_flow: np.array with the mass flow rates of the horizon, 2-D for several pipes
+    :param mass: Mass of the water in the pipe, an np.array with one value per pipe for several pipes
+    :param time_step: Time step in seconds
+    :param lengths: Number of values in each row of a 2-D mf_history without padding, None if no rows were padded
+    :return: dict with np.arrays n, m, R, S and tk, with one value per time step (tk is nan if there is no flow), and
+        boolean arrays found_n and found_m, False where the history was too short to find n or m. The arrays are 2-D if
+        mass_flow is.
+    """
+    single = np.ndim(mass_flow) == 1
+    mf_history = np.atleast_2d(np.asarray(mf_history, dtype=float))
+    mass_flow = np.atleast_2d(np.asarray(mass_flow, dtype=float))
+    n_pipes, length = mf_history.shape
+    n_steps = mass_flow.shape[1]
+    mass = np.broadcast_to(np.asarray(mass, dtype=float), (n_pipes,))[:, None]
+    if lengths is None:
+        lengths = np.full(n_pipes, length)
+    lengths = np.asarray(lengths)[:, None]
+
+    start = np.repeat([n_steps - 1 - np.arange(n_steps)], n_pipes, axis=0)  # Position of time step t in the history
+    flows = mf_history * time_step
+    cum = np.hstack([np.zeros((n_pipes, 1)), np.cumsum(flows, axis=1)])  # cum[:, k] is the sum of flows[:, :k]
+    cum_weighted = np.hstack([np.zeros((n_pipes, 1)), np.cumsum(flows * np.arange(length), axis=1)])
+
+    def _at(values, positions):
+        return np.take_along_axis(values, positions, axis=1)
+
+    def _first_exceeding(threshold):
+        # Smallest i for which the sum of flows[start:start + i + 1] exceeds threshold, lengths + 1 if there is none
+        limit = _at(cum, start) + threshold
+        low = start + 1
+        high = np.broadcast_to(lengths + 1, low.shape).copy()
+        active = low < high
+        while active.any():
+            middle = (low + high) // 2
+            exceeds = _at(cum, np.minimum(middle, length)) > limit
+            high = np.where(active & exceeds, middle, high)
+            low = np.where(active & ~exceeds, middle + 1, low)
+            active = low < high
+
+        # The cumulative sum of pipes with negative flows is not monotonic, search every time step separately
+        for p in np.flatnonzero((flows < 0).any(axis=1)):
+            for t in range(n_steps):
+                exceeding = np.flatnonzero(cum[p, start[p, t] + 1:lengths[p, 0] + 1] > limit[p, t])
+                low[p, t] = start[p, t] + 1 + exceeding[0] if len(exceeding) > 0 else lengths[p, 0] + 1
+
+        found = low <= lengths
+        return np.minimum(low, lengths) - start - 1, found
+
+    n, found_n = _first_exceeding(mass)
+    m, found_m = _first_exceeding(mass + mass_flow * time_step)
+
+    R = _at(cum, start + n + 1) - _at(cum, start)
+    S = np.where(m > n, _at(cum, start + m) - _at(cum, start), R)
+    weighted = np.where(m > n + 1, _at(cum_weighted, start + m) - _at(cum_weighted, start + n + 1) -
+                        start * (_at(cum, start + m) - _at(cum, start + n + 1)), 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tk = np.where(mass_flow == 0, np.nan,
+                      ((R - mass) * n + weighted + (mass_flow * time_step - S + mass) * m) / mass_flow)
+
+    windows = {'n': n, 'm': m, 'R': R, 'S': S, 'tk': tk, 'found_n': found_n, 'found_m': found_m}
+    if single:
+        windows = {key: val[0] for key, val in windows.items()}
+    return windows
+
+
+def precompute_node_method(pipes, workers=1, processes=False):
+    """
+    Calculate the wall heat capacity, water mass, plug flow windows (see plug_flow_windows) and heat loss factors of
+    several NodeMethod pipes at once. The catalog data and mass flow rates of all pipes are gathered in arrays with one
+    row per pipe. The results are stored in the pipes and used by their next compile.
+
+    :param pipes: list of NodeMethod objects, of which the start time, horizon and time step are set
+    :param workers: Number of workers among which the pipes are divided, 1 to calculate everything in the calling thread
+    :param processes: If True, the workers are processes instead of threads
+    :return:
+    """
+    if len(pipes) == 0:
+        return
+
+    time_step = pipes[0].params['time_step'].v()
+    n_steps = int(pipes[0].params['horizon'].v() / time_step)
+
+    dn = [pipe.params['diameter'].v() for pipe in pipes]
+    catalogs = [pipe.get_pipe_catalog() for pipe in pipes]
+    Di = np.array([catalog.get('Di', d) for catalog, d in zip(catalogs, dn)])
+    Do = np.array([catalog.get('Do', d) for catalog, d in zip(catalogs, dn)])
+    Rs = np.array([catalog.get('Rs', d) for catalog, d in zip(catalogs, dn)])
+    length = np.array([pipe.length for pipe in pipes], dtype=float)
+    rho = np.array([pipe.rho for pipe in pipes], dtype=float)
+    cp = np.array([pipe.cp for pipe in pipes], dtype=float)
+
+    C = np.pi * (Do ** 2 - Di ** 2) / 4 * length * PIPE_WALL_C * PIPE_WALL_RHO  # heat capacity of the pipe wall
+    surface = np.pi * Di ** 2 / 4  # cross sectional area of the pipe
+    Z = surface * rho * length  # water mass in the pipe
+    K = 1 / Rs  # Eq. 3.4.20
+
+    history_lengths = [len(pipe.params['mass_flow_history'].v()) for pipe in pipes]
+    mass_flow = np.array([pipe.params['mass_flow'].get_horizon_values(n_steps) for pipe in pipes])
+    lengths = n_steps + np.array(history_lengths)
+    mf_history = np.zeros((len(pipes), lengths.max()))
+    for i, pipe in enumerate(pipes):
+        mf_history[i, :lengths[i]] = np.concatenate(
+            [mass_flow[i, ::-1], pipe.params['mass_flow_history'].get_horizon_values(history_lengths[i])])
+
+    chunks = [chunk for chunk in np.array_split(np.arange(len(pipes)), workers) if len(chunk) > 0]
+    if len(chunks) > 1:
+        executor_type = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with executor_type(max_workers=len(chunks)) as executor:
+            futures = [executor.submit(plug_flow_windows, mf_history[chunk], mass_flow[chunk], Z[chunk], time_step,
+                                       lengths[chunk]) for chunk in chunks]
+            parts = [future.result() for future in futures]
+        windows = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    else:
+        windows = plug_flow_windows(mf_history, mass_flow, Z, time_step, lengths)
+
+    # Eq. 3.4.27, for time steps with and without flow
+    with np.errstate(invalid='ignore'):
+        loss = np.exp(-(K[:, None] * windows['tk']) / (surface * rho * cp)[:, None])
+    idle_loss = np.exp(-K * time_step / (surface * rho * cp + C / length))
+
+    for i, pipe in enumerate(pipes):
+        if not windows['found_n'][i].all():
+            pipe.logger.warning('A proper value for n could not be calculated')
+        if not windows['found_m'][i].all():
+            pipe.logger.warning('A proper value for m could not be calculated')
+
+        pipe.precomputed = {'C': C[i], 'Z': Z[i], 'K': K[i],
+                            'mass_flow': mass_flow[i], 'mf_history': mf_history[i, :lengths[i]],
+                            'n': windows['n'][i], 'm': windows['m'][i], 'R': windows['R'][i], 'S': windows['S'][i],
+                            'tk': windows['tk'][i], 'loss': loss[i], 'idle_loss': idle_loss[i]}
 
 
 def str_to_pipe(string):
@@ -62,12 +290,12 @@ class Pipe(Component):
         self.f_mult = 1.25  # Multiplication factor for darcy friction factor to account for extra pressure drops
         self.lifespan = 30
 
-    @staticmethod
-    def get_pipe_catalog():
-        df = pd.read_csv(
-            os.path.join(CATALOG_PATH, 'Twin200Compound1000.csv'), sep=';',
-            index_col='DN')
-        return df
+    def get_pipe_catalog(self):
+        """
+        :return: PipeCatalog set by the pipe_catalog parameter, see register_pipe_catalog
+        """
+        param = self.params['pipe_catalog']
+        return get_pipe_catalog(param.v() if param.check() else DEFAULT_CATALOG)
 
     def get_investment_cost(self):
         """
@@ -76,6 +304,8 @@ class Pipe(Component):
         :param interest_rate: equivalent interest rate as a decimal number
         :return: Cost in EUR
         """
+        if self.is_sized():
+            return value(self.block.investment)
         if self.dn is not 0:
             return self.length * (self.params['c_l'].v() + self.params['diameter'].v() * self.params['c_dl'].v())
         else:
@@ -87,6 +317,10 @@ class Pipe(Component):
             'diameter': DesignParameter('diameter',
                                         'Pipe diameter',
                                         'DN (mm)', mutable=True),
+            'pipe_catalog': DesignParameter('pipe_catalog',
+                                            'Name of the catalog with the pipe dimensions per diameter, '
+                                            'see register_pipe_catalog',
+                                            '-'),
             'c_l': DesignParameter(name='c_l',
                                    description='Fixed cost per meter',
                                    unit='EUR/m',
@@ -264,12 +498,6 @@ class ExtensivePipe(Pipe):
                       temperature_driven=temperature_driven,
                       repr_days=repr_days)
 
-        pipe_catalog = self.get_pipe_catalog()
-
-        self.mflo_max_list = pipe_catalog['Max mflow']
-        self.f_list = pipe_catalog['Friction factor']
-        self.Rs = pipe_catalog['Rs']
-        self.di = pipe_catalog['Di']
         self.allow_flow_reversal = allow_flow_reversal
         self.dn = None
         self.heat_var = heat_var
@@ -278,6 +506,9 @@ class ExtensivePipe(Pipe):
         # 0.7233 is the middle of the economic flow rates according to IsoPlus, taken as average over all diameters
 
         self.n_pump_constr = 5  # Number of linear pieces in pumping power approximation
+        self.size_param = 'diameter'
+        self.pw_repn = 'binary'  # Selection of the diameter if it is optimized, 'binary' or 'SOS1'
+        self.dn_candidates = None  # DNs among which the diameter is chosen, see _make_investment_cost
 
         self.params['temperature_supply'] = DesignParameter(
             'temperature_supply', 'Supply temperature', 'K',
@@ -296,13 +527,18 @@ class ExtensivePipe(Pipe):
         """
 
         Component.compile(self, model, start_time)
+        if self.is_sized():
+            self._compile_design()
+            return
+
         self.dn = self.params['diameter'].v()
 
         if self.dn is not 0:
-            self.mflo_max = self.mflo_max_list[self.dn]
+            pipe_catalog = self.get_pipe_catalog()
+            self.mflo_max = pipe_catalog.get('Max mflow', self.dn)
 
-            Rs = self.Rs[self.dn]
-            self.f = self.f_mult * self.f_list[self.dn]
+            Rs = pipe_catalog.get('Rs', self.dn)
+            self.f = self.f_mult * pipe_catalog.get('Friction factor', self.dn)
         else:
             self.mflo_max = 0
             self.f = 0
@@ -486,11 +722,160 @@ class ExtensivePipe(Pipe):
 
         :return:
         """
+        if self.is_sized() and self.block is not None:
+            return int(round(value(self.block.diameter)))
         if self.dn is not None:
             return self.dn
         else:
             return None
 
+    def _make_investment_cost(self):
+        """
+        Choose the diameter among the DNs of the pipe catalog between the bounds of the diameter, with binary variables
+        (pw_repn 'binary') or an SOS1 set (pw_repn 'SOS1'). A lower bound of 0 allows not to build the pipe at all. The
+        investment cost is that of get_investment_cost for the chosen diameter.
+
+        :return:
+        """
+        lb, ub = self.params['diameter'].bounds
+        if self.pw_repn not in ['binary', 'SOS1']:
+            raise ValueError('The diameter of pipe {} is chosen with binaries or an SOS1 set, not {}'.format(
+                self.name, self.pw_repn))
+
+        self.dn_candidates = [int(dn) for dn in self.get_pipe_catalog().dn if 0 < dn and lb <= dn <= ub]
+        if not self.dn_candidates:
+            raise ValueError('Pipe catalog {} has no DN between {} and {}'.format(self.get_pipe_catalog().name, lb, ub))
+        if lb <= 0:
+            self.dn_candidates.insert(0, 0)
+
+        self.block.DN = Set(initialize=self.dn_candidates, ordered=True)
+        if self.pw_repn == 'binary':
+            self.block.dn_choice = Var(self.block.DN, within=Binary)
+        else:
+            self.block.dn_choice = Var(self.block.DN, bounds=(0, 1))
+            self.block.sos_dn_choice = SOSConstraint(var=self.block.dn_choice, sos=1)
+
+        self.block.eq_dn_choice = Constraint(expr=sum(self.block.dn_choice[dn] for dn in self.block.DN) == 1)
+        self.block.eq_diameter = Constraint(
+            expr=self.block.diameter == sum(dn * self.block.dn_choice[dn] for dn in self.block.DN))
+
+        self.block.investment = Var()
+        self.block.def_investment = Constraint(expr=self.block.investment == self.length * (
+                self.params['c_l'].v() * sum(self.block.dn_choice[dn] for dn in self.block.DN if dn > 0) +
+                self.params['c_dl'].v() * self.block.diameter))
+
+    def _compile_design(self):
+        """
+        Build the pipe model for a diameter that is chosen among the candidate DNs, see _make_investment_cost. The mass
+        flow rate is split in one part per DN, of which only the part of the chosen DN can be non-zero. Each part is
+        bounded by the Max mflow of its DN, so the heat losses and pumping power of the model with a fixed diameter
+        become linear in the parts.
+
+        :return:
+        """
+        pipe_catalog = self.get_pipe_catalog()
+        dns = [dn for dn in self.dn_candidates if dn > 0]
+        mflo_max = {dn: pipe_catalog.get('Max mflow', dn) for dn in dns}
+        Te = self.params["Te"]
+
+        self.temp_sup = self.params['temperature_supply'].v()
+        self.temp_ret = self.params['temperature_return'].v()
+        self.dn = None
+        self.mflo_max = max(mflo_max.values())
+
+        def _key(*index):
+            # Index of a variable with or without representative days
+            return index[:-1] if index[-1] is None else index
+
+        def _heat_loss(b, dn, t, c=None):
+            """
+            Rule to calculate the heat loss per unit mass flow rate, see _eq_heat_loss of the fixed diameter model
+
+            :return: Heat loss in W/(kg/s)
+            """
+            return (self.temp_sup + self.temp_ret - 2 * Te.v(t, c)) / pipe_catalog.get('Rs', dn) * self.length / (
+                    self.hl_setting * mflo_max[dn])
+
+        if self.compiled:
+            for index in self.block.heat_loss_coef:
+                self.block.heat_loss_coef[index] = _heat_loss(self.block, *index)
+            return
+
+        axes = [self.TIME] if self.repr_days is None else [self.TIME, self.REPR_DAYS]
+
+        """
+        Parameters and sets
+        """
+        self.block.DN_pipe = Set(initialize=dns, ordered=True)
+        self.block.heat_loss_coef = Param(self.block.DN_pipe, *axes, rule=_heat_loss, mutable=True)
+
+        """
+        Variables
+        """
+        mflo_ub = (-self.mflo_max, self.mflo_max) if self.allow_flow_reversal else (0, self.mflo_max)
+
+        self.block.heat_flow_in = Var(*axes, doc='Heat flow entering in-node')
+        self.block.heat_flow_out = Var(*axes, doc='Heat flow exiting out-node')
+        self.block.mass_flow = Var(*axes, bounds=mflo_ub,
+                                   doc='Mass flow rate entering in-node and exiting out-node')
+        self.block.heat_loss_tot = Var(*axes, within=NonNegativeReals, doc='Total heat lost from pipe')
+        self.block.mass_flow_abs = Var(*axes, within=NonNegativeReals, doc='Absolute value of mass flow rate')
+        self.block.mass_flow_dn = Var(self.block.DN_pipe, *axes, within=NonNegativeReals,
+                                      doc='Absolute value of mass flow rate if the pipe has this DN, 0 otherwise')
+        self.block.pumping_power = Var(*axes, within=NonNegativeReals)
+
+        """
+        Pipe model
+        """
+
+        def _eq_heat_flow_bal(b, t, c=None):
+            return b.heat_flow_in[_key(t, c)] == b.heat_loss_tot[_key(t, c)] + b.heat_flow_out[_key(t, c)]
+
+        def _mass_flow_pos(b, t, c=None):
+            return b.mass_flow_abs[_key(t, c)] >= b.mass_flow[_key(t, c)]
+
+        def _mass_flow_neg(b, t, c=None):
+            return b.mass_flow_abs[_key(t, c)] >= -b.mass_flow[_key(t, c)]
+
+        def _eq_mass_flow_abs(b, t, c=None):
+            return b.mass_flow_abs[_key(t, c)] == sum(b.mass_flow_dn[_key(dn, t, c)] for dn in b.DN_pipe)
+
+        def _mass_flow_dn(b, dn, t, c=None):
+            return b.mass_flow_dn[_key(dn, t, c)] <= mflo_max[dn] * b.dn_choice[dn]
+
+        def _eq_heat_loss(b, t, c=None):
+            return b.heat_loss_tot[_key(t, c)] == sum(
+                b.heat_loss_coef[_key(dn, t, c)] * b.mass_flow_dn[_key(dn, t, c)] for dn in b.DN_pipe)
+
+        self.block.eq_heat_flow_bal = Constraint(*axes, rule=_eq_heat_flow_bal)
+        self.block.ineq_mass_flow_pos = Constraint(*axes, rule=_mass_flow_pos)
+        self.block.ineq_mass_flow_neg = Constraint(*axes, rule=_mass_flow_neg)
+        self.block.eq_mass_flow_abs = Constraint(*axes, rule=_eq_mass_flow_abs)
+        self.block.ineq_mass_flow_dn = Constraint(self.block.DN_pipe, *axes, rule=_mass_flow_dn)
+        self.block.eq_heat_loss = Constraint(*axes, rule=_eq_heat_loss)
+
+        # Linear pieces of the pumping power of each DN, see construct_pumping_constraints
+        self.mfs_ratio = np.linspace(0, 1, self.n_pump_constr + 1)
+        pps = {}
+        for dn in dns:
+            f = self.f_mult * pipe_catalog.get('Friction factor', dn)
+            di = pipe_catalog.get('Di', dn)
+            pps[dn] = 2 * f * self.length * (self.mfs_ratio * mflo_max[dn]) ** 3 * 8 / (di ** 5 * 983 ** 2 * pi ** 2)
+
+        for i in range(self.n_pump_constr):
+            slope = {dn: (pps[dn][i + 1] - pps[dn][i]) / ((self.mfs_ratio[i + 1] - self.mfs_ratio[i]) * mflo_max[dn])
+                     for dn in dns}
+            offset = {dn: pps[dn][i] - slope[dn] * self.mfs_ratio[i] * mflo_max[dn] for dn in dns}
+
+            def _ineq_pumping(b, t, c=None):
+                return b.pumping_power[_key(t, c)] >= sum(
+                    slope[dn] * b.mass_flow_dn[_key(dn, t, c)] + offset[dn] * b.dn_choice[dn] for dn in b.DN_pipe)
+
+            self.block.add_component('ineq_pumping_' + str(i), Constraint(*axes, rule=_ineq_pumping))
+
+        self.logger.info('Optimization model Pipe {} compiled with a variable diameter'.format(self.name))
+        self.compiled = True
+
     def construct_pumping_constraints(self):
         """
         Construct a set of constraints
@@ -499,7 +884,7 @@ class ExtensivePipe(Pipe):
         :return:
         """
         if self.dn is not 0:
-            di = self.di[self.dn]
+            di = self.get_pipe_catalog().get('Di', self.dn)
         else:
             di = 1
 
@@ -637,12 +1022,9 @@ class NodeMethod(Pipe):
                       direction=direction,
                       repr_days=repr_days)
 
-        pipe_catalog = self.get_pipe_catalog()
-        self.Rs = pipe_catalog['Rs']
-        self.Di = pipe_catalog['Di']
-        self.Do = pipe_catalog['Do']
         self.allow_flow_reversal = allow_flow_reversal
         self.history_length = 0  # Number of known historical values
+        self.precomputed = None  # See precompute_node_method
 
         self.params = self.create_params()
 
@@ -738,28 +1120,26 @@ class NodeMethod(Pipe):
         self.history_length = len(self.params['mass_flow_history'].v())
         Tg = self.params['Tg'].v()
         lines = self.params['lines'].v()
-        dn = self.params['diameter'].v()
         time_step = self.params['time_step'].v()
         n_steps = int(self.params['horizon'].v() / time_step)
 
         self.block.all_time = Set(
             initialize=range(self.history_length + n_steps), ordered=True)
 
-        pipe_wall_rho = 7.85 * 10 ** 3  # http://www.steel-grades.com/Steel-Grades/Structure-Steel/en-p235.html kg/m^3
-        pipe_wall_c = 461  # http://www.steel-grades.com/Steel-Grades/Structure-Steel/en-p235.html J/kg/K
-        pipe_wall_volume = np.pi * (
-                self.Do[dn] ** 2 - self.Di[dn] ** 2) / 4 * self.length
-        C = pipe_wall_volume * pipe_wall_c * pipe_wall_rho
-        surface = np.pi * self.Di[
-            dn] ** 2 / 4  # cross sectional area of the pipe
-        Z = surface * self.rho * self.length  # water mass in the pipe
+        # Pipes that are compiled together are precomputed at once by Modesto
+        if self.precomputed is None:
+            precompute_node_method([self])
+        data, self.precomputed = self.precomputed, None
+
+        C = data['C']
+        Z = data['Z']
 
         # TODO Move capacity?
 
-        def _decl_mf(b, t):
-            return self.params['mass_flow'].v(t)
+        mass_flow = data['mass_flow']
+        mf_history = data['mf_history']
 
-        self.block.mass_flow = Param(self.TIME, rule=_decl_mf)
+        self.block.mass_flow = Param(self.TIME, initialize=dict(enumerate(mass_flow)))
 
         # Declare temperature variables ################################################################################
 
@@ -776,14 +1156,8 @@ class NodeMethod(Pipe):
 
         # Declare list filled with all previous mass flows and future mass flows #######################################
 
-        def _decl_mf_history(b, t):
-            if t < n_steps:
-                return self.block.mass_flow[n_steps - t - 1]
-            else:
-                return self.params['mass_flow_history'].v(t - n_steps)
-
         self.block.mf_history = Param(self.block.all_time,
-                                      rule=_decl_mf_history)
+                                      initialize=dict(enumerate(mf_history)))
 
         # Declare list filled with all previous temperatures for every optimization step ###############################
 
@@ -808,44 +1182,12 @@ class NodeMethod(Pipe):
         self.block.decl_init_temp_in = Constraint(lines,
                                                   rule=_decl_init_temp_in)
 
-        # Define n #####################################################################################################
-
-        # Eq 3.4.7
-        def _decl_n(b, t):
-            sum_m = 0
-            for i in range(len(self.block.all_time) - (n_steps - 1 - t)):
-                sum_m += b.mf_history[n_steps - 1 - t + i] * time_step
-                if sum_m > Z:
-                    return i
-            self.logger.warning('A proper value for n could not be calculated')
-            return i
-
-        self.block.n = Param(self.TIME, rule=_decl_n)
-
-        # Define R #####################################################################################################
-
-        # Eq 3.4.3
-        def _decl_r(b, t):
-            return sum(self.block.mf_history[i] for i in
-                       range(n_steps - 1 - t,
-                             n_steps - 1 - t + b.n[t] + 1)) * time_step
-
-        self.block.R = Param(self.TIME, rule=_decl_r)
-
-        # Define m #####################################################################################################
+        # Define n, R, m and S ########################################################################################
 
-        # Eq. 3.4.8
-
-        def _decl_m(b, t):
-            sum_m = 0
-            for i in range(len(self.block.all_time) - (n_steps - 1 - t)):
-                sum_m += b.mf_history[n_steps - 1 - t + i] * time_step
-                if sum_m > Z + self.block.mass_flow[t] * time_step:
-                    return i
-            self.logger.warning('A proper value for m could not be calculated')
-            return i
-
-        self.block.m = Param(self.TIME, rule=_decl_m)
+        # Eq 3.4.3, 3.4.7, 3.4.8, 3.4.10 and 3.4.11
+        self.block.n = Param(self.TIME, initialize={t: int(data['n'][t]) for t in self.TIME})
+        self.block.R = Param(self.TIME, initialize=dict(enumerate(data['R'])))
+        self.block.m = Param(self.TIME, initialize={t: int(data['m'][t]) for t in self.TIME})
 
         # Define Y #####################################################################################################
 
@@ -860,19 +1202,7 @@ class NodeMethod(Pipe):
 
         self.block.def_Y = Constraint(self.TIME, lines, rule=_y)
 
-        # Define S #####################################################################################################
-
-        # Eq 3.4.10 and 3.4.11
-        def _s(b, t):
-            if b.m[t] > b.n[t]:
-                return sum(b.mf_history[i] * time_step
-                           for i in
-                           range(n_steps - 1 - t, n_steps - 1 - t + b.m[t]))
-
-            else:
-                return b.R[t]
-
-        self.block.S = Param(self.TIME, rule=_s)
+        self.block.S = Param(self.TIME, initialize=dict(enumerate(data['S'])))
 
         # Define outgoing temperature, without wall capacity and heat losses ###########################################
 
@@ -895,7 +1225,7 @@ class NodeMethod(Pipe):
         # Pipe wall heat capacity ######################################################################################
 
         # Eq. 3.4.20
-        self.block.K = 1 / self.Rs[self.params['diameter'].v()]
+        self.block.K = data['K']
 
         # Eq. 3.4.14
 
@@ -919,10 +1249,7 @@ class NodeMethod(Pipe):
                     return Constraint.Skip
                 else:
                     return b.wall_temp[l, t] == Tg[t] + (
-                            b.wall_temp[l, t - 1] - Tg[t]) * \
-                           np.exp(-b.K * time_step /
-                                  (surface * self.rho * self.cp +
-                                   C / self.length))
+                            b.wall_temp[l, t - 1] - Tg[t]) * data['idle_loss']
             else:
                 return b.wall_temp[l, t] == b.temperature_out_nhl[l, t]
 
@@ -970,20 +1297,7 @@ class NodeMethod(Pipe):
 
         # Eq. 3.4.24
 
-        def _tk(b, t):
-            if b.mass_flow[t] == 0:
-                return Constraint.Skip
-            else:
-                delta_time = time_step * ((b.R[t] - Z) * b.n[t]
-                                          + sum(
-                            b.mf_history[n_steps - 1 - t + i] * time_step * i
-                            for i in range(b.n[t] + 1, b.m[t]))
-                                          + (b.mass_flow[t] * time_step - b.S[
-                            t] + Z) * b.m[t]) \
-                             / b.mass_flow[t] / time_step
-                return delta_time
-
-        self.block.tk = Param(self.TIME, rule=_tk)
+        self.block.tk = Param(self.TIME, initialize={t: data['tk'][t] for t in self.TIME if mass_flow[t] != 0})
 
         # Eq. 3.4.27
 
@@ -994,21 +1308,45 @@ class NodeMethod(Pipe):
                         'temperature_out_' + l].v()
                 else:
                     return b.temperature_out[l, t] == (
-                            b.temperature_out[l, t - 1] - Tg[t]) * \
-                           np.exp(-b.K * time_step /
-                                  (
-                                          surface * self.rho * self.cp + C / self.length)) \
-                           + Tg[t]
+                            b.temperature_out[l, t - 1] - Tg[t]) * data['idle_loss'] + Tg[t]
             else:
                 return b.temperature_out[l, t] == Tg[t] + \
-                       (b.temperature_out_nhl[l, t] - Tg[t]) * \
-                       np.exp(-(b.K * b.tk[t]) /
-                              (surface * self.rho * self.cp))
+                       (b.temperature_out_nhl[l, t] - Tg[t]) * data['loss'][t]
 
         self.block.def_temp_out = Constraint(self.TIME, lines, rule=_temp_out)
 
     def get_diameter(self):
-        return self.Di[self.params['diameter'].v()]
+        return self.get_pipe_catalog().get('Di', self.params['diameter'].v())
 
     def get_length(self):
         return self.length
+
+    def get_handover(self, n_steps):
+        """
+        Shift the histories of the mass flow and the incoming temperatures by n_steps time steps and take the wall
+        and outgoing temperatures after n_steps time steps as new initial states. These temperatures are only known
+        within the optimization horizon, the last time step is used if the horizon is shifted completely.
+
+        :param n_steps: Number of time steps the start time is moved forward
+        :return: dict with parameter names as keys and their new values as values
+        """
+        t_init = min(n_steps, self.TIME[-1])
+        handover = {}
+
+        def _shift(history, recent):
+            # Most recent values come first
+            values = np.concatenate([recent[::-1], np.asarray(history, dtype=float)])
+            return pd.Series(values[:len(history)])
+
+        handover['mass_flow_history'] = _shift(
+            self.params['mass_flow_history'].get_all_values(),
+            [value(self.block.mass_flow[t]) for t in range(n_steps)])
+
+        for l in self.params['lines'].v():
+            handover['temperature_history_' + l] = _shift(
+                self.params['temperature_history_' + l].get_all_values(),
+                [value(self.block.temperature_in[l, t]) for t in range(n_steps)])
+            handover['wall_temperature_' + l] = value(self.block.wall_temp[l, t_init])
+            handover['temperature_out_' + l] = value(self.block.temperature_out[l, t_init])
+
+        return handover
@@ -0,0 +1,142 @@
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+from pyomo.core.base import Var, Constraint, Param
+
+
+class Profiler(object):
+    def __init__(self, memory=False):
+        """
+        Records the wall time, the number of optimization components created and optionally the peak memory use of the
+        steps that build and solve a Modesto model
+
+        :param memory: If True, the peak memory use of every step is measured with tracemalloc. Tracing memory slows
+            down the compilation considerably.
+        """
+        self.logger = logging.getLogger('modesto.profiler.Profiler')
+
+        self.memory = memory
+        self.records = []
+
+        self.started_tracing = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        """
+        Stop tracing memory, if it was started by this profiler
+        """
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @contextmanager
+    def record(self, step, name, submodel=None):
+        """
+        Measure the code that runs inside the with statement
+
+        :param step: Kind of step, e.g. 'edge', 'component', 'balance', 'objectives', 'precompute', 'write', 'solve'
+            or 'load'
+        :param name: Name of the component or node, None for steps that concern the entire model
+        :param submodel: Submodel of which the Vars, Constraints and Params created during the step are counted
+        """
+        block = None if submodel is None else submodel.block
+        start_counts = _count(block)
+
+        if self.memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            record = {'step': step,
+                      'name': name,
+                      'time': time.perf_counter() - start}
+
+            if self.memory:
+                record['peak_memory'] = tracemalloc.get_traced_memory()[1] - start_memory
+
+            if submodel is not None and submodel.block is not None:
+                # A new block is counted entirely, an existing one only for what was added to it
+                if submodel.block is not block:
+                    start_counts = _count(None)
+                for label, n in _count(submodel.block).items():
+                    record[label] = n - start_counts[label]
+
+            self.records.append(record)
+            self.logger.debug('{} {}: {:.3f} s'.format(step, name, record['time']))
+
+    def reset(self):
+        """
+        Remove all recorded steps
+        """
+        self.records = []
+
+    def get_report(self):
+        """
+        :return: pd.DataFrame with one row per recorded step, in the order of execution. vars, constraints and params
+            are the number of Vars, Constraints and Params that the step added to the block, peak_memory is given in
+            bytes.
+        """
+        columns = ['step', 'name', 'time', 'vars', 'constraints', 'params']
+        if self.memory:
+            columns.append('peak_memory')
+
+        report = pd.DataFrame(self.records, columns=columns)
+        # Steps without a block have no counts
+        report[['vars', 'constraints', 'params']] = report[['vars', 'constraints', 'params']].astype('Int64')
+
+        return report
+
+    def get_summary(self):
+        """
+        :return: pd.DataFrame with the total time and the number of calls per step
+        """
+        report = self.get_report()
+        return report.groupby('step', sort=False)['time'].agg(['sum', 'count']).rename(
+            columns={'sum': 'time', 'count': 'calls'})
+
+    def print_report(self, n=20):
+        """
+        Print the total time per step and the n slowest steps
+
+        :param n: Number of steps to be printed
+        """
+        report = self.get_report()
+        if report.empty:
+            print('Nothing has been recorded yet')
+            return
+
+        print('Time per step [s]')
+        print(self.get_summary().to_string(float_format='{:.3f}'.format))
+        print('\nSlowest steps')
+        print(report.sort_values('time', ascending=False).head(n).to_string(index=False,
+                                                                           float_format='{:.3f}'.format))
+
+
+def _count(block):
+    """
+    :param block: Pyomo block or None
+    :return: dict with the number of Vars ('vars'), Constraints ('constraints') and Params ('params') in the block
+    """
+    counts = {}
+    for ctype, label in [(Var, 'vars'), (Constraint, 'constraints'), (Param, 'params')]:
+        counts[label] = 0 if block is None else sum(1 for _ in block.component_data_objects(ctype, descend_into=True))
+    return counts
+
+
+def profile(profiler, step, name=None, submodel=None):
+    """
+    Record a step with the given profiler, or do nothing if profiler is None
+
+    :return: context manager
+    """
+    if profiler is None:
+        return nullcontext()
+    return profiler.record(step, name, submodel)
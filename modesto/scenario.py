@@ -0,0 +1,193 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pyomo.core.base import value
+
+
+class ScenarioBatch(object):
+    def __init__(self, optmodel, scenarios, objective='cost', start_time='20140101', results=None,
+                 solve_kwargs=None):
+        """
+        Solve one Modesto model for a table of parameter changes, reusing the compiled model between scenarios
+
+        :param optmodel: Modesto object of which all parameters are set, or a function without arguments that returns
+            one. A function is required to run scenarios in parallel processes and should then be defined at module
+            level, so that it can be pickled.
+        :param scenarios: pd.DataFrame with one row per scenario, the index holds the scenario names. Columns are
+            parameter names: 'param' for general parameters or '<component>.<param>' for component parameters, with
+            the component name as used in Modesto.components (e.g. 'plant.gen' or 'pipe'). An optional column
+            'start_time' changes the start time. Empty cells (NaN or None) keep the original value of the parameter.
+        :param objective: Name of the objective to be used
+        :param start_time: Start time of the optimization, unless given by the 'start_time' column
+        :param results: dict with labels as keys and tuples (node, comp, name) or (node, comp, name, index) as values.
+            These are collected with Modesto.get_result after each scenario.
+        :param solve_kwargs: dict of keyword arguments passed on to Modesto.solve. Solvers with a persistent interface
+            are used in persistent mode unless 'persistent' is set to False.
+        """
+        self.logger = logging.getLogger('modesto.scenario.ScenarioBatch')
+
+        if callable(optmodel):
+            self.model_factory = optmodel
+            self.optmodel = None
+        else:
+            self.model_factory = None
+            self.optmodel = optmodel
+
+        if not isinstance(scenarios, pd.DataFrame):
+            scenarios = pd.DataFrame(scenarios)
+        if not scenarios.index.is_unique:
+            raise ValueError('Scenario names (index of the scenario table) should be unique')
+        self.scenarios = scenarios
+
+        self.objective = objective
+        self.start_time = start_time
+        self.results = {} if results is None else results
+        self.solve_kwargs = {} if solve_kwargs is None else dict(solve_kwargs)
+        solver = self.solve_kwargs.get('solver', 'gurobi')
+        if solver.startswith('appsi_') or solver.endswith('_persistent'):
+            # Keep the model loaded in the solver between scenarios
+            self.solve_kwargs.setdefault('persistent', True)
+
+        self.summary = None
+        self.timeseries = None
+
+    def get_model(self):
+        """
+        Return the Modesto object, create it first if a model function was given
+
+        :return: Modesto object
+        """
+        if self.optmodel is None:
+            self.optmodel = self.model_factory()
+        return self.optmodel
+
+    def get_param(self, column):
+        """
+        Find the parameter object that belongs to a column of the scenario table
+
+        :param column: Column name
+        :return: Parameter object
+        """
+        optmodel = self.get_model()
+
+        if column in optmodel.params:
+            return optmodel.params[column]
+
+        comp, _, param = column.rpartition('.')
+        if comp not in optmodel.components:
+            raise KeyError('{} is not a general parameter or <component>.<param>'.format(column))
+
+        return optmodel.components[comp].get_param(param)
+
+    def run(self, processes=1):
+        """
+        Solve all scenarios
+
+        :param processes: Number of worker processes. If larger than 1, the scenarios are divided in as many chunks and
+            each process compiles its own model. Requires that the Modesto object was given as a function.
+        :return: pd.DataFrame with one row per scenario, containing the solver status and the value of all objectives.
+            The requested results are stored in self.timeseries, a pd.DataFrame indexed by time step with a column for
+            each (result, scenario) pair.
+        """
+        if processes > 1:
+            if self.model_factory is None:
+                raise ValueError('Running scenarios in parallel requires a function that builds the Modesto object')
+
+            chunks = [chunk for chunk in np.array_split(np.arange(len(self.scenarios)), processes) if len(chunk) > 0]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [executor.submit(_run_chunk, self.model_factory, self.scenarios.iloc[chunk],
+                                           self.objective, self.start_time, self.results, self.solve_kwargs)
+                           for chunk in chunks]
+                outputs = [future.result() for future in futures]
+
+            self.summary = pd.concat([summary for summary, _ in outputs])
+            self.timeseries = pd.concat([timeseries for _, timeseries in outputs], axis=1)
+        else:
+            self.summary, self.timeseries = self._run_serial()
+
+        return self.summary
+
+    def _run_serial(self):
+        optmodel = self.get_model()
+        params = {column: self.get_param(column) for column in self.scenarios.columns if column != 'start_time'}
+        original = {column: param.get_all_values() for column, param in params.items()}
+
+        summary = []
+        timeseries = {}
+
+        try:
+            for name, scenario in self.scenarios.iterrows():
+                for column, param in params.items():
+                    val = scenario[column]
+                    if _is_empty(val):
+                        val = original[column]
+                    _change_value(param, val)
+
+                start_time = scenario.get('start_time', self.start_time)
+                if _is_empty(start_time):
+                    start_time = self.start_time
+                start_time = pd.Timestamp(start_time)
+
+                recompile = bool(optmodel.get_dirty_components()) or not start_time == optmodel.start_time
+                optmodel.compile(start_time=start_time, recompile=recompile)
+                optmodel.set_objective(self.objective)
+
+                status = optmodel.solve(**self.solve_kwargs)
+                self.logger.info('Scenario {} solved with status {}'.format(name, status))
+
+                row = {'status': status}
+                solved = status in [0, 2]
+                for objtype in optmodel.objective_rules:
+                    row[objtype] = _try_value(optmodel.get_objective, objtype) if solved else np.nan
+                summary.append(pd.Series(row, name=name))
+
+                if solved:
+                    for label, args in self.results.items():
+                        result = optmodel.get_result(args[2], node=args[0], comp=args[1],
+                                                     index=args[3] if len(args) > 3 else None)
+                        timeseries[(label, name)] = pd.Series(result).reset_index(drop=True)
+        finally:
+            for column, param in params.items():
+                _change_value(param, original[column])
+
+        summary = pd.DataFrame(summary)
+        if len(summary) > 0:
+            summary['status'] = summary['status'].astype(int)
+
+        timeseries = pd.DataFrame(timeseries)
+        if len(timeseries.columns) > 0:
+            timeseries.columns = pd.MultiIndex.from_tuples(timeseries.columns, names=['result', 'scenario'])
+
+        return summary, timeseries
+
+
+def _run_chunk(model_factory, scenarios, objective, start_time, results, solve_kwargs):
+    batch = ScenarioBatch(model_factory, scenarios, objective=objective, start_time=start_time, results=results,
+                          solve_kwargs=solve_kwargs)
+    batch.run()
+    return batch.summary, batch.timeseries
+
+
+def _is_empty(val):
+    return val is None or (isinstance(val, float) and np.isnan(val))
+
+
+def _change_value(param, val):
+    """
+    Change the value of a parameter, unless it is unchanged, so that it does not cause a recompilation
+    """
+    current = param.get_all_values()
+    if val is current:
+        return
+    if np.isscalar(val) and np.isscalar(current) and val == current:
+        return
+    param.change_value(val)
+
+
+def _try_value(get_objective, objtype):
+    try:
+        return value(get_objective(objtype, get_value=False))
+    except ValueError:
+        return np.nan
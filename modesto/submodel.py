@@ -2,10 +2,11 @@
 
 from collections import Counter
 
-from pyomo.core.base import Block, Var, NonNegativeReals, value
+from pyomo.core.base import Block, Var, NonNegativeReals
 from pyomo.core.base.param import IndexedParam, _ParamData
 from pyomo.core.base.var import IndexedVar
 
+import numpy as np
 import pandas as pd
 
 
@@ -236,8 +237,8 @@ class Submodel(object):
             raise Exception('Top level model must be initialized first')
 
         # If block is already present, remove it
-        # if model.component(self.name) is not None:
-        #     model.del_component(self.name)
+        if model.component(self.name) is not None:
+            model.del_component(self.name)
         model.add_component(self.name, Block())
         self.block = model.__getattribute__(self.name)
 
@@ -321,6 +322,15 @@ class Submodel(object):
         """
         return 0
 
+    def obj_investment(self):
+        """
+        Yield the annualized investment cost for objective function, but only for components of which the size is
+        optimized
+
+        :return:
+        """
+        return 0
+
     def get_investment_cost(self):
         """
         Get the investment cost of this component. For a generic component, this is currently 0, but as components with price data are added, the cost parameter is used to get this value.
@@ -370,6 +380,16 @@ class Submodel(object):
         else:
             return f * variable <= f * bound + slack_variable
 
+    def get_handover(self, n_steps):
+        """
+        Get the parameter values that describe the initial state of this submodel for an optimization that starts
+        n_steps time steps later, based on the current solution. Submodels without states return an empty dict.
+
+        :param n_steps: Number of time steps the start time is moved forward
+        :return: dict with parameter names as keys and their new values as values
+        """
+        return {}
+
     def get_known_mflo(self, t, start_time):
         """
         Calculate the mass flow into the network, provided the injections and extractions at all nodes are already given
@@ -382,8 +402,6 @@ class Submodel(object):
     def get_result(self, name, index, state, start_time):
         obj = self.block.find_component(name)
 
-        result = []
-
         if obj is None:
             raise Exception(
                 '{} is not a valid parameter or variable of {}'.format(name,
@@ -391,36 +409,17 @@ class Submodel(object):
 
         time = self.get_time_axis(state)
 
-        if isinstance(obj, IndexedVar) and self.repr_days is None:
-            if index is None:
-                for i in obj:
-                    result.append(value(obj[i]))
-
-                resname = self.name + '.' + name
-
-            else:
-                for i in time:
-                    result.append(obj[(index, i)].value)
-
-                    resname = self.name + '.' + name + '.' + index
-        elif isinstance(obj, IndexedVar) and self.repr_days is not None:
-            for d in self.DAYS_OF_YEAR:
-                for t in time:
-                    result.append(value(obj[t, self.repr_days[d]]))
-
-                    resname = self.name + '.' +name
-
-        elif isinstance(obj, IndexedParam):
+        if isinstance(obj, (IndexedVar, IndexedParam)):
+            values = obj.extract_values()
             resname = self.name + '.' + name
-            if self.repr_days is None:
-                result = []
-                for t in obj:
-                    result.append(value(obj[t]))
 
+            if self.repr_days is not None:
+                result = [values[t, self.repr_days[d]] for d in self.DAYS_OF_YEAR for t in time]
+            elif index is None or isinstance(obj, IndexedParam):
+                result = list(values.values())
             else:
-                for d in self.DAYS_OF_YEAR:
-                    for t in time:
-                        result.append(value(obj[t, self.repr_days[d]]))
+                result = [values[index, t] for t in time]
+                resname = self.name + '.' + name + '.' + index
 
         else:
             self.logger.warning(
@@ -428,9 +427,43 @@ class Submodel(object):
                 '{}'.format(self.name, name, type(obj)))
             return None
 
-        timeindex = pd.DatetimeIndex(start=start_time,
-                                     freq=str(
-                                         self.params['time_step'].v()) + 'S',
-                                     periods=len(result))
+        timeindex = pd.date_range(start=start_time,
+                                  freq=str(
+                                      self.params['time_step'].v()) + 'S',
+                                  periods=len(result))
 
-        return pd.Series(data=result, index=timeindex, name=resname)
+        return pd.Series(data=np.array(result, dtype=float), index=timeindex, name=resname)
+
+    def get_results(self, names=None):
+        """
+        Return the values of several time dependent variables and parameters at once, see Modesto.get_results.
+        Variables with two indices, e.g. (line, time), give one result per value of the first index.
+
+        :param names: Names of the variables and parameters. If None, all indexed variables are returned.
+        :return: dict with (name, index) tuples as keys and np.arrays as values. index is None for variables with one
+            index.
+        """
+        results = {}
+        if self.block is None:
+            return results
+
+        if names is None:
+            objs = list(self.block.component_objects(Var, descend_into=False))
+        else:
+            objs = [self.block.find_component(name) for name in names]
+
+        for obj in objs:
+            if not isinstance(obj, (IndexedVar, IndexedParam)):
+                continue
+
+            values = obj.extract_values()
+            if obj.dim() == 1:
+                results[(obj.local_name, None)] = np.array(list(values.values()), dtype=float)
+            elif obj.dim() == 2:
+                grouped = {}
+                for (index, _), val in values.items():
+                    grouped.setdefault(index, []).append(val)
+                for index, vals in grouped.items():
+                    results[(obj.local_name, str(index))] = np.array(vals, dtype=float)
+
+        return results
@@ -3,20 +3,36 @@
 Utility functions needed for modesto
 """
 
+import hashlib
 import json
+import logging
 import os.path
+import shutil
+import tempfile
 from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
 
+RESAMPLE_CACHE_SIZE = 64
+_resample_cache = OrderedDict()
 
-def read_file(path, name, timestamp):
+DATA_CACHE_VERSION = 1  # Change to invalidate the parsed files stored on disk
+_data_cache = {}  # (file name, timestamp) -> ((modification time, size), parsed data frame)
+
+logger = logging.getLogger('modesto.utils')
+
+
+def read_file(path, name, timestamp, cache=True):
     """
     Read a text file and return it as a dataframe
 
     :param path: Location of the file
     :param name: name of the file (add extension)
     :param timestamp: if data contains a timestamp column. Default True
+    :param cache: If True, the parsed data frame is kept in memory for the whole process and stored on disk, see
+        get_data_cache_dir, so the file is parsed only once. The returned data frame can then be shared with other
+        callers and is read-only.
     :return: A dataframe
     """
 
@@ -25,10 +41,124 @@ def read_file(path, name, timestamp):
     if not os.path.isfile(fname):
         raise IOError(fname + ' does not exist')
 
-    data = pd.read_csv(fname, sep=';', header=0, parse_dates=timestamp,
+    if not cache:
+        return _parse_file(fname, timestamp)
+
+    stat = os.stat(fname)
+    key = (os.path.abspath(fname), bool(timestamp))
+    version = (stat.st_mtime_ns, stat.st_size)
+    if key in _data_cache and _data_cache[key][0] == version:
+        return _data_cache[key][1]
+
+    with open(fname, 'rb') as f:
+        sha = hashlib.sha1(f.read())
+    sha.update(repr((bool(timestamp), DATA_CACHE_VERSION)).encode())
+    folder = os.path.join(get_data_cache_dir(), sha.hexdigest())
+
+    data = _load_parsed(folder)
+    if data is None:
+        data = _parse_file(fname, timestamp)
+        _store_parsed(folder, data)
+        stored = _load_parsed(folder)
+        if stored is not None:
+            data = stored
+
+    _data_cache[key] = (version, data)
+    return data
+
+
+def _parse_file(fname, timestamp):
+    return pd.read_csv(fname, sep=';', header=0, parse_dates=timestamp,
                        index_col=0)
 
-    return data
+
+def get_data_cache_dir():
+    """
+    Folder in which read_file stores parsed files, named after a hash of their content. It is set by the environment
+    variable MODESTO_CACHE_DIR and defaults to ~/.cache/modesto.
+
+    :return: Path of the folder
+    """
+    return os.environ.get('MODESTO_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'modesto'))
+
+
+def _store_parsed(folder, data):
+    """
+    Store a parsed data frame as .npy files of its values and index and a json file with its column names. Data frames
+    with mixed column types or an index that is neither numeric nor a time stamp are only cached in memory.
+
+    :param folder: Folder in which the files are written
+    :param data: Parsed data frame
+    :return:
+    """
+    dtypes = set(data.dtypes)
+    index = data.index
+    if isinstance(index, pd.DatetimeIndex) and index.tz is None:
+        index_kind = 'datetime'
+    elif pd.api.types.is_numeric_dtype(index):
+        index_kind = 'numeric'
+    else:
+        return
+    if not len(dtypes) == 1 or not pd.api.types.is_numeric_dtype(dtypes.pop()):
+        return
+
+    tmp = None
+    try:
+        os.makedirs(os.path.dirname(folder), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(folder))
+        np.save(os.path.join(tmp, 'values.npy'), data.values)
+        np.save(os.path.join(tmp, 'index.npy'), index.values)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'columns': [str(col) for col in data.columns], 'index_name': index.name,
+                       'index_kind': index_kind}, f)
+        try:
+            os.rename(tmp, folder)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # Stored by another process in the meantime
+    except OSError as e:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+        logger.debug('Parsed data could not be cached in {}: {}'.format(folder, e))
+
+
+def _load_parsed(folder):
+    """
+    Load a data frame stored by _store_parsed. The values are memory-mapped.
+
+    :param folder: Folder with the stored files
+    :return: Read-only data frame, None if the folder does not exist or is damaged. A damaged folder is removed, so
+        that the file is stored again.
+    """
+    if not os.path.isdir(folder):
+        return None
+
+    try:
+        with open(os.path.join(folder, 'meta.json')) as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(folder, 'values.npy'), mmap_mode='r')
+        index = np.load(os.path.join(folder, 'index.npy'))
+        if meta['index_kind'] == 'datetime':
+            index = pd.DatetimeIndex(index, name=meta['index_name'])
+        else:
+            index = pd.Index(index, name=meta['index_name'])
+
+        return pd.DataFrame(values, index=index, columns=meta['columns'], copy=False)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning('Removing damaged cache folder {}: {}'.format(folder, e))
+        shutil.rmtree(folder, ignore_errors=True)
+        return None
+
+
+def clear_data_cache(disk=False):
+    """
+    Empty the cache used by read_file
+
+    :param disk: If True, the parsed files stored on disk are removed as well
+    :return:
+    """
+    _data_cache.clear()
+    if disk:
+        shutil.rmtree(get_data_cache_dir(), ignore_errors=True)
 
 
 def read_time_data(path, name, expand=False, expand_year=2014):
@@ -74,13 +204,15 @@ def read_xlsx_data(filepath, use_sheet=None, index_col=0):
     return df
 
 
-def resample(df, new_sample_time, old_sample_time=None, method='interpolation'):
+def resample(df, new_sample_time, old_sample_time=None, method='interpolation', cache=True):
     """
     Resamples data
     :param old_data: A data frame, containing the time data
     :param old_sample_time: The original sampling time
     :param new_sample_time: The new sampling time to which the data needs to be converted
     :param method: The method resampling to be used (sum/mean)
+    :param cache: If True, the result is looked up in and stored to a cache that is shared by the whole process. The
+        returned data frame can then be shared with other callers and should not be changed in place.
     :return: The resampled dataFrame
     """
     if old_sample_time is None:
@@ -89,16 +221,58 @@ def resample(df, new_sample_time, old_sample_time=None, method='interpolation'):
 
     if (new_sample_time == old_sample_time) or (new_sample_time is None):
         return df
+
+    if not cache:
+        return _resample(df, new_sample_time, old_sample_time, method)
+
+    key = (data_hash(df), new_sample_time, old_sample_time, method)
+    if key in _resample_cache:
+        _resample_cache.move_to_end(key)
+        return _resample_cache[key]
+
+    resampled = _resample(df, new_sample_time, old_sample_time, method)
+    _resample_cache[key] = resampled
+    if len(_resample_cache) > RESAMPLE_CACHE_SIZE:
+        _resample_cache.popitem(last=False)
+
+    return resampled
+
+
+def _resample(df, new_sample_time, old_sample_time, method):
+    if method == 'interpolation':
+        upsampled = df.resample(str(new_sample_time) + 'S')
+        return upsampled.interpolate(method='linear')
+    if method == 'pad' or new_sample_time < old_sample_time:
+        return df.resample(str(new_sample_time) + 'S').pad()
+    elif method == 'sum':
+        return df.resample(str(new_sample_time) + 'S').sum()
     else:
-        if method == 'interpolation':
-            upsampled = df.resample(str(new_sample_time) + 'S')
-            return upsampled.interpolate(method='linear')
-        if method == 'pad' or new_sample_time < old_sample_time:
-            return df.resample(str(new_sample_time) + 'S').pad()
-        elif method == 'sum':
-            return df.resample(str(new_sample_time) + 'S').sum()
-        else:
-            return df.resample(str(new_sample_time) + 'S').mean()
+        return df.resample(str(new_sample_time) + 'S').mean()
+
+
+def clear_resample_cache():
+    """
+    Empty the cache used by resample
+
+    :return:
+    """
+    _resample_cache.clear()
+
+
+def data_hash(df):
+    """
+    Hash of the content of a data frame or series, including its index and column names
+
+    :param df: Input data frame or series
+    :return: Hexadecimal digest (str)
+    """
+    sha = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    if isinstance(df, pd.DataFrame):
+        sha.update(repr(list(df.columns)).encode())
+    else:
+        sha.update(repr(df.name).encode())
+
+    return sha.hexdigest()
 
 
 def read_period_data(path, name, time_step, horizon, start_time, method=None, sep=' '):